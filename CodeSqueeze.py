@@ -8,582 +8,5821 @@
 # ///
 
 
-try:
-    import os
-    import re
-    import sys
-    from pathlib import Path
-    from typing import Union, Optional ,List , Tuple
-    import click
-    import shutil
-    import pyfiglet
-    import pyperclip
+import abc
+import contextlib
+import functools
+import hashlib
+import io
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter, deque
+from typing import Union, Optional ,List , Tuple, Iterator, Iterable, NamedTuple, Callable, IO
 
+# click, pyfiglet, pyperclip and the heavier stdlib modules (sqlite3, tokenize,
+# concurrent.futures, base64) are imported where they are used, so importing this
+# module as a library prints nothing and stays under a 50 ms budget: about 20-30 ms
+# cumulative with `python -X importtime -c "import CodeSqueeze"` on CPython 3.11
+# with cached bytecode, about 10 ms of it this module's own body (compiling the
+# source on a first import adds roughly 70 ms). tests/test_import.py checks that the
+# deferred modules stay out of sys.modules
 
-    def print_banner():
-        """Enhanced banner with modern aesthetics and better visual appeal"""
-        try:
+
+def print_banner():
+    """Enhanced banner with modern aesthetics and better visual appeal"""
+    try:
+        import shutil
+        import pyfiglet
+        
+        # Generate ASCII art with a more stylish font
+        ascii_art = pyfiglet.figlet_format("CodeSqueeze", font="slant")
+        subtitle = pyfiglet.figlet_format(".py", font="digital")
+        
+        # Get terminal dimensions
+        term_width = shutil.get_terminal_size((80, 24)).columns
+        
+        # Enhanced color palette - gradient-like effect
+        GRADIENT_COLORS = [
+            "\033[1;38;5;81m",   # Bright cyan
+            "\033[1;38;5;75m",   # Light blue  
+            "\033[1;38;5;69m",   # Blue
+            "\033[1;38;5;63m",   # Purple-blue
+        ]
+        
+        ACCENT_COLOR = "\033[1;38;5;226m"    # Bright yellow
+        SUBTITLE_COLOR = "\033[1;38;5;208m"  # Orange
+        FOOTER_COLOR = "\033[1;38;5;244m"    # Gray
+        BORDER_COLOR = "\033[1;38;5;39m"     # Bright blue
+        RESET = "\033[0m"
+        
+        # Unicode box drawing characters for better borders
+        TOP_BORDER = "╔" + "═" * (term_width - 2) + "╗"
+        BOTTOM_BORDER = "╚" + "═" * (term_width - 2) + "╝"
+        SIDE_BORDER = "║"
+        
+        # Print top border
+        print(f"\n{BORDER_COLOR}{TOP_BORDER}{RESET}")
+        
+        # Add some spacing
+        print(f"{BORDER_COLOR}{SIDE_BORDER}{' ' * (term_width - 2)}{SIDE_BORDER}{RESET}")
+        
+        # Process main ASCII art with gradient effect
+        main_lines = ascii_art.splitlines()
+        visible_main = [line for line in main_lines if line.strip()]
+        
+        for i, line in enumerate(visible_main):
+            # Apply gradient colors
+            color = GRADIENT_COLORS[i % len(GRADIENT_COLORS)]
             
-            # Generate ASCII art with a more stylish font
-            ascii_art = pyfiglet.figlet_format("CodeSqueeze", font="slant")
-            subtitle = pyfiglet.figlet_format(".py", font="digital")
-            
-            # Get terminal dimensions
-            term_width = shutil.get_terminal_size((80, 24)).columns
-            
-            # Enhanced color palette - gradient-like effect
-            GRADIENT_COLORS = [
-                "\033[1;38;5;81m",   # Bright cyan
-                "\033[1;38;5;75m",   # Light blue  
-                "\033[1;38;5;69m",   # Blue
-                "\033[1;38;5;63m",   # Purple-blue
-            ]
-            
-            ACCENT_COLOR = "\033[1;38;5;226m"    # Bright yellow
-            SUBTITLE_COLOR = "\033[1;38;5;208m"  # Orange
-            FOOTER_COLOR = "\033[1;38;5;244m"    # Gray
-            BORDER_COLOR = "\033[1;38;5;39m"     # Bright blue
-            RESET = "\033[0m"
-            
-            # Unicode box drawing characters for better borders
-            TOP_BORDER = "╔" + "═" * (term_width - 2) + "╗"
-            BOTTOM_BORDER = "╚" + "═" * (term_width - 2) + "╝"
-            SIDE_BORDER = "║"
-            
-            # Print top border
-            print(f"\n{BORDER_COLOR}{TOP_BORDER}{RESET}")
-            
-            # Add some spacing
-            print(f"{BORDER_COLOR}{SIDE_BORDER}{' ' * (term_width - 2)}{SIDE_BORDER}{RESET}")
-            
-            # Process main ASCII art with gradient effect
-            main_lines = ascii_art.splitlines()
-            visible_main = [line for line in main_lines if line.strip()]
-            
-            for i, line in enumerate(visible_main):
-                # Apply gradient colors
-                color = GRADIENT_COLORS[i % len(GRADIENT_COLORS)]
-                
-                # Center the line and add borders
-                if len(line) > term_width - 4:
-                    line = line[:term_width - 4]
-                
-                centered_line = line.center(term_width - 4)
-                print(f"{BORDER_COLOR}{SIDE_BORDER}{color}{centered_line}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
+            # Center the line and add borders
+            if len(line) > term_width - 4:
+                line = line[:term_width - 4]
             
-            # Process subtitle (.py)
-            subtitle_lines = subtitle.splitlines()
-            visible_subtitle = [line for line in subtitle_lines if line.strip()]
+            centered_line = line.center(term_width - 4)
+            print(f"{BORDER_COLOR}{SIDE_BORDER}{color}{centered_line}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
+        
+        # Process subtitle (.py)
+        subtitle_lines = subtitle.splitlines()
+        visible_subtitle = [line for line in subtitle_lines if line.strip()]
+        
+        for line in visible_subtitle:
+            if len(line) > term_width - 4:
+                line = line[:term_width - 4]
             
-            for line in visible_subtitle:
-                if len(line) > term_width - 4:
-                    line = line[:term_width - 4]
-                
-                centered_line = line.center(term_width - 4)
-                print(f"{BORDER_COLOR}{SIDE_BORDER}{SUBTITLE_COLOR}{centered_line}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
-            
-            # Add decorative separator
-            separator = "◆" * min(40, term_width - 10)
-            separator_centered = separator.center(term_width - 4)
-            print(f"{BORDER_COLOR}{SIDE_BORDER}{ACCENT_COLOR}{separator_centered}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
-            
-            # Add tagline
-            taglines = [
-                "🚀 Transform Your Codebase into AI-Ready Format 🚀",
-                "💡 Perfect for Qwen, Claude or any other chatbot 💡"
-            ]
-            
-            for tagline in taglines:
-                if len(tagline) > term_width - 4:
-                    tagline = tagline[:term_width - 4]
-                
-                centered_tagline = tagline.center(term_width - 4)
-                print(f"{BORDER_COLOR}{SIDE_BORDER}{ACCENT_COLOR}{centered_tagline}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
-            
-            # Add some spacing before footer
-            print(f"{BORDER_COLOR}{SIDE_BORDER}{' ' * (term_width - 2)}{SIDE_BORDER}{RESET}")
-            
-            # Enhanced footer with better styling
-            footer_info = [
-                ("👨‍💻", "Created by: cyberytti"),
-                ("🔗", "GitHub: github.com/cyberytti"),
-                ("📸", "Instagram: @trueliving"),
-                ("⭐", "Star this project if you find it useful!")
-            ]
-            
-            for icon, text in footer_info:
-                full_text = f"{icon} {text}"
-                if len(full_text) > term_width - 6:
-                    full_text = full_text[:term_width - 6] + "..."
-                
-                # Right align footer items
-                padding = (term_width - 4) - len(full_text)
-                if padding > 0:
-                    formatted_line = " " * padding + full_text
-                else:
-                    formatted_line = full_text
-                    
-                print(f"{BORDER_COLOR}{SIDE_BORDER}{FOOTER_COLOR}{formatted_line}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
-            
-            # Final spacing and bottom border
-            print(f"{BORDER_COLOR}{SIDE_BORDER}{' ' * (term_width - 2)}{SIDE_BORDER}{RESET}")
-            print(f"{BORDER_COLOR}{BOTTOM_BORDER}{RESET}")
-            
-            # Add a final accent line
-            accent_line = "═" * term_width
-            print(f"{ACCENT_COLOR}{accent_line}{RESET}\n")
-            
-        except Exception as error:
-            # Fallback to simple banner if anything goes wrong
-            print("╔" + "═" * 50 + "╗")
-            print("║" + " " * 15 + "CodeSqueeze.py" + " " * 15 + "║")
-            print("║" + " " * 10 + "Codebase → AI Format" + " " * 10 + "║")
-            print("╚" + "═" * 50 + "╝")
-            print(f"Error in banner: {error}\n")
-    print_banner()
-
-
-    class CodebaseProcessor:
-        """
-        A comprehensive tool for processing and analyzing codebases.
-        
-        This class scans a directory structure, filters files based on extensions and ignore patterns,
-        and creates a consolidated text file containing the project structure and file contents.
-        The output is formatted for use with AI coding agents.
-        """
-        
-        # Default directories to ignore during processing
-        DEFAULT_IGNORED_DIRECTORIES = [
-            "node_modules",      # Node.js dependencies - contains source files
-            "vendor",            # Go/PHP dependencies - contains source files  
-            "packages",          # Some package managers - contains source files
-            "deps",              # Elixir/Erlang dependencies - contains source files
-            "lib",               # Ruby gems/dependencies - contains source files
-            "gems",              # Ruby gems - contains source files
-            "bundle",            # Bundler gems - contains source files
-            "Pods",              # iOS CocoaPods - contains source files
-            "Carthage",          # iOS Carthage - contains source files
-            "gradle",            # Gradle wrapper - contains source files
-            "mvnw",              # Maven wrapper - contains source files
-            ".gradle",           # Gradle cache - contains source files
-            ".m2",               # Maven local repository - contains source files
-            "target/dependency", # Maven dependencies - contains source files
+            centered_line = line.center(term_width - 4)
+            print(f"{BORDER_COLOR}{SIDE_BORDER}{SUBTITLE_COLOR}{centered_line}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
+        
+        # Add decorative separator
+        separator = "◆" * min(40, term_width - 10)
+        separator_centered = separator.center(term_width - 4)
+        print(f"{BORDER_COLOR}{SIDE_BORDER}{ACCENT_COLOR}{separator_centered}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
+        
+        # Add tagline
+        taglines = [
+            "🚀 Transform Your Codebase into AI-Ready Format 🚀",
+            "💡 Perfect for Qwen, Claude or any other chatbot 💡"
         ]
         
-        # Default supported file extensions for code files
-        DEFAULT_SUPPORTED_EXTENSIONS = [
-            "py", "cpp", "java", "js", "ts", "c", "h", "cs", "go", "rs", "rb", "php",
-            "swift", "kt", "scala", "pl", "lua", "r", "dart", "html", "htm", "css",
-            "jsx", "scss", "tsx", "vue", "svelte", "sh", "bash", "ps1", "bat", "cmd",
-            "hs", "jl", "sql", "m", "ex", "exs", "vb", "fs", "groovy", "erl",
+        for tagline in taglines:
+            if len(tagline) > term_width - 4:
+                tagline = tagline[:term_width - 4]
+            
+            centered_tagline = tagline.center(term_width - 4)
+            print(f"{BORDER_COLOR}{SIDE_BORDER}{ACCENT_COLOR}{centered_tagline}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
+        
+        # Add some spacing before footer
+        print(f"{BORDER_COLOR}{SIDE_BORDER}{' ' * (term_width - 2)}{SIDE_BORDER}{RESET}")
+        
+        # Enhanced footer with better styling
+        footer_info = [
+            ("👨‍💻", "Created by: cyberytti"),
+            ("🔗", "GitHub: github.com/cyberytti"),
+            ("📸", "Instagram: @trueliving"),
+            ("⭐", "Star this project if you find it useful!")
         ]
         
-        def __init__(self, 
-                    source_directory: str,
-                    additional_extensions: Optional[List[str]] = None,
-                    ignored_files: Optional[List[str]] = None,
-                    ignored_directories: Optional[List[str]] = None,
-                    additional_files: Optional[List[str]] = None,
-                    output_file: Optional[str] = None):
-            """
-            Initialize the CodebaseProcessor.
-            
-            Args:
-                source_directory: Path to the directory to process
-                additional_extensions: Extra file extensions to include (without dots)
-                ignored_files: Specific files to exclude from processing
-                ignored_directories: Additional directories to ignore
-                additional_files: Specific files to include regardless of extension
-                output_file: Path for the output file (defaults to {source_directory}_codebase.txt)
-            """
-            self.source_directory = os.path.abspath(source_directory)
-            self.output_file_path = self._determine_output_path(output_file)
-            
-            # Initialize file and directory filters
-            self.ignored_files = ignored_files or []
-            self.additional_files = additional_files or []
-            self.ignored_directories = self._setup_ignored_directories(ignored_directories)
-            self.supported_extensions = self._setup_supported_extensions(additional_extensions)
-            
-            # Generate the AI agent prompt
-            self.ai_agent_prompt = self._generate_ai_agent_prompt()
-        
-        def _determine_output_path(self, output_file: Optional[str]) -> str:
-            """Determine the output file path."""
-            if output_file:
-                return os.path.abspath(output_file)
-            return f"{self.source_directory}_codebase.txt"
-        
-        def _setup_ignored_directories(self, additional_ignored: Optional[List[str]]) -> List[str]:
-            """Setup the list of directories to ignore."""
-            ignored_dirs = self.DEFAULT_IGNORED_DIRECTORIES.copy()
-            if additional_ignored:
-                ignored_dirs.extend(additional_ignored)
-            return ignored_dirs
-        
-        def _setup_supported_extensions(self, additional_extensions: Optional[List[str]]) -> List[str]:
-            """Setup the list of supported file extensions."""
-            extensions = self.DEFAULT_SUPPORTED_EXTENSIONS.copy()
-            if additional_extensions:
-                # Clean and add additional extensions
-                clean_extensions = [ext.lstrip(".").lower() for ext in additional_extensions]
-                extensions.extend(clean_extensions)
-            return extensions
-        
-        def _generate_ai_agent_prompt(self) -> str:
-            """Generate the prompt text for AI agents."""
-            return f"""You are an expert coding agent with context-aware understanding of software projects. While you're designed to analyze entire codebases, *only a subset of files and the project structure* has been provided due to context window constraints.  
+        for icon, text in footer_info:
+            full_text = f"{icon} {text}"
+            if len(full_text) > term_width - 6:
+                full_text = full_text[:term_width - 6] + "..."
+            
+            # Right align footer items
+            padding = (term_width - 4) - len(full_text)
+            if padding > 0:
+                formatted_line = " " * padding + full_text
+            else:
+                formatted_line = full_text
+                
+            print(f"{BORDER_COLOR}{SIDE_BORDER}{FOOTER_COLOR}{formatted_line}{RESET}{BORDER_COLOR}{SIDE_BORDER}{RESET}")
+        
+        # Final spacing and bottom border
+        print(f"{BORDER_COLOR}{SIDE_BORDER}{' ' * (term_width - 2)}{SIDE_BORDER}{RESET}")
+        print(f"{BORDER_COLOR}{BOTTOM_BORDER}{RESET}")
+        
+        # Add a final accent line
+        accent_line = "═" * term_width
+        print(f"{ACCENT_COLOR}{accent_line}{RESET}\n")
+        
+    except Exception as error:
+        # Fallback to simple banner if anything goes wrong
+        print("╔" + "═" * 50 + "╗")
+        print("║" + " " * 15 + "CodeSqueeze.py" + " " * 15 + "║")
+        print("║" + " " * 10 + "Codebase → AI Format" + " " * 10 + "║")
+        print("╚" + "═" * 50 + "╝")
+        print(f"Error in banner: {error}\n")
 
-    *Your responsibilities:*  
-    1. *Accurately execute tasks* (e.g., debugging, documentation, feature implementation) *using ONLY the files currently in context*.  
-    2. *Explicitly request missing files* when needed:  
-    - State exactly which file(s) you require (using full paths from the provided project structure)  
-    - Justify why the file is essential for the task  
-    - Never assume file existence beyond the provided context  
-    3. *Prioritize solutions within scope*: If a task can be completed with available files, do so without requesting additions.  
 
-    *Critical rules:*  
-    - ❌ *NEVER* invent code from unprovided files  
-    - ❌ *NEVER* guess file contents/structure  
-    - ✅ *ALWAYS* reference the project structure when requesting files  
-    - ✅ *ALWAYS* clarify ambiguities before proceeding  
+class StreamingOutputWriter:
+    """
+    Buffered single-handle writer for the consolidated output file.
+    
+    Chunks are encoded and written exactly once, while the output size and the
+    token estimate are accumulated on the fly so the file never has to be read back.
+    """
+    
+    # Rough heuristic used for the token estimate (4 chars ≈ 1 token)
+    CHARS_PER_TOKEN = 4
+    
+    def __init__(self, output_file_path: Optional[str], capture: bool = False,
+                buffer_size: int = 1024 * 1024, fileobj: Optional[IO] = None,
+                mirror: Optional[IO] = None):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_file_path: Path of the file to write (unused when `fileobj` is given)
+            capture: Whether to also keep the written text in memory (used for --copy)
+            buffer_size: Size of the write buffer in bytes
+            fileobj: Already open text or binary file object to write to instead;
+                it is flushed but not closed
+            mirror: Binary file object that also receives everything written
+                (e.g. a `ClipboardStream`); it is not closed
+        """
+        self.output_file_path = output_file_path
+        self.buffer_size = buffer_size
+        self.char_count = 0
+        self.byte_count = 0
+        self._captured: Optional[List[str]] = [] if capture else None
+        self._fileobj = fileobj
+        self._mirror = mirror
+        self._handle = None
+        self._text_mode = False
+    
+    def __enter__(self) -> "StreamingOutputWriter":
+        if self._fileobj is None:
+            self._handle = open(self.output_file_path, "wb", buffering=self.buffer_size)
+        else:
+            self._handle = self._fileobj
+            self._text_mode = isinstance(self._fileobj, io.TextIOBase)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._fileobj is None:
+            self._handle.close()
+        else:
+            self._handle.flush()
+        self._handle = None
+    
+    def write(self, text: str) -> None:
+        """Write an already-compressed chunk of text to the output."""
+        data = text.encode("utf-8")
+        self._handle.write(text if self._text_mode else data)
+        self.char_count += len(text)
+        self.byte_count += len(data)
+        if self._mirror is not None:
+            self._mirror.write(data)
+        if self._captured is not None:
+            self._captured.append(text)
+    
+    def write_header(self, text: str) -> None:
+        """Write the header chunk (prompt and project tree)."""
+        self.write(text)
+    
+    def write_trailer(self, text: str) -> None:
+        """Write the trailer chunk (the project tree, in cache-friendly order)."""
+        self.write(text)
+    
+    def write_file(self, source_chunk: "SourceChunk") -> None:
+        """Write one source file's chunk, piece by piece if it is streamed."""
+        if isinstance(source_chunk.chunk, str):
+            self.write(source_chunk.chunk)
+        else:
+            for piece in source_chunk.chunk:
+                self.write(piece)
+    
+    @property
+    def token_estimate(self) -> int:
+        """Estimated number of tokens written so far."""
+        return self.char_count // self.CHARS_PER_TOKEN
+    
+    @property
+    def captured_text(self) -> Optional[str]:
+        """Everything written so far, if capturing was enabled."""
+        if self._captured is None:
+            return None
+        return "".join(self._captured)
 
-    Due to context limits, the code is compressed by removing newlines and tabs when sent. However, when responding, debugging, or providing code, always use normal, readable formatting that can be copied and pasted directly.
-
-    provided project : {self.source_directory}"""
-
-        def generate_directory_tree(self,
-                                root: Union[str, "os.PathLike[str]"],
-                                max_depth: Optional[int] = None,
-                                show_hidden: bool = False,
-                                ignored_dirs: Optional[List[str]] = None,
-                                _prefix: str = "",
-                                _depth: int = 0) -> str:
-            """
-            Generate an ASCII tree representation of the directory structure.
-            
-            Args:
-                root: Root directory to start from
-                max_depth: Maximum depth to traverse
-                show_hidden: Whether to show hidden files/directories
-                ignored_dirs: List of directories to ignore
-                _prefix: Internal parameter for recursion
-                _depth: Internal parameter for recursion
-                
-            Returns:
-                ASCII tree representation as a string
-            """
-            root = Path(root)
-            if not root.is_dir():
-                return f"{root} is not a directory\n"
-            
-            if max_depth is not None and _depth > max_depth:
-                return ""
-            
-            # Use class ignored directories if none provided
-            if ignored_dirs is None:
-                ignored_dirs = self.ignored_directories
-            
-            # Convert ignored directories to absolute paths for comparison
-            ignored_paths = set()
-            if ignored_dirs:
-                for ignored_dir in ignored_dirs:
-                    ignored_path = Path(ignored_dir)
-                    if not ignored_path.is_absolute():
-                        ignored_path = root / ignored_path
-                    ignored_paths.add(ignored_path.resolve())
-            
-            # Get sorted entries, excluding ignored directories
-            entries = sorted(
-                (p for p in root.iterdir() 
-                if (show_hidden or not p.name.startswith(".")) 
-                and p.resolve() not in ignored_paths),
-                key=lambda p: (p.is_file(), p.name.lower())
+
+class ShardedOutputWriter:
+    """
+    Writer that splits the output into token- or byte-bounded part files.
+    
+    Parts are named part-001.txt, part-002.txt, … inside `output_dir`, and each
+    one starts with its own header (see `part_header`). A file's chunk never
+    straddles two parts unless it is too large for an empty part on its own, in
+    which case it is cut into continuation pieces. Only the current part is open,
+    so memory stays bounded. An index.txt listing every part's files, tokens and
+    bytes is written when the writer is closed.
+    """
+    
+    PART_FILE_PATTERN = re.compile(r"part-\d{3,}\.txt")
+    
+    def __init__(self,
+                output_dir: str,
+                part_header: Callable[[int], str],
+                tokenizer: Union["HeuristicTokenizer", "BPETokenizer"],
+                max_tokens: Optional[int] = None,
+                max_bytes: Optional[int] = None,
+                buffer_size: int = 1024 * 1024,
+                finalize_text: Optional[Callable[[str], str]] = None):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_dir: Directory receiving the part files
+            part_header: Returns the (compressed) header of a given part number
+            tokenizer: Token counter used for headers and split pieces
+            max_tokens: Maximum number of tokens per part
+            max_bytes: Maximum number of bytes per part
+            buffer_size: Size of the write buffer in bytes
+            finalize_text: Compression applied to continuation markers
+                (defaults to `CodebaseProcessor.compress_text`)
+        """
+        if max_tokens is None and max_bytes is None:
+            raise ValueError("ShardedOutputWriter needs max_tokens and/or max_bytes")
+        
+        self.output_dir = output_dir
+        self.part_header = part_header
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.finalize_text = finalize_text or CodebaseProcessor.compress_text
+        
+        self.char_count = 0
+        self.byte_count = 0
+        self.token_count = 0
+        self.parts: List[dict] = []
+        self._handle = None
+        self._part: Optional[dict] = None
+    
+    def __enter__(self) -> "ShardedOutputWriter":
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Remove parts left over from a previous, larger run
+        for name in os.listdir(self.output_dir):
+            if self.PART_FILE_PATTERN.fullmatch(name):
+                os.remove(os.path.join(self.output_dir, name))
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None and not self.parts:
+            # No files at all: still produce a part with the header
+            self._start_part()
+        self._close_part()
+        if exc_type is None:
+            self._write_index()
+    
+    @property
+    def captured_text(self) -> None:
+        """Sharded output is never captured in memory."""
+        return None
+    
+    def write_file(self, source_chunk: "SourceChunk") -> None:
+        """
+        Write one source file's chunk, starting a new part when it does not fit.
+        
+        Streamed chunks are written piece by piece as they are produced, so a
+        large file is never held in memory even when it spans several parts.
+        """
+        chunk = source_chunk.chunk
+        pieces = [chunk] if isinstance(chunk, str) else chunk
+        nbytes = len(chunk.encode("utf-8")) if isinstance(chunk, str) else chunk.byte_count
+        tokens = source_chunk.tokens
+        
+        if self._part is None or not self._fits(self._part["tokens"] + tokens, self._part["bytes"] + nbytes):
+            self._start_part()
+        if self._fits(self._part["tokens"] + tokens, self._part["bytes"] + nbytes):
+            for piece in pieces:
+                self._write(piece, 0, len(piece.encode("utf-8")), source_chunk.relative_path)
+            self._part["tokens"] += tokens
+            self.token_count += tokens
+            return
+        
+        # Too large for an empty part: fill parts one after the other, each
+        # continuation part starting with a marker
+        marker = self.finalize_text(
+            f"\n{'-'*60}\n📁 File: {source_chunk.relative_path} (continued)\n{'-'*60}\n"
+        )
+        fresh = True
+        for piece in pieces:
+            while piece:
+                size = self._room_for(piece)
+                if size == 0:
+                    if fresh:
+                        raise ValueError(
+                            f"Part limit is too small to hold any of {source_chunk.relative_path}"
+                        )
+                    self._start_part()
+                    self._write(marker, self.tokenizer.count(marker), len(marker.encode("utf-8")))
+                    fresh = True
+                    continue
+                self._write(piece[:size], self.tokenizer.count(piece[:size]), len(piece[:size].encode("utf-8")),
+                            source_chunk.relative_path)
+                piece = piece[size:]
+                fresh = False
+    
+    def _fits(self, tokens: int, nbytes: int) -> bool:
+        """Check a part's totals against the limits."""
+        return ((self.max_tokens is None or tokens <= self.max_tokens)
+                and (self.max_bytes is None or nbytes <= self.max_bytes))
+    
+    def _room_for(self, text: str) -> int:
+        """Length of the longest prefix of `text` that still fits in the current part."""
+        tokens, nbytes = self._part["tokens"], self._part["bytes"]
+        if not self._fits(tokens, nbytes):
+            return 0
+        # Start from a proportional guess and shrink until the prefix fits
+        size = len(text)
+        if self.max_bytes is not None:
+            size = min(size, self.max_bytes - nbytes)
+        if self.max_tokens is not None:
+            size = min(size, len(text) * (self.max_tokens - tokens) // max(1, self.tokenizer.count(text)))
+        while size > 0 and not self._fits(tokens + self.tokenizer.count(text[:size]),
+                                        nbytes + len(text[:size].encode("utf-8"))):
+            size = size * 9 // 10
+        return max(size, 0)
+    
+    def _start_part(self) -> None:
+        """Close the current part and open the next one, writing its header."""
+        number = len(self.parts) + 1
+        header = self.part_header(number)
+        header_tokens = self.tokenizer.count(header)
+        header_bytes = len(header.encode("utf-8"))
+        # Check before creating the file so a failed run leaves no empty part behind
+        if not self._fits(header_tokens, header_bytes):
+            raise ValueError(
+                "The part header (prompt and project tree) alone exceeds the part limit"
             )
+        
+        self._close_part()
+        path = os.path.join(self.output_dir, f"part-{number:03d}.txt")
+        self._handle = open(path, "wb", buffering=self.buffer_size)
+        self._part = {"path": path, "files": [], "tokens": 0, "bytes": 0}
+        self.parts.append(self._part)
+        self._write(header, header_tokens, header_bytes)
+    
+    def _write(self, text: str, tokens: int, nbytes: int, relative_path: Optional[str] = None) -> None:
+        """Write text to the current part and update the counters."""
+        self._handle.write(text.encode("utf-8"))
+        self._part["tokens"] += tokens
+        self._part["bytes"] += nbytes
+        if relative_path is not None and relative_path not in self._part["files"]:
+            self._part["files"].append(relative_path)
+        self.char_count += len(text)
+        self.byte_count += nbytes
+        self.token_count += tokens
+    
+    def _close_part(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+    
+    def _write_index(self) -> None:
+        """Write index.txt describing every part."""
+        with open(os.path.join(self.output_dir, "index.txt"), "w", encoding="utf-8") as index_file:
+            for part in self.parts:
+                index_file.write(
+                    f"{os.path.basename(part['path'])}: {len(part['files'])} files, "
+                    f"{part['tokens']} tokens, {part['bytes']} bytes\n"
+                )
+                for relative_path in part["files"]:
+                    index_file.write(f"    {relative_path}\n")
+
+
+class StructuredOutputWriter(StreamingOutputWriter, abc.ABC):
+    """
+    Base of the --format jsonl / xml / pack writers.
+    
+    Every file becomes one self-delimiting record holding its compressed body
+    (without the text format's file heading). Alongside the output a sidecar
+    index (`<output>.index.json`) maps each path to the byte offset and length
+    of its record plus its tokens and content hash, so one file can be pulled
+    out of a huge dump with a single seek (see `read_indexed_chunk`).
+    """
+    
+    FORMAT = None
+    
+    def __init__(self, output_file_path: Optional[str], body_of: Callable[["SourceChunk"], Iterable[str]],
+                capture: bool = False, fileobj: Optional[IO] = None, mirror: Optional[IO] = None,
+                index_path: Optional[str] = None):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_file_path: Path of the file to write (unused when `fileobj` is given)
+            body_of: Yields the body of a file's chunk, piece by piece
+            capture, fileobj, mirror: See `StreamingOutputWriter`
+            index_path: Where to write the sidecar index (None for no index)
+        """
+        super().__init__(output_file_path, capture=capture, fileobj=fileobj, mirror=mirror)
+        self.body_of = body_of
+        self.index_path = index_path
+        self.header_span: Optional[Tuple[int, int]] = None
+        self.trailer_span: Optional[Tuple[int, int]] = None
+        self.index = {}
+    
+    def __enter__(self) -> "StructuredOutputWriter":
+        super().__enter__()
+        self.write_prologue()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.write_epilogue()
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and self.index_path is not None:
+            import json
             
-            lines: List[str] = []
-            for idx, path in enumerate(entries):
-                connector = "└── " if idx == len(entries) - 1 else "├── "
-                lines.append(f"{_prefix}{connector}{path.name}")
-                
-                if path.is_dir():
-                    extension = "    " if idx == len(entries) - 1 else "│   "
-                    subtree = self.generate_directory_tree(
-                        path,
-                        max_depth=max_depth,
-                        show_hidden=show_hidden,
-                        ignored_dirs=ignored_dirs,
-                        _prefix=_prefix + extension,
-                        _depth=_depth + 1,
-                    )
-                    lines.append(subtree.rstrip())
-            
-            return "\n".join(lines) + ("\n" if lines else "")
-
-        def discover_all_files(self) -> List[str]:
-            """
-            Recursively collect every file under `source_directory`
-            while skipping any directory whose *name* matches an entry
-            in `ignored_directories` (either default or user-supplied).
-            """
-            file_paths = []
-
-            # Build a *flat* set of directory basenames to ignore
-            ignored_basenames = {Path(d).name for d in self.ignored_directories}
-
-            for root, dirs, files in os.walk(self.source_directory, topdown=True):
-                # Filter the *in-place* list of dirs so os.walk never descends into them
-                dirs[:] = [
-                    d for d in dirs
-                    if d not in ignored_basenames
-                ]
-
-                # Collect every file left
-                for filename in files:
-                    filepath = os.path.join(root, filename)
-                    file_paths.append(filepath)
+            with open(self.index_path, "w", encoding="utf-8") as index_file:
+                json.dump(self.index_document(), index_file)
+    
+    def write_prologue(self) -> None:
+        """Write whatever precedes the header record."""
+    
+    def write_epilogue(self) -> None:
+        """Write whatever follows the last record."""
+    
+    def write_header(self, text: str) -> None:
+        """Write the header record."""
+        start = self.byte_count
+        self.write_record("header", None, [text])
+        self.header_span = (start, self.byte_count - start)
+    
+    def write_trailer(self, text: str) -> None:
+        """Write the trailer record."""
+        start = self.byte_count
+        self.write_record("tree", None, [text])
+        self.trailer_span = (start, self.byte_count - start)
+    
+    def write_file(self, source_chunk: "SourceChunk") -> None:
+        """Write one file's record and index it."""
+        start = self.byte_count
+        offset, length = self.write_record("file", source_chunk, self.body_of(source_chunk))
+        self.index[source_chunk.relative_path.replace(os.sep, "/")] = {
+            "offset": start + offset if offset is not None else start,
+            "length": length if length is not None else self.byte_count - start,
+            "tokens": source_chunk.tokens,
+            "hash": source_chunk.digest,
+        }
+    
+    @abc.abstractmethod
+    def write_record(self, kind: str, source_chunk: Optional["SourceChunk"],
+                    pieces: Iterable[str]) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Write one record.
+        
+        Returns:
+            Offset (relative to the record's start) and length of the indexed
+            span, or (None, None) to index the whole record
+        """
+    
+    def index_document(self) -> dict:
+        """The sidecar index."""
+        return {
+            "format": self.FORMAT,
+            "header": None if self.header_span is None else
+            {"offset": self.header_span[0], "length": self.header_span[1]},
+            "tree": None if self.trailer_span is None else
+            {"offset": self.trailer_span[0], "length": self.trailer_span[1]},
+            "files": self.index,
+        }
+
+
+class JSONLOutputWriter(StructuredOutputWriter):
+    """
+    One JSON object per line: a header record, then one record per file with
+    its path, tokens, hash and content. The index points at whole lines.
+    """
+    
+    FORMAT = "jsonl"
+    
+    def write_record(self, kind, source_chunk, pieces):
+        import json
+        
+        if source_chunk is None:
+            self.write(f'{{"type": {json.dumps(kind)}, "content": "')
+        else:
+            self.write(
+                f'{{"type": {json.dumps(kind)}, "path": {json.dumps(source_chunk.relative_path.replace(os.sep, "/"))}, '
+                f'"tokens": {source_chunk.tokens}, "hash": {json.dumps(source_chunk.digest)}, "content": "'
+            )
+        for piece in pieces:
+            # Escaping is per character, so long bodies are encoded piece by piece
+            self.write(json.dumps(piece, ensure_ascii=False)[1:-1])
+        self.write('"}\n')
+        return None, None
 
-            return file_paths
 
-        def filter_files_by_extension(self, file_paths: List[str]) -> List[str]:
-            """
-            Filter files to include only those with supported extensions.
+class XMLOutputWriter(StructuredOutputWriter):
+    """
+    XML document with a <header> and one <file path tokens hash> element per
+    file. The index points at whole <file> elements.
+    """
+    
+    FORMAT = "xml"
+    
+    # Characters XML 1.0 does not allow, even escaped
+    INVALID_CHARACTERS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+    
+    def write_prologue(self) -> None:
+        self.write('<?xml version="1.0" encoding="UTF-8"?>\n<codebase>\n')
+    
+    def write_epilogue(self) -> None:
+        self.write("</codebase>\n")
+    
+    def write_record(self, kind, source_chunk, pieces):
+        from xml.sax.saxutils import escape, quoteattr
+        
+        if source_chunk is None:
+            self.write(f"<{kind}>")
+        else:
+            self.write(
+                f"<{kind} path={quoteattr(source_chunk.relative_path.replace(os.sep, '/'))} "
+                f'tokens="{source_chunk.tokens}" hash="{source_chunk.digest or ""}">'
+            )
+        for piece in pieces:
+            self.write(escape(self.INVALID_CHARACTERS.sub("\ufffd", piece)))
+        self.write(f"</{kind}>\n")
+        return None, None
+
+
+class PackOutputWriter(StructuredOutputWriter):
+    """
+    Compact container: the magic line, then every body as raw UTF-8 with no
+    framing, then the index as JSON, its offset as a little-endian uint64 and
+    the magic again. The index (embedded and sidecar) points at the raw bodies.
+    """
+    
+    FORMAT = "pack"
+    MAGIC = b"CSQPACK1"
+    
+    def write_prologue(self) -> None:
+        self._write_bytes(self.MAGIC + b"\n", len(self.MAGIC) + 1)
+    
+    def write_epilogue(self) -> None:
+        import json
+        import struct
+        
+        index_offset = self.byte_count
+        index_text = json.dumps(self.index_document())
+        self._write_bytes(index_text.encode("utf-8"), len(index_text))
+        self._write_bytes(struct.pack("<Q", index_offset) + self.MAGIC)
+    
+    def _write_bytes(self, data: bytes, chars: int = 0) -> None:
+        """
+        Write raw framing bytes, bypassing the text encoding.
+        
+        Args:
+            data: Bytes to write
+            chars: Number of characters `data` holds as text (0 for binary framing)
+        """
+        if self._text_mode:
+            self._handle.flush()
+            self._handle.buffer.write(data)
+        else:
+            self._handle.write(data)
+        self.char_count += chars
+        self.byte_count += len(data)
+        if self._mirror is not None:
+            self._mirror.write(data)
+    
+    def write_record(self, kind, source_chunk, pieces):
+        for piece in pieces:
+            self.write(piece)
+        return None, None
+
+
+STRUCTURED_WRITERS = {
+    "jsonl": JSONLOutputWriter,
+    "xml": XMLOutputWriter,
+    "pack": PackOutputWriter,
+}
+
+
+def read_indexed_chunk(output_path: str, relative_path: str) -> Optional[str]:
+    """
+    Extract one file's body from a --format jsonl / xml / pack output with a single seek.
+    
+    Uses the sidecar `<output>.index.json` (for pack files, the embedded
+    index when the sidecar is missing).
+    
+    Args:
+        output_path: Path of the output file
+        relative_path: Path of the file relative to the project (with "/")
+        
+    Returns:
+        The file's body, or None if the file is not in the output
+    """
+    import json
+    import struct
+    
+    with open(output_path, "rb") as output:
+        try:
+            with open(output_path + ".index.json", "r", encoding="utf-8") as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            output.seek(-8 - len(PackOutputWriter.MAGIC), os.SEEK_END)
+            trailer = output.read()
+            if trailer[8:] != PackOutputWriter.MAGIC:
+                raise
+            index_offset = struct.unpack("<Q", trailer[:8])[0]
+            output.seek(index_offset)
+            index = json.loads(output.read()[:-len(trailer)])
+        
+        entry = index["files"].get(relative_path)
+        if entry is None:
+            return None
+        output.seek(entry["offset"])
+        record = output.read(entry["length"]).decode("utf-8")
+    
+    if index["format"] == "jsonl":
+        return json.loads(record)["content"]
+    if index["format"] == "xml":
+        from xml.etree import ElementTree
+        
+        return ElementTree.fromstring(record).text or ""
+    return record
+
+
+class ClipboardStream:
+    """
+    Write-only byte stream into the system clipboard tool.
+    
+    The output is piped into pbcopy, wl-copy, xclip, xsel or (on Windows) clip
+    while it is being written, so --copy never has to hold the whole prompt as
+    one string.
+    """
+    
+    # clip.exe reads stdin in the console code page unless it starts with a
+    # UTF-16 byte order mark, so it is fed UTF-16-LE
+    UTF16_TOOLS = frozenset({"clip", "clip.exe"})
+    
+    def __init__(self, command: List[str]):
+        """
+        Start the clipboard tool.
+        
+        Args:
+            command: Command line of a tool that copies its stdin to the clipboard
+        """
+        import subprocess
+        
+        self.command = command
+        self.byte_count = 0
+        self._broken = False
+        self._decoder = None
+        self._prefix = b""
+        if os.path.basename(command[0]).lower() in self.UTF16_TOOLS:
+            import codecs
             
-            Args:
-                file_paths: List of file paths to filter
-                
-            Returns:
-                List of filtered file paths
-            """
-            filtered_files = []
-            for path in file_paths:
-                if '.' in path:
-                    extension = path.split('.')[-1].lower()
-                    if extension in self.supported_extensions:
-                        filtered_files.append(path)
-            return filtered_files
-        
-        def remove_files_from_ignored_directories(self, 
-                                                file_paths: List[str], 
-                                                directories_to_remove: List[str]) -> List[str]:
-            """
-            Remove files that are located in specified directories.
-            
-            Args:
-                file_paths: List of file paths
-                directories_to_remove: List of directory paths to exclude
-                
-            Returns:
-                Filtered list of file paths
-            """
-            if not directories_to_remove:
-                return file_paths
-            
-            return [
-                path for path in file_paths
-                if not any(os.path.normpath(dir_to_remove) in os.path.normpath(path) 
-                        for dir_to_remove in directories_to_remove)
-            ]
-
-        def get_file_size_kb(self, file_path: str) -> float:
-            """
-            Get file size in kilobytes.
-            
-            Args:
-                file_path: Path to the file
-                
-            Returns:
-                File size in KB, or 0 if file not found
-            """
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            self._prefix = codecs.BOM_UTF16_LE
+        # The X11 tools keep running in the background to serve the selection,
+        # so their output must not be a pipe we wait on
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    @staticmethod
+    def candidate_commands() -> List[List[str]]:
+        """Clipboard tools to try on this platform, in order of preference."""
+        if sys.platform == "darwin":
+            return [["pbcopy"]]
+        if sys.platform.startswith("win"):
+            return [["clip"]]
+        commands = []
+        if os.environ.get("WAYLAND_DISPLAY"):
+            commands.append(["wl-copy"])
+        if os.environ.get("DISPLAY"):
+            commands += [["xclip", "-selection", "clipboard"], ["xsel", "--clipboard", "--input"]]
+        return commands
+    
+    @classmethod
+    def open(cls) -> Optional["ClipboardStream"]:
+        """Start the first available clipboard tool, or return None if there is none."""
+        import shutil
+        
+        for command in cls.candidate_commands():
+            if shutil.which(command[0]) is None:
+                continue
             try:
-                stat_info = os.stat(file_path)
-                size_bytes = stat_info.st_size
-                return size_bytes / 1024
-            except FileNotFoundError:
-                return 0.0
-
-        def compress_file_content(self, file_path: str) -> str:
-            """
-            Remove newlines and compress multiple tabs in a file.
-            
-            Args:
-                file_path: Path to the file to compress
-                
-            Returns:
-                Path to the processed file
-                
-            Raises:
-                SystemExit: If file operations fail
-            """
-            if not isinstance(file_path, str):
-                raise TypeError("file_path must be a string")
+                return cls(command)
+            except OSError:
+                continue
+        return None
+    
+    def write(self, data: bytes) -> None:
+        """Send bytes to the clipboard tool (errors are reported by `close()`)."""
+        if self._broken:
+            return
+        try:
+            if self._decoder is not None:
+                # Transcode incrementally: a UTF-8 sequence may straddle two writes
+                self._process.stdin.write(self._prefix + self._decoder.decode(data).encode("utf-16-le"))
+                self._prefix = b""
+            else:
+                self._process.stdin.write(data)
+            self.byte_count += len(data)
+        except OSError:
+            self._broken = True
+    
+    def abort(self) -> None:
+        """Stop the clipboard tool without letting it copy what it received."""
+        self._process.kill()
+        self._process.wait()
+    
+    def close(self) -> None:
+        """
+        Finish the copy and wait for the clipboard tool.
+        
+        Raises:
+            OSError: If the tool exited early or with an error
+        """
+        try:
+            if self._decoder is not None and not self._broken:
+                self._process.stdin.write(self._prefix + self._decoder.decode(b"", final=True).encode("utf-16-le"))
+            self._process.stdin.close()
+        except OSError:
+            self._broken = True
+        returncode = self._process.wait()
+        if self._broken or returncode != 0:
+            raise OSError(f"{self.command[0]} failed (exit status {returncode})")
+
+
+class SourceChunk(NamedTuple):
+    """The formatted, compressed output chunk of a single source file."""
+    file_path: str
+    relative_path: str
+    chunk: Optional[Union[str, "StreamedChunk"]] = None
+    error: Optional[Exception] = None
+    tokens: int = 0
+    digest: Optional[str] = None
+    from_cache: bool = False
+    skip_reason: Optional[str] = None
+    size: int = 0
+    read_seconds: float = 0.0
+
+
+class StreamedChunk:
+    """
+    Output chunk of a large file, produced piece by piece instead of held in memory.
+    
+    The file is memory-mapped and decoded, newline-normalized and compressed one
+    block at a time. Iterating the chunk yields pieces that concatenate to
+    exactly the text the in-memory path would produce; `str()` joins them for
+    the rare caller that needs the whole text at once. Without `compress` the
+    text keeps its newlines, as in --minify output (the content itself is not
+    minified: that would need the whole file in memory).
+    """
+    
+    BLOCK_SIZE = 1024 * 1024
+    
+    def __init__(self, file_path: str, head: str, tail: str, limit: int, compress: bool = True):
+        """
+        Initialize the chunk.
+        
+        Args:
+            file_path: Path of the file to stream
+            head: Formatted text that precedes the file content
+            tail: Formatted text that follows the file content
+            limit: Number of leading bytes of the file to include
+            compress: Strip newlines and collapse tabs like `CodebaseProcessor.compress_text`
+        """
+        self.file_path = file_path
+        self.head = head
+        self.tail = tail
+        self.limit = limit
+        self.compress = compress
+        self.char_count = 0
+        self.byte_count = 0
+    
+    @staticmethod
+    def line_limit(file_path: str, max_bytes: int) -> int:
+        """Length of the file's first `max_bytes` bytes, cut back to the last complete line."""
+        import mmap
+        
+        with open(file_path, "rb") as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            end = view.rfind(b"\n", 0, max_bytes)
+            return end + 1 if end >= 0 else min(max_bytes, len(view))
+    
+    def blocks(self) -> Iterator[bytes]:
+        """Yield the included bytes of the file in blocks of BLOCK_SIZE."""
+        import mmap
+        
+        with open(self.file_path, "rb") as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            limit = min(self.limit, len(view))
+            # Mapped pages count toward the resident set once touched: drop each
+            # block's pages after use so RSS stays flat however big the file is
+            release = getattr(mmap, "MADV_DONTNEED", None) if hasattr(view, "madvise") else None
+            for start in range(0, limit, self.BLOCK_SIZE):
+                end = min(start + self.BLOCK_SIZE, limit)
+                yield view[start:end]
+                if release is not None:
+                    aligned = start - start % mmap.PAGESIZE
+                    view.madvise(release, aligned, end - aligned)
+    
+    def pieces(self, hasher=None) -> Iterator[str]:
+        """
+        Yield the compressed chunk piece by piece.
+        
+        A "\r" at the end of a block and a tab at the end of a compressed piece
+        are held back until the next piece, so CRLF pairs and tab runs that
+        straddle a block boundary come out the same as in one pass.
+        
+        Args:
+            hasher: Optional hash object updated with the raw bytes read
+        """
+        import codecs
+        
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        carry_tab = False
+        
+        def compress(text: str, final: bool = False) -> str:
+            nonlocal carry_tab
+            if not self.compress:
+                return text
+            text = CodebaseProcessor.compress_text("\t" + text if carry_tab else text)
+            carry_tab = not final and text.endswith("\t")
+            return text[:-1] if carry_tab else text
+        
+        yield compress(self.head)
+        carry_cr = False
+        for block in self.blocks():
+            if hasher is not None:
+                hasher.update(block)
+            text = decoder.decode(block)
+            if carry_cr:
+                text = "\r" + text
+            carry_cr = text.endswith("\r")
+            if carry_cr:
+                text = text[:-1]
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            piece = compress(text)
+            if piece:
+                yield piece
+        
+        text = decoder.decode(b"", final=True) + ("\n" if carry_cr else "")
+        yield compress(text + self.tail, final=True)
+    
+    def measure(self, tokenizer) -> Tuple[int, str]:
+        """
+        Make one pass over the file to size the chunk.
+        
+        Sets `char_count` and `byte_count` as a side effect.
+        
+        Returns:
+            The chunk's token count and the content digest of the included bytes
+        """
+        hasher = ChunkCache.content_hasher()
+        self.char_count = self.byte_count = 0
+        
+        def counted() -> Iterator[str]:
+            for piece in self.pieces(hasher):
+                self.char_count += len(piece)
+                self.byte_count += len(piece.encode("utf-8"))
+                yield piece
+        
+        tokens = tokenizer.count_pieces(counted())
+        return tokens, hasher.hexdigest()
+    
+    def __iter__(self) -> Iterator[str]:
+        return self.pieces()
+    
+    def __str__(self) -> str:
+        return "".join(self.pieces())
+
+
+class TreeEntry(NamedTuple):
+    """A single file or directory produced by the project walk."""
+    path: str
+    relative_path: str
+    name: str
+    depth: int
+    is_dir: bool
+    is_symlink: bool
+    visible: bool
+    is_last: bool
+    prefix: str
+    
+    @property
+    def tree_line(self) -> str:
+        """This entry's line in the ASCII directory tree."""
+        connector = "└── " if self.is_last else "├── "
+        return f"{self.prefix}{connector}{self.name}"
+
+
+class DirectoryTree:
+    """
+    In-memory directory tree, rendered as ASCII with optional collapsing.
+    
+    Used instead of streaming tree lines when huge directories are collapsed
+    (`max_entries`) or when the tree only shows the selected files. Rendering
+    is iterative (a stack of per-directory iterators, like the walk itself)
+    and appends every line to a single buffer, so depth costs neither
+    recursion nor repeated string copies.
+    """
+    
+    # Number of extensions named in a collapsed listing's summary
+    SUMMARY_EXTENSIONS = 3
+    
+    def __init__(self):
+        # Directory name -> child dict, file name -> None
+        self.root: dict = {}
+    
+    @classmethod
+    def from_paths(cls, relative_paths: Iterable[str]) -> "DirectoryTree":
+        """Build the tree of the directories holding the given files ("/"-separated)."""
+        tree = cls()
+        for relative_path in relative_paths:
+            tree.add(relative_path, is_dir=False)
+        return tree
+    
+    def add(self, relative_path: str, is_dir: bool) -> None:
+        """Add a file or directory (missing parents are created)."""
+        *directories, name = relative_path.split("/")
+        node = self.root
+        for directory in directories:
+            child = node.get(directory)
+            if child is None:
+                child = node[directory] = {}
+            node = child
+        if is_dir:
+            node.setdefault(name, {})
+        else:
+            node.setdefault(name, None)
+    
+    def render(self, max_entries: Optional[int] = None) -> str:
+        """
+        Render the tree.
+        
+        Args:
+            max_entries: Show at most this many entries per directory, followed
+                by a summary line for the rest
+            
+        Returns:
+            ASCII tree, one line per entry
+        """
+        lines: List[str] = []
+        stack = [(self._listing(self.root, max_entries), "")]
+        while stack:
+            item = next(stack[-1][0], None)
+            if item is None:
+                stack.pop()
+                continue
+            
+            label, child, is_last = item
+            prefix = stack[-1][1]
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{label}")
+            if child:
+                stack.append((self._listing(child, max_entries), prefix + ("    " if is_last else "│   ")))
+        return "\n".join(lines) + ("\n" if lines else "")
+    
+    def _listing(self, node: dict, max_entries: Optional[int]) -> Iterator[Tuple[str, Optional[dict], bool]]:
+        """A directory's (label, child, is_last) items: directories first, then files, alphabetically."""
+        entries = sorted(node.items(), key=lambda item: (item[1] is None, item[0].lower()))
+        if max_entries is not None and len(entries) > max_entries:
+            for name, child in entries[:max_entries]:
+                yield name, child, False
+            yield self._summary(entries[max_entries:]), None, True
+            return
+        for index, (name, child) in enumerate(entries):
+            yield name, child, index == len(entries) - 1
+    
+    def _summary(self, entries: List[Tuple[str, Optional[dict]]]) -> str:
+        """Summary line of the collapsed entries, e.g. "… 4,312 more files (.png ×4,000, .json ×312)"."""
+        extensions = Counter(os.path.splitext(name)[1].lower() or name for name, child in entries if child is None)
+        directories = len(entries) - sum(extensions.values())
+        parts = []
+        if directories:
+            parts.append(f"{directories:,} more director{'y' if directories == 1 else 'ies'}")
+        if extensions:
+            files = sum(extensions.values())
+            kinds = [f"{extension} ×{count:,}" for extension, count in extensions.most_common(self.SUMMARY_EXTENSIONS)]
+            if len(extensions) > self.SUMMARY_EXTENSIONS:
+                kinds.append("…")
+            parts.append(f"{files:,} more file{'' if files == 1 else 's'} ({', '.join(kinds)})")
+        return "… " + ", ".join(parts)
+
+
+class IgnoreRule(NamedTuple):
+    """A single compiled line of a .gitignore-style file."""
+    pattern: str
+    negated: bool
+    dir_only: bool
+    anchored: bool
+    literal: bool
+    regex: str
+    
+    # Characters with a special meaning in gitignore globs
+    GLOB_CHARS = frozenset("*?[\\")
+    
+    @classmethod
+    def parse(cls, line: str) -> Optional["IgnoreRule"]:
+        """
+        Parse one line of an ignore file.
+        
+        Args:
+            line: Raw line (without the trailing newline)
+            
+        Returns:
+            The compiled rule, or None for blank lines and comments
+        """
+        # Trailing spaces are ignored unless escaped with a backslash
+        stripped = line.rstrip("\r")
+        while stripped.endswith(" ") and not stripped.endswith("\\ "):
+            stripped = stripped[:-1]
+        if not stripped or stripped.startswith("#"):
+            return None
+        
+        negated = stripped.startswith("!")
+        if negated:
+            stripped = stripped[1:]
+        elif stripped.startswith(("\\#", "\\!")):
+            stripped = stripped[1:]
+        
+        dir_only = stripped.endswith("/")
+        pattern = stripped.rstrip("/")
+        if not pattern:
+            return None
+        
+        # A slash at the start or in the middle anchors the pattern to its directory
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        literal = not (cls.GLOB_CHARS & set(pattern))
+        regex = cls.glob_to_regex(pattern, anchored)
+        return cls(pattern, negated, dir_only, anchored, literal, regex)
+    
+    @staticmethod
+    def glob_to_regex(pattern: str, anchored: bool) -> str:
+        """
+        Translate a gitignore glob into a regular expression over '/'-separated paths.
+        
+        Args:
+            pattern: Glob without negation, leading or trailing slashes
+            anchored: Whether the glob is relative to its directory (otherwise it
+                may match at any depth)
+            
+        Returns:
+            Regular expression source, to be used with `fullmatch`
+        """
+        parts = []
+        i, n = 0, len(pattern)
+        while i < n:
+            char = pattern[i]
+            if char == "*":
+                if pattern.startswith("**", i):
+                    at_start = i == 0 or pattern[i - 1] == "/"
+                    at_end = i + 2 == n or pattern[i + 2] == "/"
+                    if at_start and at_end:
+                        if i + 2 == n:
+                            # Trailing "/**": everything inside
+                            parts.append(".*")
+                        else:
+                            # Leading "**/" or inner "/**/": zero or more directories
+                            parts.append("(?:.*/)?")
+                            i += 1
+                        i += 2
+                        continue
+                    # Other consecutive asterisks are regular asterisks
+                    while i + 1 < n and pattern[i + 1] == "*":
+                        i += 1
+                parts.append("[^/]*")
+            elif char == "?":
+                parts.append("[^/]")
+            elif char == "[":
+                # A leading "]" (after an optional "!") is part of the class
+                j = i + 1
+                if pattern[j:j + 1] in ("!", "^"):
+                    j += 1
+                if pattern[j:j + 1] == "]":
+                    j += 1
+                close = pattern.find("]", j)
+                if close == -1:
+                    parts.append(re.escape(char))
+                else:
+                    body = pattern[i + 1:close]
+                    if body[:1] in ("!", "^"):
+                        body = "^" + body[1:]
+                    parts.append(f"(?!/)[{body}]")
+                    i = close
+            elif char == "\\" and i + 1 < n:
+                i += 1
+                parts.append(re.escape(pattern[i]))
+            else:
+                parts.append(re.escape(char))
+            i += 1
+        
+        regex = "".join(parts)
+        return regex if anchored else f"(?:.*/)?{regex}"
+
+
+class IgnoreScope:
+    """
+    The compiled rules of one directory's ignore files.
+    
+    Literal rules are resolved with dictionary lookups (by basename, or by path
+    for anchored ones) and every glob rule is folded into one alternation whose
+    alternatives are ordered last-rule-first, so a single `fullmatch` finds the
+    winning rule. Matching cost therefore does not grow with the number of rules.
+    """
+    
+    def __init__(self, rules: List[IgnoreRule]):
+        """
+        Compile a list of rules (later rules take precedence).
+        
+        Args:
+            rules: Parsed rules, in file order
+        """
+        self.rules = rules
+        # name or relative path -> index of the last literal rule, for files / for directories
+        self._file_names, self._dir_names = {}, {}
+        self._file_paths, self._dir_paths = {}, {}
+        file_globs, dir_globs = [], []
+        
+        for index, rule in enumerate(rules):
+            if rule.literal:
+                targets = [(self._dir_names, self._dir_paths)]
+                if not rule.dir_only:
+                    targets.append((self._file_names, self._file_paths))
+                for names, paths in targets:
+                    (paths if rule.anchored else names)[rule.pattern] = index
+            else:
+                dir_globs.append(index)
+                if not rule.dir_only:
+                    file_globs.append(index)
+        
+        self._file_regex = self._compile(file_globs)
+        self._dir_regex = self._compile(dir_globs)
+    
+    def _compile(self, indices: List[int]) -> Optional["re.Pattern[str]"]:
+        """Fold glob rules into a single last-match-wins regular expression."""
+        if not indices:
+            return None
+        return re.compile("|".join(
+            f"(?P<r{index}>{self.rules[index].regex})" for index in reversed(indices)
+        ))
+    
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Decide whether a path is ignored by this scope.
+        
+        Args:
+            relative_path: '/'-separated path relative to the scope's directory
+            is_dir: Whether the path is a directory
+            
+        Returns:
+            True if ignored, False if re-included by a negated rule, None if no rule matches
+        """
+        names, paths, regex = (
+            (self._dir_names, self._dir_paths, self._dir_regex) if is_dir
+            else (self._file_names, self._file_paths, self._file_regex)
+        )
+        
+        best = max(
+            names.get(relative_path.rpartition("/")[2], -1),
+            paths.get(relative_path, -1),
+        )
+        if regex is not None:
+            found = regex.fullmatch(relative_path)
+            if found is not None:
+                best = max(best, int(found.lastgroup[1:]))
+        
+        if best < 0:
+            return None
+        return not self.rules[best].negated
+
+
+class IgnoreMatcher:
+    """
+    Hierarchical, gitignore-compatible ignore engine.
+    
+    Rules come from an override scope (built-in and user supplied directories),
+    the repository's `.git/info/exclude`, and every `.gitignore` and
+    `.squeezeignore` found during the walk. As with git, the deepest scope with
+    a matching rule decides, later rules beat earlier ones, and a negated rule
+    cannot re-include a path whose parent directory is already excluded.
+    """
+    
+    IGNORE_FILE_NAMES = (".gitignore", ".squeezeignore")
+    
+    def __init__(self, root: str, override_patterns: List[str], use_ignore_files: bool = True,
+                ignore_file_names: Tuple[str, ...] = IGNORE_FILE_NAMES):
+        """
+        Create a matcher rooted at `root`.
+        
+        Args:
+            root: Project root that relative paths are resolved against
+            override_patterns: Patterns that always apply (and beat ignore files)
+            use_ignore_files: Whether to honour .gitignore/.squeezeignore files
+            ignore_file_names: Ignore files to read (`.git/info/exclude` is only
+                read along with .gitignore)
+        """
+        self.root = root
+        self.use_ignore_files = use_ignore_files
+        self.ignore_file_names = ignore_file_names
+        self.override = IgnoreScope([r for r in map(IgnoreRule.parse, override_patterns) if r])
+        self.scopes = {}
+        
+        if use_ignore_files:
+            self.load_directory("", root, include_info_exclude=".gitignore" in ignore_file_names)
+    
+    def load_directory(self, relative_dir: str, directory: str, include_info_exclude: bool = False) -> None:
+        """
+        Load the ignore files of a directory into a new scope.
+        
+        Args:
+            relative_dir: '/'-separated directory path relative to the root ("" for the root)
+            directory: Absolute path of the directory
+            include_info_exclude: Also read `.git/info/exclude` (root only)
+        """
+        if not self.use_ignore_files or relative_dir in self.scopes:
+            return
+        
+        sources = [os.path.join(directory, name) for name in self.ignore_file_names]
+        if include_info_exclude:
+            sources.insert(0, os.path.join(directory, ".git", "info", "exclude"))
+        
+        rules = []
+        for source in sources:
+            try:
+                with open(source, "r", encoding="utf-8", errors="ignore") as ignore_file:
+                    rules.extend(r for r in map(IgnoreRule.parse, ignore_file.read().splitlines()) if r)
+            except OSError:
+                continue
+        if rules:
+            self.scopes[relative_dir] = IgnoreScope(rules)
+    
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        Decide whether a single path is ignored (its parents are not checked).
+        
+        Args:
+            relative_path: '/'-separated path relative to the root
+            is_dir: Whether the path is a directory
+            
+        Returns:
+            True if the path should be skipped
+        """
+        decision = self.override.match(relative_path, is_dir)
+        if decision:
+            return True
+        
+        if self.scopes:
+            # Deepest scope first: walk up through the parent directories
+            parent = relative_path
+            while parent:
+                parent = parent.rpartition("/")[0]
+                scope = self.scopes.get(parent)
+                if scope is not None:
+                    sub_path = relative_path[len(parent) + 1:] if parent else relative_path
+                    decision = scope.match(sub_path, is_dir)
+                    if decision is not None:
+                        return decision
+        return False
+    
+    def is_path_ignored(self, relative_path: str, is_dir: bool = False) -> bool:
+        """Decide whether a path, or any of its parent directories, is ignored."""
+        parts = relative_path.split("/")
+        for i in range(1, len(parts)):
+            if self.is_ignored("/".join(parts[:i]), True):
+                return True
+        return self.is_ignored(relative_path, is_dir)
+
+
+class IncludeMatcher:
+    """
+    Compiled rules deciding which files are source files.
+    
+    A file is included when its name is a well-known build or container file
+    (`Dockerfile`, `Makefile`, `CMakeLists.txt`, …), when one of its suffixes
+    is in the suffix set (multi-part ones such as `d.ts` or `test.tsx` too),
+    or, with `sniff_shebangs`, when it has no suffix and starts with a `#!`
+    line naming a known interpreter. Only the file name is looked at, so
+    dotted directory names do not matter, and each check is a handful of set
+    lookups however many suffixes are configured.
+    """
+    
+    DEFAULT_FILE_NAMES = frozenset({
+        "dockerfile", "containerfile", "makefile", "gnumakefile", "cmakelists.txt",
+        "rakefile", "gemfile", "podfile", "brewfile", "jenkinsfile", "vagrantfile",
+        "procfile", "justfile", "build.bazel", "workspace.bazel",
+    })
+    
+    # Interpreters (version suffixes aside) whose scripts count as source files
+    SHEBANG_INTERPRETERS = frozenset({
+        "sh", "bash", "zsh", "ksh", "dash", "fish", "python", "pypy", "node", "deno", "bun",
+        "ruby", "perl", "php", "lua", "tclsh", "awk", "gawk", "rscript", "julia", "elixir", "pwsh",
+    })
+    SHEBANG_BYTES = 256
+    
+    def __init__(self, suffixes: Iterable[str], file_names: Iterable[str] = DEFAULT_FILE_NAMES,
+                sniff_shebangs: bool = False):
+        """
+        Compile the rules.
+        
+        Args:
+            suffixes: File extensions without the leading dot ("py", "d.ts", …)
+            file_names: File names included whatever their suffix (case-insensitive)
+            sniff_shebangs: Read the first line of files without a suffix
+        """
+        self.suffixes = frozenset(suffix.lstrip(".").lower() for suffix in suffixes)
+        self.file_names = frozenset(name.lower() for name in file_names)
+        self.sniff_shebangs = sniff_shebangs
+        # Longest suffix, in dot-separated parts
+        self.max_parts = max((suffix.count(".") + 1 for suffix in self.suffixes), default=1)
+    
+    def matches(self, path: str, name: Optional[str] = None) -> bool:
+        """
+        Whether a file is included.
+        
+        Args:
+            path: Path of the file (only opened for shebang sniffing)
+            name: File name, if already known (defaults to the last path component)
+        """
+        name = (name if name is not None else os.path.basename(path)).lower()
+        if name in self.file_names:
+            return True
+        
+        stem, _, suffix = name.rpartition(".")
+        if stem.lstrip("."):
+            if suffix in self.suffixes:
+                return True
+            if self.max_parts > 1:
+                # Longer suffixes, ignoring a leading dot
+                parts = name.lstrip(".").split(".")
+                for count in range(2, min(self.max_parts, len(parts) - 1) + 1):
+                    if ".".join(parts[-count:]) in self.suffixes:
+                        return True
+            return False
+        
+        return self.sniff_shebangs and self.shebang_interpreter(path) in self.SHEBANG_INTERPRETERS
+    
+    @classmethod
+    def shebang_interpreter(cls, path: str) -> Optional[str]:
+        """The interpreter named on a file's `#!` line ("python" for `#!/usr/bin/env python3`)."""
+        try:
+            with open(path, "rb") as infile:
+                first_line = infile.read(cls.SHEBANG_BYTES).split(b"\n", 1)[0]
+        except OSError:
+            return None
+        if not first_line.startswith(b"#!"):
+            return None
+        
+        words = first_line[2:].decode("utf-8", "replace").split()
+        if words and os.path.basename(words[0]) == "env":
+            # Skip env's own options (`env -S python3 -u`)
+            words = [word for word in words[1:] if not word.startswith("-")]
+        if not words:
+            return None
+        interpreter = re.match(r"[a-z]*", os.path.basename(words[0]).lower()).group(0)
+        return interpreter or None
+
+
+class GitIndexEntry(NamedTuple):
+    """One path tracked in the git index, with the stat data git cached for it."""
+    path: str
+    mode: int
+    size: int
+    mtime_ns: int
+    inode: int
+    stage: int
+    skip_worktree: bool
+
+
+class GitIndex:
+    """
+    Minimal, dependency-free reader for git's index file (`.git/index`).
+    
+    Parses index versions 2, 3 and 4 (including v4 path prefix compression and
+    SHA-256 repositories), so tracked files can be listed with one sequential
+    read instead of a directory walk. Extensions (cached trees, untracked
+    cache, …) are skipped. Sparse-index directory entries are kept as-is with
+    a directory mode.
+    """
+    
+    SIGNATURE = b"DIRC"
+    SUPPORTED_VERSIONS = (2, 3, 4)
+    
+    MODE_TYPE_MASK = 0o170000
+    MODE_DIRECTORY = 0o040000
+    MODE_SYMLINK = 0o120000
+    MODE_GITLINK = 0o160000
+    
+    FLAG_EXTENDED = 0x4000
+    FLAG_STAGE_SHIFT = 12
+    NAME_LENGTH_MASK = 0x0FFF
+    EXTENDED_SKIP_WORKTREE = 0x4000
+    
+    def __init__(self, worktree: str, git_dir: str, entries: List[GitIndexEntry]):
+        self.worktree = worktree
+        self.git_dir = git_dir
+        self.entries = entries
+    
+    @staticmethod
+    def find_repository(start: str) -> Optional[Tuple[str, str]]:
+        """
+        Locate the repository containing `start`.
+        
+        Handles `.git` directories as well as `.git` files (`gitdir: …`), which
+        linked worktrees and submodules use.
+        
+        Returns:
+            (worktree root, git directory), or None outside a repository
+        """
+        path = os.path.abspath(start)
+        while True:
+            dot_git = os.path.join(path, ".git")
+            if os.path.isdir(dot_git):
+                return path, dot_git
+            if os.path.isfile(dot_git):
+                try:
+                    with open(dot_git, "r", encoding="utf-8") as pointer:
+                        content = pointer.read().strip()
+                except OSError:
+                    return None
+                if content.startswith("gitdir:"):
+                    git_dir = content[len("gitdir:"):].strip()
+                    return path, os.path.normpath(os.path.join(path, git_dir))
+                return None
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+    
+    @classmethod
+    def hash_size(cls, git_dir: str) -> int:
+        """Object id size in bytes: 32 for SHA-256 repositories, 20 otherwise."""
+        common_dir = git_dir
+        try:
+            with open(os.path.join(git_dir, "commondir"), "r", encoding="utf-8") as pointer:
+                common_dir = os.path.normpath(os.path.join(git_dir, pointer.read().strip()))
+        except OSError:
+            pass
+        try:
+            with open(os.path.join(common_dir, "config"), "r", encoding="utf-8", errors="ignore") as config:
+                if re.search(r"^\s*objectformat\s*=\s*sha256\s*$", config.read(), re.IGNORECASE | re.MULTILINE):
+                    return 32
+        except OSError:
+            pass
+        return 20
+    
+    @classmethod
+    def load(cls, start: str) -> "GitIndex":
+        """
+        Read the index of the repository containing `start`.
+        
+        Raises:
+            ValueError: If there is no repository, or its index cannot be parsed
+        """
+        location = cls.find_repository(start)
+        if location is None:
+            raise ValueError(f"No git repository found at or above {start}")
+        worktree, git_dir = location
+        
+        index_path = os.path.join(git_dir, "index")
+        try:
+            with open(index_path, "rb") as index_file:
+                data = index_file.read()
+        except FileNotFoundError:
+            # A fresh repository has no index until something is staged
+            return cls(worktree, git_dir, [])
+        except OSError as exc:
+            raise ValueError(f"Cannot read {index_path}: {exc}")
+        
+        try:
+            entries = cls.parse(data, cls.hash_size(git_dir))
+        except (ValueError, IndexError) as exc:
+            raise ValueError(f"Cannot parse {index_path}: {exc}")
+        return cls(worktree, git_dir, entries)
+    
+    @classmethod
+    def parse(cls, data: bytes, hash_size: int = 20) -> List[GitIndexEntry]:
+        """
+        Parse the entries of an index file.
+        
+        Args:
+            data: Raw content of the index file
+            hash_size: Object id size in bytes (20 for SHA-1, 32 for SHA-256)
+            
+        Returns:
+            Every entry, in index (byte-wise path) order
+        """
+        import struct
+        
+        if data[:4] != cls.SIGNATURE:
+            raise ValueError("not a git index (bad signature)")
+        version, count = struct.unpack_from(">II", data, 4)
+        if version not in cls.SUPPORTED_VERSIONS:
+            raise ValueError(f"unsupported index version {version}")
+        
+        # ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size, object id, flags
+        stat_fields = struct.Struct(">10I")
+        flags_offset = stat_fields.size + hash_size
+        fixed_size = flags_offset + 2
+        
+        entries = []
+        offset = 12
+        previous_name = b""
+        for _ in range(count):
+            (_, _, mtime_s, mtime_ns, _, inode, mode, _, _, size) = stat_fields.unpack_from(data, offset)
+            flags = int.from_bytes(data[offset + flags_offset:offset + fixed_size], "big")
+            name_start = offset + fixed_size
+            extended = 0
+            if flags & cls.FLAG_EXTENDED and version >= 3:
+                extended = int.from_bytes(data[name_start:name_start + 2], "big")
+                name_start += 2
+            
+            if version == 4:
+                # Varint: bytes to drop from the previous path, then the new suffix
+                strip, position = 0, name_start
+                byte = data[position]
+                position += 1
+                strip = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[position]
+                    position += 1
+                    strip = ((strip + 1) << 7) | (byte & 0x7F)
+                name_end = data.index(b"\0", position)
+                name = previous_name[:len(previous_name) - strip] + data[position:name_end]
+                offset = name_end + 1
+            else:
+                name_length = flags & cls.NAME_LENGTH_MASK
+                if name_length == cls.NAME_LENGTH_MASK:
+                    name_end = data.index(b"\0", name_start)
+                else:
+                    name_end = name_start + name_length
+                name = data[name_start:name_end]
+                # Entries are NUL-padded to a multiple of 8 bytes
+                offset += (name_end - offset + 8) & ~7
+            previous_name = name
+            
+            entries.append(GitIndexEntry(
+                path=name.decode("utf-8", errors="surrogateescape"),
+                mode=mode,
+                size=size,
+                mtime_ns=mtime_s * 1_000_000_000 + mtime_ns,
+                inode=inode,
+                stage=(flags >> cls.FLAG_STAGE_SHIFT) & 0x3,
+                skip_worktree=bool(extended & cls.EXTENDED_SKIP_WORKTREE),
+            ))
+        return entries
+    
+    def tracked_paths(self, prefix: str = "") -> Iterator[Tuple[str, int]]:
+        """
+        Yield the checked-out paths under `prefix`, relative to it.
+        
+        Conflicted paths (several stages) are yielded once, and entries marked
+        skip-worktree (sparse checkouts) are left out as they have no file.
+        
+        Args:
+            prefix: '/'-separated directory relative to the worktree ("" for all)
+            
+        Yields:
+            (relative path, mode) pairs
+        """
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        previous = None
+        for entry in self.entries:
+            if entry.skip_worktree or entry.path == previous:
+                continue
+            previous = entry.path
+            if entry.path.startswith(prefix):
+                yield entry.path[len(prefix):], entry.mode
+
+
+class ChunkCache:
+    """
+    Persistent on-disk cache of compressed file chunks.
+    
+    Entries are keyed by absolute path and a settings fingerprint, and are only
+    reused while the file's (size, mtime, inode) is unchanged. With `verify_hash`
+    the stored BLAKE2 content hash is checked as well, which also lets touched
+    but otherwise unchanged files be reused. The cache is trimmed to `max_bytes`
+    by evicting the least recently used chunks.
+    """
+    
+    SCHEMA_VERSION = 1
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    
+    def __init__(self,
+                cache_dir: Optional[str] = None,
+                max_bytes: int = DEFAULT_MAX_BYTES,
+                verify_hash: bool = False,
+                rebuild: bool = False):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            cache_dir: Directory holding the cache (defaults to the user cache directory)
+            max_bytes: Upper bound on the total size of cached chunks
+            verify_hash: Also require the content hash to match before reusing a chunk
+            rebuild: Drop every existing entry before use
+        """
+        self.cache_dir = cache_dir or self.default_cache_dir()
+        self.max_bytes = max_bytes
+        self.verify_hash = verify_hash
+        self.hits = 0
+        self.misses = 0
+        
+        import sqlite3
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, f"chunks-v{self.SCHEMA_VERSION}.sqlite3")
+        self._db = sqlite3.connect(self.db_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                    path TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    digest TEXT,
+                    chunk TEXT NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (path, variant)
+                )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_last_used ON chunks (last_used)")
+        if rebuild:
+            self._db.execute("DELETE FROM chunks")
+        self._db.commit()
+        self._touched: List[Tuple[float, str, str]] = []
+    
+    @staticmethod
+    def default_cache_dir() -> str:
+        """Return the per-user cache directory ($XDG_CACHE_HOME/codesqueeze)."""
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "codesqueeze")
+    
+    @staticmethod
+    def content_hasher():
+        """New hash object for incrementally hashing raw file content."""
+        return hashlib.blake2b(digest_size=16)
+    
+    @staticmethod
+    def content_digest(data: bytes) -> str:
+        """Hash raw file content for cache verification."""
+        hasher = ChunkCache.content_hasher()
+        hasher.update(data)
+        return hasher.hexdigest()
+    
+    def lookup(self, path: str, variant: str, stat_info: os.stat_result) -> Optional[Tuple[str, int, Optional[str], bool]]:
+        """
+        Look up the cached chunk of a file.
+        
+        Args:
+            path: Absolute path of the file
+            variant: Fingerprint of the settings the chunk was produced with
+            stat_info: Current stat result of the file
+            
+        Returns:
+            Tuple of (chunk, tokens, content digest, whether the stat key still
+            matches), or None if nothing is cached for the file
+        """
+        row = self._db.execute(
+            "SELECT size, mtime_ns, inode, digest, chunk, tokens FROM chunks WHERE path = ? AND variant = ?",
+            (path, variant),
+        ).fetchone()
+        if row is None:
+            return None
+        
+        size, mtime_ns, inode, digest, chunk, tokens = row
+        fresh = (size, mtime_ns, inode) == (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino)
+        return chunk, tokens, digest, fresh
+    
+    def mark_used(self, path: str, variant: str) -> None:
+        """Record that a cached chunk was reused (for LRU eviction)."""
+        self.hits += 1
+        self._touched.append((time.time(), path, variant))
+    
+    def store(self, path: str, variant: str, stat_info: os.stat_result, source_chunk: "SourceChunk") -> None:
+        """Insert or replace the cached chunk of a file."""
+        if source_chunk.from_cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, variant, stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino,
+             source_chunk.digest, source_chunk.chunk, source_chunk.tokens,
+             len(source_chunk.chunk.encode("utf-8")), time.time()),
+        )
+    
+    def flush(self) -> None:
+        """Write out usage information and commit, keeping the database open."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE chunks SET last_used = ? WHERE path = ? AND variant = ?", self._touched
+            )
+            self._touched = []
+        self._db.commit()
+    
+    def close(self) -> None:
+        """Flush usage information, enforce the size bound and close the database."""
+        self.flush()
+        self._evict()
+        self._db.commit()
+        self._db.close()
+    
+    def _evict(self) -> None:
+        """Drop least recently used chunks until the cache fits in `max_bytes`."""
+        total = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM chunks").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        # Trim a little below the limit so the next run does not evict again immediately
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for path, variant, nbytes in self._db.execute(
+            "SELECT path, variant, nbytes FROM chunks ORDER BY last_used"
+        ):
+            victims.append((path, variant))
+            freed += nbytes
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM chunks WHERE path = ? AND variant = ?", victims)
+
+
+class MemoryChunkCache:
+    """
+    In-memory chunk cache with the interface of `ChunkCache`, for the daemon.
+    
+    Entries are keyed and validated exactly like ChunkCache's and kept in an
+    LRU dictionary bounded by `max_bytes`. Misses fall through to an optional
+    persistent ChunkCache, so a restarted daemon warms up from disk.
+    """
+    
+    def __init__(self, backing: Optional[ChunkCache] = None, max_bytes: int = ChunkCache.DEFAULT_MAX_BYTES):
+        """
+        Initialize the cache.
+        
+        Args:
+            backing: Persistent cache to fall back to and write through to
+            max_bytes: Upper bound on the total size of chunks held in memory
+        """
+        from collections import OrderedDict
+        
+        self.backing = backing
+        self.max_bytes = max_bytes
+        self.verify_hash = backing.verify_hash if backing is not None else False
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+    
+    def lookup(self, path: str, variant: str, stat_info: os.stat_result) -> Optional[Tuple[str, int, Optional[str], bool]]:
+        """Look up the cached chunk of a file (see `ChunkCache.lookup`)."""
+        entry = self._entries.get((path, variant))
+        if entry is None:
+            if self.backing is None:
+                return None
+            cached = self.backing.lookup(path, variant, stat_info)
+            if cached is not None and cached[3]:
+                # Still valid on disk: keep it in memory from now on
+                self._remember(path, variant, stat_info, cached[0], cached[1], cached[2])
+            return cached
+        
+        stat_key, chunk, tokens, digest, _ = entry
+        fresh = stat_key == (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino)
+        return chunk, tokens, digest, fresh
+    
+    def mark_used(self, path: str, variant: str) -> None:
+        """Record that a cached chunk was reused."""
+        self.hits += 1
+        if (path, variant) in self._entries:
+            self._entries.move_to_end((path, variant))
+        if self.backing is not None:
+            self.backing.mark_used(path, variant)
+    
+    def store(self, path: str, variant: str, stat_info: os.stat_result, source_chunk: "SourceChunk") -> None:
+        """Insert or replace the cached chunk of a file."""
+        if source_chunk.from_cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._remember(path, variant, stat_info, source_chunk.chunk, source_chunk.tokens, source_chunk.digest)
+        if self.backing is not None:
+            self.backing.store(path, variant, stat_info, source_chunk)
+    
+    def _remember(self, path: str, variant: str, stat_info: os.stat_result,
+                chunk: str, tokens: int, digest: Optional[str]) -> None:
+        """Keep a chunk in memory, evicting the least recently used ones beyond `max_bytes`."""
+        key = (path, variant)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size_bytes -= previous[4]
+        nbytes = len(chunk.encode("utf-8"))
+        stat_key = (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino)
+        self._entries[key] = (stat_key, chunk, tokens, digest, nbytes)
+        self.size_bytes += nbytes
+        while self.size_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= evicted[4]
+    
+    def flush(self) -> None:
+        """Commit what was written through to the persistent cache."""
+        if self.backing is not None:
+            self.backing.flush()
+    
+    def close(self) -> None:
+        """Drop the in-memory entries and close the persistent cache."""
+        self._entries.clear()
+        self.size_bytes = 0
+        if self.backing is not None:
+            self.backing.close()
+
+
+class QueryIndex:
+    """
+    Persistent inverted index over the words of source files, ranked with BM25.
+    
+    Lives next to the chunk cache as a small SQLite database. Every file's
+    postings are keyed by its (size, mtime, inode), so `update()` only re-reads
+    the files that changed since they were last indexed. Identifiers are
+    indexed whole and split into their camelCase / snake_case words (lightly
+    stemmed), and the words of a file's path count toward it as well.
+    """
+    
+    SCHEMA_VERSION = 1
+    
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+    
+    # Only the start of very large files is indexed
+    MAX_INDEXED_BYTES = 1024 * 1024
+    
+    IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+    WORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Open (or create) the index database.
+        
+        Args:
+            cache_dir: Directory holding the index (defaults to the chunk cache's directory)
+        """
+        import sqlite3
+        
+        self.cache_dir = cache_dir or ChunkCache.default_cache_dir()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, f"index-v{self.SCHEMA_VERSION}.sqlite3")
+        self._db = sqlite3.connect(self.db_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, path)
+                ) WITHOUT ROWID"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS postings_path ON postings (path)")
+        self._db.commit()
+        self.indexed = 0
+    
+    @staticmethod
+    def _stem(word: str) -> str:
+        """Strip the most common English suffixes ("evicted", "evicts" → "evict")."""
+        for suffix in ("ing", "ed", "es", "s"):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                return word[:-len(suffix)]
+        return word
+    
+    @classmethod
+    def terms(cls, text: str) -> Counter:
+        """
+        Split text into index terms.
+        
+        Every identifier contributes its words (`getUserName` → get, user, name)
+        and, when that differs, the whole identifier in lower case.
+        """
+        counts = Counter()
+        for identifier, occurrences in Counter(cls.IDENTIFIER_PATTERN.findall(text)).items():
+            for term in cls._identifier_terms(identifier):
+                counts[term] += occurrences
+        return counts
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1 << 16)
+    def _identifier_terms(identifier: str) -> Tuple[str, ...]:
+        """Terms of one identifier (cached: the same names recur across a codebase)."""
+        words = [QueryIndex._stem(word.lower()) for word in QueryIndex.WORD_PATTERN.findall(identifier)]
+        terms = [word for word in words if len(word) > 1]
+        whole = identifier.strip("_").lower()
+        if len(words) > 1 and len(whole) > 1:
+            terms.append(whole)
+        return tuple(terms)
+    
+    @staticmethod
+    def _root_range(root: str) -> Tuple[str, str]:
+        """Bounds of the paths below `root`, for an index range scan."""
+        prefix = os.path.join(os.path.abspath(root), "")
+        return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    
+    def update(self, root: str, paths: List[str]) -> int:
+        """
+        Bring the index up to date for the given files of a project.
+        
+        Files whose stat key is unchanged are not read. Entries below `root`
+        whose file no longer exists are dropped.
+        
+        Args:
+            root: Project directory
+            paths: Absolute paths of the candidate files
+            
+        Returns:
+            Number of files (re-)indexed
+        """
+        known = {
+            path: (size, mtime_ns, inode)
+            for path, size, mtime_ns, inode in self._db.execute(
+                "SELECT path, size, mtime_ns, inode FROM documents WHERE path >= ? AND path < ?",
+                self._root_range(root),
+            )
+        }
+        
+        indexed = 0
+        for path in paths:
+            try:
+                stat_info = os.stat(path)
+            except OSError:
+                continue
+            key = (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino)
+            if known.get(path) == key:
+                continue
+            
+            try:
+                with open(path, "rb") as source:
+                    data = source.read(self.MAX_INDEXED_BYTES)
+            except OSError:
+                continue
+            if b"\0" in data[:FileClassifier.SNIFF_BYTES]:
+                data = b""  # binary: only its path is indexed
+            counts = self.terms(data.decode("utf-8", errors="ignore"))
+            counts.update(self.terms(os.path.relpath(path, root)))
+            
+            self._db.execute("DELETE FROM postings WHERE path = ?", (path,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (path, *key, sum(counts.values())),
+            )
+            self._db.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?)",
+                ((term, path, tf) for term, tf in counts.items()),
+            )
+            indexed += 1
+        
+        candidates = set(paths)
+        removed = [(path,) for path in known if path not in candidates and not os.path.exists(path)]
+        if removed:
+            self._db.executemany("DELETE FROM postings WHERE path = ?", removed)
+            self._db.executemany("DELETE FROM documents WHERE path = ?", removed)
+        self._db.commit()
+        self.indexed += indexed
+        return indexed
+    
+    def rank(self, root: str, paths: List[str], query: str) -> dict:
+        """
+        Score files against a query with Okapi BM25.
+        
+        Document frequencies and the average length are taken over `paths`
+        only, so every project is ranked as a corpus of its own.
+        
+        Args:
+            root: Project directory
+            paths: Absolute paths of the candidate files (already indexed with `update`)
+            query: Free-text query
+            
+        Returns:
+            Mapping of path to score, for the files matching at least one term
+        """
+        candidates = set(paths)
+        lengths = {
+            path: length
+            for path, length in self._db.execute(
+                "SELECT path, length FROM documents WHERE path >= ? AND path < ?",
+                self._root_range(root),
+            )
+            if path in candidates
+        }
+        if not lengths:
+            return {}
+        document_count = len(lengths)
+        average_length = max(1.0, sum(lengths.values()) / document_count)
+        
+        scores = Counter()
+        for term in self.terms(query):
+            postings = [(path, tf) for path, tf in self._db.execute(
+                "SELECT path, tf FROM postings WHERE term = ?", (term,)
+            ) if path in lengths]
+            if not postings:
+                continue
+            
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for path, tf in postings:
+                normalization = self.K1 * (1 - self.B + self.B * lengths[path] / average_length)
+                scores[path] += idf * tf * (self.K1 + 1) / (tf + normalization)
+        return dict(scores)
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class ImportGraph:
+    """
+    Persistent cache of the imports of source files, for --entry closures.
+    
+    Every file's import specifiers are parsed once and stored with its
+    (size, mtime, inode), so `update()` only re-parses files that changed.
+    Specifiers are resolved against the project's files when the closure is
+    computed, which keeps cached entries valid when other files come and go.
+    
+    Python is parsed with `ast`; JavaScript/TypeScript `import`/`export from`/
+    `require()`, Go `import` and Rust `mod`/`use` with regular expressions.
+    Only imports that resolve to files of the project are followed.
+    """
+    
+    SCHEMA_VERSION = 1
+    
+    PYTHON_EXTENSIONS = (".py", ".pyi")
+    SCRIPT_EXTENSIONS = (".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts", ".vue", ".svelte")
+    SCRIPT_RESOLVE_EXTENSIONS = (".ts", ".tsx", ".d.ts", ".js", ".jsx", ".mjs", ".cjs", ".mts", ".cts",
+                                ".json", ".vue", ".svelte")
+    
+    SCRIPT_IMPORT_PATTERN = re.compile(
+        r"""(?:\bimport\s*(?:[\w*{}\s,$]+?\s*from\s*)?|\bexport\s*[\w*{}\s,$]*?\s*from\s*)['"]([^'"\n]+)['"]"""
+        r"""|\b(?:require|import)\s*\(\s*['"]([^'"\n]+)['"]\s*\)"""
+    )
+    GO_IMPORT_PATTERN = re.compile(r'^\s*import\s*(?:\(([^)]*)\)|[\w.]*\s*"([^"]+)")', re.MULTILINE)
+    GO_QUOTED_PATTERN = re.compile(r'"([^"]+)"')
+    RUST_MOD_PATTERN = re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?mod\s+(\w+)\s*;", re.MULTILINE)
+    RUST_USE_PATTERN = re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?use\s+((?:crate|self|super)(?:::\w+)+)", re.MULTILINE)
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Open (or create) the graph database.
+        
+        Args:
+            cache_dir: Directory holding the graph (defaults to the chunk cache's directory)
+        """
+        import sqlite3
+        
+        self.cache_dir = cache_dir or ChunkCache.default_cache_dir()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db_path = os.path.join(self.cache_dir, f"imports-v{self.SCHEMA_VERSION}.sqlite3")
+        self._db = sqlite3.connect(self.db_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS imports (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    specifiers TEXT NOT NULL
+                )"""
+        )
+        self._db.commit()
+        self.parsed = 0
+        self._go_modules = {}
+        self._go_packages = {}
+    
+    @classmethod
+    def parse(cls, path: str, text: str) -> List[str]:
+        """
+        Extract the import specifiers of a source file.
+        
+        Specifiers are tagged with their kind: "py:" (dotted module, with
+        leading dots for relative imports), "js:", "go:", "rs-mod:" and "rs-use:".
+        """
+        lowered = path.lower()
+        if lowered.endswith(cls.PYTHON_EXTENSIONS):
+            return cls._parse_python(text)
+        if lowered.endswith(cls.SCRIPT_EXTENSIONS):
+            return [f"js:{a or b}" for a, b in cls.SCRIPT_IMPORT_PATTERN.findall(text)]
+        if lowered.endswith(".go"):
+            specifiers = []
+            for block, single in cls.GO_IMPORT_PATTERN.findall(text):
+                imports = cls.GO_QUOTED_PATTERN.findall(block) if block else [single]
+                specifiers.extend(f"go:{name}" for name in imports)
+            return specifiers
+        if lowered.endswith(".rs"):
+            return ([f"rs-mod:{name}" for name in cls.RUST_MOD_PATTERN.findall(text)]
+                    + [f"rs-use:{name}" for name in cls.RUST_USE_PATTERN.findall(text)])
+        return []
+    
+    @staticmethod
+    def _parse_python(text: str) -> List[str]:
+        """Imports of a Python module; `from m import n` yields both m and m.n (n may be a module)."""
+        import ast
+        
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            return []
+        
+        specifiers = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                specifiers.extend(f"py:{alias.name}" for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                module = "." * node.level + (node.module or "")
+                specifiers.append(f"py:{module}")
+                separator = "" if module.endswith(".") else "."
+                specifiers.extend(f"py:{module}{separator}{alias.name}" for alias in node.names if alias.name != "*")
+        return specifiers
+    
+    def update(self, paths: List[str]) -> dict:
+        """
+        Parse the files that changed since they were last seen.
+        
+        Args:
+            paths: Absolute paths of the files to bring up to date
+            
+        Returns:
+            Mapping of every readable path to its import specifiers
+        """
+        import json
+        
+        graph = {}
+        for path in paths:
+            try:
+                stat_info = os.stat(path)
+            except OSError:
+                continue
+            key = (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino)
+            row = self._db.execute(
+                "SELECT size, mtime_ns, inode, specifiers FROM imports WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None and tuple(row[:3]) == key:
+                graph[path] = json.loads(row[3])
+                continue
+            
+            try:
+                with open(path, "rb") as source:
+                    text = source.read().decode("utf-8", errors="ignore")
+            except OSError:
+                continue
+            graph[path] = self.parse(path, text)
+            self._db.execute(
+                "INSERT OR REPLACE INTO imports VALUES (?, ?, ?, ?, ?)",
+                (path, *key, json.dumps(graph[path])),
+            )
+            self.parsed += 1
+        self._db.commit()
+        return graph
+    
+    def closure(self, root: str, entries: List[str], files: List[str]) -> List[str]:
+        """
+        Compute the files reachable from the entry points.
+        
+        Args:
+            root: Project directory
+            entries: Absolute paths of the entry files
+            files: Absolute paths of every file that may be reached
+            
+        Returns:
+            The reachable files (entries included), in the order of `files`
+        """
+        known = set(files) | set(entries)
+        self._go_packages = {}
+        for path in known:
+            if path.endswith(".go") and not path.endswith("_test.go"):
+                self._go_packages.setdefault(os.path.dirname(path), []).append(path)
+        python_roots = [root, os.path.join(root, "src")]
+        for entry in entries:
+            # The entry's own directory (as for a script) and the directory above its top-level package
+            directory = os.path.dirname(entry)
+            python_roots.append(directory)
+            while os.path.join(directory, "__init__.py") in known and os.path.dirname(directory) != directory:
+                directory = os.path.dirname(directory)
+            python_roots.append(directory)
+        python_roots = list(dict.fromkeys(python_roots))
+        
+        reached = set()
+        pending = [entry for entry in entries if entry in known]
+        while pending:
+            batch = [path for path in dict.fromkeys(pending) if path not in reached]
+            reached.update(batch)
+            pending = []
+            for path, specifiers in self.update(batch).items():
+                for specifier in specifiers:
+                    pending.extend(self._resolve(path, specifier, known, python_roots))
+                if path.endswith(".go"):
+                    # A Go package is every file of its directory
+                    pending.extend(self._go_packages.get(os.path.dirname(path), []))
+        
+        return [path for path in dict.fromkeys(files + entries) if path in reached]
+    
+    def _resolve(self, path: str, specifier: str, known: set, python_roots: List[str]) -> List[str]:
+        """Project files an import specifier of `path` refers to."""
+        kind, _, name = specifier.partition(":")
+        if kind == "py":
+            return self._resolve_python(path, name, known, python_roots)
+        if kind == "js":
+            return self._resolve_script(path, name, known)
+        if kind == "go":
+            return self._resolve_go(path, name, known)
+        if kind in ("rs-mod", "rs-use"):
+            return self._resolve_rust(path, kind, name, known)
+        return []
+    
+    @staticmethod
+    def _resolve_python(path: str, name: str, known: set, python_roots: List[str]) -> List[str]:
+        """Module file (and enclosing package __init__ files) of a Python import."""
+        level = len(name) - len(name.lstrip("."))
+        parts = [part for part in name.lstrip(".").split(".") if part]
+        if level:
+            base = os.path.dirname(path)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            bases = [base]
+        else:
+            bases = python_roots
+        
+        for base in bases:
+            found = []
+            directory = base
+            for index, part in enumerate(parts):
+                directory = os.path.join(directory, part)
+                package_init = os.path.join(directory, "__init__.py")
+                if package_init in known:
+                    found.append(package_init)
+                if index == len(parts) - 1:
+                    for candidate in (directory + ".py", directory + ".pyi"):
+                        if candidate in known:
+                            found.append(candidate)
+            if level:
+                # The package a relative import starts from is initialised as well
+                package_init = os.path.join(base, "__init__.py")
+                if package_init in known and package_init != path:
+                    found.append(package_init)
+            if found:
+                return found
+        return []
+    
+    def _resolve_script(self, path: str, name: str, known: set) -> List[str]:
+        """File of a relative JavaScript/TypeScript import (packages are not followed)."""
+        if not name.startswith((".", "/")):
+            return []
+        target = os.path.normpath(os.path.join(os.path.dirname(path), name.split("?")[0]))
+        stem, extension = os.path.splitext(target)
+        candidates = [target]
+        if extension in (".js", ".jsx", ".mjs", ".cjs"):
+            # TypeScript sources are imported under their compiled name
+            candidates += [stem + ext for ext in (".ts", ".tsx", ".mts", ".cts")]
+        candidates += [target + ext for ext in self.SCRIPT_RESOLVE_EXTENSIONS]
+        candidates += [os.path.join(target, "index" + ext) for ext in self.SCRIPT_RESOLVE_EXTENSIONS]
+        for candidate in candidates:
+            if candidate in known:
+                return [candidate]
+        return []
+    
+    def _go_module(self, directory: str) -> Optional[Tuple[str, str]]:
+        """(module root, module path) of the go.mod governing a directory."""
+        if directory in self._go_modules:
+            return self._go_modules[directory]
+        
+        module = None
+        go_mod = os.path.join(directory, "go.mod")
+        if os.path.isfile(go_mod):
+            try:
+                with open(go_mod, "r", encoding="utf-8", errors="ignore") as mod_file:
+                    match = re.search(r"^module\s+(\S+)", mod_file.read(), re.MULTILINE)
+                if match:
+                    module = (directory, match.group(1).strip('"'))
+            except OSError:
+                pass
+        elif os.path.dirname(directory) != directory:
+            module = self._go_module(os.path.dirname(directory))
+        self._go_modules[directory] = module
+        return module
+    
+    def _resolve_go(self, path: str, name: str, known: set) -> List[str]:
+        """Files of a Go package imported from the same module."""
+        module = self._go_module(os.path.dirname(path))
+        if module is None:
+            return []
+        module_root, module_path = module
+        if name != module_path and not name.startswith(module_path + "/"):
+            return []
+        directory = os.path.join(module_root, *name[len(module_path):].strip("/").split("/"))
+        return self._go_packages.get(os.path.normpath(directory), [])
+    
+    @staticmethod
+    def _rust_module_directory(path: str) -> str:
+        """Directory holding the child modules of a Rust source file."""
+        directory, file_name = os.path.split(path)
+        if file_name in ("mod.rs", "lib.rs", "main.rs"):
+            return directory
+        return os.path.join(directory, os.path.splitext(file_name)[0])
+    
+    @classmethod
+    def _rust_crate_root(cls, path: str) -> str:
+        """Directory of the crate root (lib.rs / main.rs) above a Rust source file."""
+        directory = os.path.dirname(path)
+        while True:
+            if any(os.path.isfile(os.path.join(directory, name)) for name in ("lib.rs", "main.rs")):
+                return directory
+            parent = os.path.dirname(directory)
+            if parent == directory or os.path.isfile(os.path.join(directory, "Cargo.toml")):
+                return os.path.dirname(path)
+            directory = parent
+    
+    @classmethod
+    def _resolve_rust(cls, path: str, kind: str, name: str, known: set) -> List[str]:
+        """File of a Rust `mod name;` declaration or of the module a `use` path points into."""
+        if kind == "rs-mod":
+            directory = cls._rust_module_directory(path)
+            segments = [name]
+        else:
+            segments = name.split("::")
+            head, segments = segments[0], segments[1:]
+            if head == "crate":
+                directory = cls._rust_crate_root(path)
+            else:
+                directory = cls._rust_module_directory(path)
+                if head == "super":
+                    directory = os.path.dirname(directory)
+                while segments and segments[0] == "super":
+                    directory = os.path.dirname(directory)
+                    segments = segments[1:]
+        
+        # The longest prefix of the path that names a module file
+        for length in range(len(segments), 0, -1):
+            module = os.path.join(directory, *segments[:length])
+            for candidate in (module + ".rs", os.path.join(module, "mod.rs")):
+                if candidate in known:
+                    return [candidate]
+        return []
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._db.close()
+
+
+class HeuristicTokenizer:
+    """Dependency-free token estimate (4 chars ≈ 1 token)."""
+    
+    name = "heuristic"
+    
+    def count(self, text: str) -> int:
+        """Estimate the number of tokens in `text`."""
+        return len(text) // StreamingOutputWriter.CHARS_PER_TOKEN
+    
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Estimate the number of tokens of several texts."""
+        return [self.count(text) for text in texts]
+    
+    def count_pieces(self, pieces: Iterable[str]) -> int:
+        """Estimate the number of tokens of a text given as consecutive pieces."""
+        return sum(len(piece) for piece in pieces) // StreamingOutputWriter.CHARS_PER_TOKEN
+
+
+class BPETokenizer:
+    """
+    Offline byte-level BPE token counter.
+    
+    Loads a local tiktoken-style rank file (one "<base64 token> <rank>" pair per
+    line, e.g. cl100k_base.tiktoken) and never touches the network. Text is
+    split with a cl100k-compatible pre-tokenizer pattern and each piece is merged
+    by rank. Piece counts are memoised, since identifiers and keywords repeat
+    heavily across a codebase.
+    """
+    
+    # cl100k_base split pattern, with \p{L} / \p{N} expressed in `re` syntax
+    PRE_TOKENIZER = re.compile(
+        r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)"""
+        r"""|(?:[^\r\n\w]|_)?[^\W\d_]+"""
+        r"""|\d{1,3}"""
+        r"""| ?(?:[^\s\w]|_)+[\r\n]*"""
+        r"""|\s*[\r\n]+"""
+        r"""|\s+(?!\S)"""
+        r"""|\s+"""
+    )
+    
+    # Pieces longer than this are counted in windows to keep merging linear
+    MAX_PIECE_BYTES = 512
+    PIECE_CACHE_SIZE = 1 << 18
+    
+    def __init__(self, ranks: dict, name: str = "bpe"):
+        """
+        Create a tokenizer from a rank table.
+        
+        Args:
+            ranks: Mapping of token bytes to merge rank
+            name: Identifier of the vocabulary (used in cache keys)
+        """
+        self.ranks = ranks
+        self.name = name
+        self._piece_cache = {}
+    
+    @classmethod
+    def from_file(cls, vocab_path: str) -> "BPETokenizer":
+        """
+        Load a tiktoken-style rank file.
+        
+        Args:
+            vocab_path: Path to the vocabulary file
+            
+        Returns:
+            The tokenizer
+            
+        Raises:
+            ValueError: If the file is not a valid rank file
+        """
+        import base64
+        
+        ranks = {}
+        with open(vocab_path, "rb") as vocab_file:
+            for line_number, line in enumerate(vocab_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+                except ValueError as exc:
+                    raise ValueError(f"{vocab_path}:{line_number}: invalid vocabulary line") from exc
+        if not ranks:
+            raise ValueError(f"{vocab_path}: empty vocabulary")
+        
+        stat_info = os.stat(vocab_path)
+        name = f"bpe:{os.path.basename(vocab_path)}:{stat_info.st_size}:{len(ranks)}"
+        return cls(ranks, name)
+    
+    def count(self, text: str) -> int:
+        """Count the number of tokens in `text`."""
+        cache = self._piece_cache
+        total = 0
+        for piece in self.PRE_TOKENIZER.findall(text):
+            tokens = cache.get(piece)
+            if tokens is None:
+                tokens = self._count_piece(piece.encode("utf-8"))
+                if len(cache) >= self.PIECE_CACHE_SIZE:
+                    cache.clear()
+                cache[piece] = tokens
+            total += tokens
+        return total
+    
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Count the tokens of several texts, sharing the piece cache."""
+        return [self.count(text) for text in texts]
+    
+    def count_pieces(self, pieces: Iterable[str]) -> int:
+        """
+        Count the tokens of a text given as consecutive pieces.
+        
+        Pieces are counted independently, so a word cut at a piece boundary may
+        count as one token more than in the joined text.
+        """
+        return sum(self.count(piece) for piece in pieces)
+    
+    def _count_piece(self, piece: bytes) -> int:
+        """Count the tokens a single pre-tokenized piece merges into."""
+        if piece in self.ranks:
+            return 1
+        if len(piece) > self.MAX_PIECE_BYTES:
+            return sum(
+                self._count_piece(piece[i:i + self.MAX_PIECE_BYTES])
+                for i in range(0, len(piece), self.MAX_PIECE_BYTES)
+            )
+        
+        ranks = self.ranks
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank, best_index = None, -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank, best_index = rank, i
+            if best_index < 0:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return len(parts)
+
+
+def knapsack_select(weights: List[int], values: List[float], capacity: int,
+                    resolution: int = 2048) -> List[int]:
+    """
+    Choose the subset of items with the highest total value that fits `capacity`.
+    
+    Classic 0/1 knapsack dynamic programme. Weights are scaled (rounding up, so
+    the chosen set never exceeds `capacity`) to at most `resolution` buckets,
+    which keeps the table small for multi-million-token budgets.
+    
+    Args:
+        weights: Weight (token count) of each item
+        values: Value (priority) of each item
+        capacity: Maximum total weight
+        resolution: Maximum number of capacity buckets
+        
+    Returns:
+        Sorted indices of the chosen items
+    """
+    if capacity <= 0:
+        return [i for i, weight in enumerate(weights) if weight <= 0]
+    if sum(weights) <= capacity:
+        return list(range(len(weights)))
+    
+    scale = max(1, -(-capacity // resolution))
+    slots = capacity // scale
+    scaled = [-(-weight // scale) for weight in weights]
+    
+    best = [0.0] * (slots + 1)
+    decisions = []
+    for weight, value in zip(scaled, values):
+        if weight > slots:
+            decisions.append(None)
+            continue
+        candidates = [total + value for total in best[:slots + 1 - weight]]
+        taken = bytes(a < b for a, b in zip(best[weight:], candidates))
+        best[weight:] = [max(a, b) for a, b in zip(best[weight:], candidates)]
+        decisions.append(taken)
+    
+    # Walk the decisions backwards to recover the chosen items
+    chosen = []
+    slot = slots
+    for index in range(len(weights) - 1, -1, -1):
+        taken = decisions[index]
+        weight = scaled[index]
+        if taken is not None and slot >= weight and taken[slot - weight]:
+            chosen.append(index)
+            slot -= weight
+    return sorted(chosen)
+
+
+def multiple_choice_knapsack(groups: List[List[Tuple[int, float]]], capacity: int,
+                            resolution: int = 2048) -> List[Optional[int]]:
+    """
+    Choose at most one option per group so that the total value is highest within `capacity`.
+    
+    Multiple-choice variant of `knapsack_select`, with the same weight scaling.
+    Each file is a group whose options are its renderings (full, skeleton).
+    
+    Args:
+        groups: (weight, value) options of each group
+        capacity: Maximum total weight
+        resolution: Maximum number of capacity buckets
+        
+    Returns:
+        Index of the chosen option of every group, or None where none is taken
+    """
+    if capacity <= 0:
+        return [next((k for k, (weight, _) in enumerate(group) if weight <= 0), None) for group in groups]
+    
+    scale = max(1, -(-capacity // resolution))
+    slots = capacity // scale
+    
+    best = [0.0] * (slots + 1)
+    decisions = []
+    for group in groups:
+        current = best[:]
+        choice = bytearray(slots + 1)
+        for k, (weight, value) in enumerate(group):
+            weight = -(-weight // scale)
+            if weight > slots:
+                continue
+            candidates = [total + value for total in best[:slots + 1 - weight]]
+            better = [a < b for a, b in zip(current[weight:], candidates)]
+            current[weight:] = [b if take else a for a, b, take in zip(current[weight:], candidates, better)]
+            choice[weight:] = bytes(k + 1 if take else old for old, take in zip(choice[weight:], better))
+        best = current
+        decisions.append(choice)
+    
+    # Walk the decisions backwards to recover the chosen options
+    chosen: List[Optional[int]] = [None] * len(groups)
+    slot = slots
+    for index in range(len(groups) - 1, -1, -1):
+        k = decisions[index][slot]
+        if k:
+            chosen[index] = k - 1
+            slot -= -(-groups[index][k - 1][0] // scale)
+    return chosen
+
+
+class CLikeSyntax(NamedTuple):
+    """Lexical details the comment/whitespace stripper needs for one language family."""
+    line_comment: Optional[str] = "//"
+    nested_comments: bool = False
+    backtick_strings: bool = False
+    raw_backticks: bool = False
+    regex_literals: bool = False
+    triple_quotes: bool = False
+    rust_literals: bool = False
+    cpp_raw_strings: bool = False
+    verbatim_strings: bool = False
+
+
+# Extensions of each C-family language, shared by the minifier and the skeleton renderer.
+# ".m" is left out: it is MATLAB as often as Objective-C (".mm" is only Objective-C++).
+C_LIKE_SYNTAXES = (
+    (["c", "h", "cpp", "cc", "cxx", "hpp", "hh", "hxx", "mm"], CLikeSyntax(cpp_raw_strings=True)),
+    (["java"], CLikeSyntax(triple_quotes=True)),
+    (["cs"], CLikeSyntax(triple_quotes=True, verbatim_strings=True)),
+    (["js", "mjs", "cjs", "ts", "mts", "cts"], CLikeSyntax(backtick_strings=True, regex_literals=True)),
+    (["go"], CLikeSyntax(raw_backticks=True)),
+    (["rs"], CLikeSyntax(nested_comments=True, rust_literals=True)),
+    (["swift", "kt", "kts", "scala"], CLikeSyntax(nested_comments=True, triple_quotes=True)),
+    (["dart"], CLikeSyntax(triple_quotes=True)),
+)
+# Stylesheets are minified like the C family but have no skeleton
+STYLESHEET_SYNTAXES = (
+    (["css"], CLikeSyntax(line_comment=None)),
+    (["scss", "less"], CLikeSyntax()),
+)
+
+
+class SourceMinifier:
+    """
+    Pluggable, per-language minification stage.
+    
+    Minifiers are looked up by file extension in `MINIFIERS`, and new ones can be
+    added with `register`. Python goes through `tokenize` (comments, docstrings
+    and blank lines dropped, logical lines and one-space indentation kept);
+    C-, Java- and JS-family languages go through a small lexer that strips
+    comments and collapses whitespace while keeping newlines, so preprocessor
+    lines and semicolon insertion keep working. Everything else only loses
+    trailing whitespace and repeated blank lines. If a minifier fails, the file
+    is emitted unchanged.
+    """
+    
+    MINIFIERS: dict = {}
+    
+    # Keywords after which a "/" in JavaScript starts a regular expression
+    REGEX_KEYWORDS = frozenset({
+        "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+        "throw", "case", "do", "else", "yield", "await",
+    })
+    
+    @classmethod
+    def register(cls, extensions: Iterable[str], minifier: Callable[[str], str]) -> None:
+        """
+        Register a minifier for one or more file extensions (without dots).
+        
+        Args:
+            extensions: File extensions the minifier handles
+            minifier: Function mapping source text to minified text
+        """
+        for extension in extensions:
+            cls.MINIFIERS[extension.lower()] = minifier
+    
+    @classmethod
+    def minify(cls, relative_path: str, text: str) -> str:
+        """
+        Minify a file's content, falling back to the original text on any failure.
+        
+        Args:
+            relative_path: Path of the file (its extension picks the minifier)
+            text: Decoded file content
+            
+        Returns:
+            Minified text
+        """
+        extension = os.path.splitext(relative_path)[1].lstrip(".").lower()
+        minifier = cls.MINIFIERS.get(extension, cls.minify_generic)
+        try:
+            return minifier(text)
+        except Exception:
+            return text
+    
+    @staticmethod
+    def minify_generic(text: str) -> str:
+        """Strip trailing whitespace and collapse runs of blank lines."""
+        lines = []
+        for line in text.split("\n"):
+            line = line.rstrip()
+            if line or (lines and lines[-1]):
+                lines.append(line)
+        while lines and not lines[-1]:
+            lines.pop()
+        return "\n".join(lines)
+    
+    @staticmethod
+    def minify_python(text: str) -> str:
+        """
+        Minify Python source with `tokenize`.
+        
+        Comments, docstrings (and other bare string statements) and blank lines
+        are dropped, each logical line is rebuilt on one physical line with only
+        the whitespace its tokens need, and indentation becomes one space per
+        level. A block whose only statement was a docstring gets `...` instead.
+        
+        Raises:
+            tokenize.TokenError, SyntaxError: If the source cannot be tokenized
+        """
+        import tokenize
+        
+        source_lines = text.splitlines(keepends=True)
+        
+        def source_slice(start: Tuple[int, int], end: Tuple[int, int]) -> str:
+            # Token text straight from the source (keeps f-strings byte-exact)
+            if start[0] == end[0]:
+                return source_lines[start[0] - 1][start[1]:end[1]]
+            parts = [source_lines[start[0] - 1][start[1]:]]
+            parts.extend(source_lines[start[0]:end[0] - 1])
+            parts.append(source_lines[end[0] - 1][:end[1]])
+            return "".join(parts)
+        
+        fstring_start = getattr(tokenize, "FSTRING_START", None)
+        fstring_end = getattr(tokenize, "FSTRING_END", None)
+        skipped = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING}
+        
+        output = []
+        level = 0
+        line_tokens: List[Tuple[int, str]] = []
+        after_indent = False
+        fstring_depth = 0
+        fstring_begin = None
+        
+        tokens = list(tokenize.generate_tokens(io.StringIO(text).readline))
+        for index, token in enumerate(tokens):
+            kind = token.type
+            if fstring_depth:
+                # Inside an f-string: wait for its end and keep it verbatim
+                if kind == fstring_start:
+                    fstring_depth += 1
+                elif kind == fstring_end:
+                    fstring_depth -= 1
+                    if not fstring_depth:
+                        line_tokens.append((tokenize.STRING, source_slice(fstring_begin, token.end)))
+                continue
+            if kind == fstring_start:
+                fstring_depth, fstring_begin = 1, token.start
+                continue
+            if kind in skipped:
+                continue
+            if kind == tokenize.INDENT:
+                level += 1
+                after_indent = True
+                continue
+            if kind == tokenize.DEDENT:
+                level -= 1
+                continue
+            if kind in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                if line_tokens:
+                    if all(k == tokenize.STRING and "f" not in t[:t.find(t[-1])].lower()
+                        for k, t in line_tokens):
+                        # Bare (non-f-)string statement such as a docstring: drop it,
+                        # unless it is the only statement of its block
+                        following = next(
+                            (tokens[j].type for j in range(index + 1, len(tokens))
+                             if tokens[j].type not in skipped), None
+                        )
+                        if after_indent and following in (tokenize.DEDENT, tokenize.ENDMARKER):
+                            output.append(" " * level + "...")
+                    else:
+                        pieces = [line_tokens[0][1]]
+                        for (previous_kind, previous), (_, current) in zip(line_tokens, line_tokens[1:]):
+                            # Only keep a space where two words (or a number and a dot) would merge
+                            word_before = previous[-1:].isalnum() or previous[-1:] == "_"
+                            word_after = current[:1].isalnum() or current[:1] == "_"
+                            if ((word_before and (word_after or current[:1] in "\"'"))
+                                    or (previous_kind == tokenize.NUMBER and (word_after or current[:1] == "."))
+                                    or (previous[-1:] in "\"'" and current[:1] in "\"'")):
+                                pieces.append(" ")
+                            pieces.append(current)
+                        output.append(" " * level + "".join(pieces))
+                        after_indent = False
+                    line_tokens = []
+                continue
+            line_tokens.append((kind, source_slice(token.start, token.end)))
+        
+        return "\n".join(output)
+    
+    @classmethod
+    def minify_c_like(cls, text: str, syntax: CLikeSyntax) -> str:
+        """
+        Strip comments and collapse whitespace in C-, Java- and JS-family source.
+        
+        String, character, template, raw-string and (for JavaScript) regular
+        expression literals are copied verbatim. Any run of whitespace and
+        comments becomes a single newline if it contained one, otherwise a
+        single space.
+        
+        Raises:
+            ValueError: On an unterminated block comment or raw string
+        """
+        out: List[str] = []
+        pending = ""
+        i, n = 0, len(text)
+        last_code = ""
+        
+        def emit(piece: str) -> None:
+            nonlocal pending, last_code
+            if pending and out:
+                out.append(pending)
+            pending = ""
+            out.append(piece)
+            last_code = piece
+        
+        def whitespace(newline: bool) -> None:
+            nonlocal pending
+            pending = "\n" if newline or pending == "\n" else " "
+        
+        def scan_quoted(start: int, quote: str, escapes: bool = True, multiline: bool = False) -> int:
+            # Index just past the closing quote (or the end of the line if unterminated)
+            j = start + len(quote)
+            while j < n:
+                if escapes and text[j] == "\\":
+                    j += 2
+                    continue
+                if text.startswith(quote, j):
+                    return j + len(quote)
+                if text[j] == "\n" and not multiline:
+                    return j
+                j += 1
+            return n
+        
+        while i < n:
+            char = text[i]
+            previous = text[i - 1] if i else ""
+            
+            if char in " \t\r\n\f\v":
+                whitespace(char == "\n")
+                i += 1
+            elif syntax.line_comment and text.startswith(syntax.line_comment, i):
+                end = text.find("\n", i)
+                i = n if end == -1 else end
+                whitespace(False)
+            elif text.startswith("/*", i):
+                depth, j = 1, i + 2
+                while depth:
+                    close = text.find("*/", j)
+                    if close == -1:
+                        raise ValueError("unterminated block comment")
+                    opening = text.find("/*", j) if syntax.nested_comments else -1
+                    if opening != -1 and opening < close:
+                        depth, j = depth + 1, opening + 2
+                    else:
+                        depth, j = depth - 1, close + 2
+                whitespace("\n" in text[i:j])
+                i = j
+            elif syntax.triple_quotes and text.startswith('"""', i):
+                end = scan_quoted(i, '"""', multiline=True)
+                emit(text[i:end])
+                i = end
+            elif syntax.verbatim_strings and text.startswith('@"', i):
+                j = i + 2
+                while j < n and not (text[j] == '"' and text[j + 1:j + 2] != '"'):
+                    j += 2 if text[j] == '"' else 1
+                emit(text[i:j + 1])
+                i = j + 1
+            elif (syntax.cpp_raw_strings and text.startswith('R"', i)
+                    and not (previous.isalnum() and previous not in "uUL8") and previous != "_"):
+                opening = text.find("(", i + 2)
+                delimiter = text[i + 2:opening]
+                end = text.find(f"){delimiter}\"", opening)
+                if opening == -1 or end == -1:
+                    raise ValueError("unterminated raw string")
+                end += len(delimiter) + 2
+                emit(text[i:end])
+                i = end
+            elif (syntax.rust_literals and char in "rb" and not (previous.isalnum() or previous == "_")
+                    and re.match(r"b?r#*\"", text[i:i + 260])):
+                prefix = re.match(r"b?r(#*)\"", text[i:]).group(0)
+                hashes = prefix.count("#")
+                end = text.find('"' + "#" * hashes, i + len(prefix))
+                if end == -1:
+                    raise ValueError("unterminated raw string")
+                end += 1 + hashes
+                emit(text[i:end])
+                i = end
+            elif char == "'" and syntax.rust_literals:
+                # Character literal ('a', '\n', '\u{1F600}') or lifetime ('a)
+                literal = re.match(r"'(?:\\(?:u\{[0-9a-fA-F]*\}|x..|.)|[^'\\\n])'", text[i:i + 16])
+                end = i + len(literal.group(0)) if literal else i + 1
+                emit(text[i:end])
+                i = end
+            elif char == "`" and syntax.backtick_strings:
+                end = cls.template_literal_end(text, i)
+                emit(text[i:end])
+                i = end
+            elif char == "'" and cls.is_digit_separator(text, i):
+                emit(char)
+                i += 1
+            elif char in "\"'":
+                end = scan_quoted(i, char)
+                emit(text[i:end])
+                i = end
+            elif char == "`" and syntax.raw_backticks:
+                end = scan_quoted(i, char, escapes=False, multiline=True)
+                emit(text[i:end])
+                i = end
+            elif char == "/" and syntax.regex_literals and cls._regex_allowed(last_code):
+                j, in_class = i + 1, False
+                while j < n and text[j] != "\n":
+                    if text[j] == "\\":
+                        j += 2
+                        continue
+                    if text[j] == "[":
+                        in_class = True
+                    elif text[j] == "]":
+                        in_class = False
+                    elif text[j] == "/" and not in_class:
+                        break
+                    j += 1
+                j += 1
+                while j < n and (text[j].isalnum() or text[j] == "_"):
+                    j += 1
+                emit(text[i:j])
+                i = j
+            else:
+                j = i + 1
+                if char.isalnum() or char == "_" or char == "$":
+                    while j < n and (text[j].isalnum() or text[j] in "_$"):
+                        j += 1
+                emit(text[i:j])
+                i = j
+        
+        return "".join(out)
+    
+    # Character literal prefixes (L'x', u'x', U'x', u8'x') that end in an alphanumeric
+    CHAR_PREFIX = re.compile(r"(?<![\w$])(?:u8|[LuU])$")
+    
+    @classmethod
+    def is_digit_separator(cls, text: str, index: int) -> bool:
+        """Whether the quote at `index` continues a token (C++14's 1'000'000) rather than opening a literal."""
+        if not index or not text[index - 1].isalnum():
+            return False
+        return not cls.CHAR_PREFIX.search(text, max(0, index - 3), index)
+    
+    @staticmethod
+    def template_literal_end(text: str, start: int) -> int:
+        """
+        Index just past the JavaScript template literal starting at `start`.
+        
+        `${…}` substitutions are followed with a stack of brace depths, so the
+        strings, comments and template literals nested inside them do not end
+        the literal early.
+        
+        Raises:
+            ValueError: If the literal is not terminated
+        """
+        # "`" while in literal text, the brace depth while in a substitution
+        stack: List[Union[str, int]] = ["`"]
+        i, n = start + 1, len(text)
+        while i < n:
+            char = text[i]
+            if stack[-1] == "`":
+                if char == "\\":
+                    i += 2
+                    continue
+                if char == "`":
+                    stack.pop()
+                    i += 1
+                    if not stack:
+                        return i
+                    continue
+                if text.startswith("${", i):
+                    stack.append(0)
+                    i += 2
+                    continue
+            elif char in "\"'":
+                j = i + 1
+                while j < n and text[j] != char:
+                    if text[j] == "\n":
+                        raise ValueError("unterminated string in template literal")
+                    j += 2 if text[j] == "\\" else 1
+                i = j
+            elif char == "`":
+                stack.append("`")
+            elif text.startswith("//", i):
+                i = text.find("\n", i)
+                if i == -1:
+                    break
+                continue
+            elif text.startswith("/*", i):
+                i = text.find("*/", i + 2)
+                if i == -1:
+                    break
+                i += 1
+            elif char == "{":
+                stack[-1] += 1
+            elif char == "}":
+                if stack[-1]:
+                    stack[-1] -= 1
+                else:
+                    stack.pop()
+            i += 1
+        raise ValueError("unterminated template literal")
+    
+    @classmethod
+    def _regex_allowed(cls, last_code: str) -> bool:
+        """Whether a "/" after the given token starts a JavaScript regular expression."""
+        if not last_code:
+            return True
+        if last_code[-1].isalnum() or last_code[-1] in "_$":
+            return last_code in cls.REGEX_KEYWORDS
+        return last_code[-1] in "(,=:[!&|?{};+-*%<>~^"
+
+
+# Built-in minifiers
+SourceMinifier.register(["py", "pyw", "pyi"], SourceMinifier.minify_python)
+for _extensions, _syntax in C_LIKE_SYNTAXES + STYLESHEET_SYNTAXES:
+    SourceMinifier.register(_extensions, functools.partial(SourceMinifier.minify_c_like, syntax=_syntax))
+
+
+class SourceSkeleton:
+    """
+    Pluggable, per-language "skeleton" rendering: the API surface of a file
+    without its function bodies.
+    
+    Skeletons are looked up by file extension in `SKELETONS`, and new ones can
+    be added with `register`. Python goes through `ast` (imports, module-level
+    and class-level assignments, class and function signatures with their
+    annotations and the first line of each docstring; bodies become `...`).
+    C-, Java- and JS-family languages are minified first, then every brace
+    block that is not a type, namespace or impl block is collapsed to `{ … }`.
+    Languages without a skeleton, and files that fail to parse, have none.
+    """
+    
+    SKELETONS: dict = {}
+    
+    # Statements longer than this keep their target but lose their value
+    MAX_VALUE_LENGTH = 60
+    
+    # Block headers whose contents stay visible (declarations of members)
+    CONTAINER_HEADER = re.compile(
+        r"\b(?:class|interface|namespace|impl|trait|mod|module|object|record|protocol|extension|extern)\b"
+    )
+    # Also containers, unless the header is a function returning one (C's `struct s *f(void) {`)
+    AGGREGATE_HEADER = re.compile(r"\b(?:struct|union|enum)\b")
+    
+    @classmethod
+    def register(cls, extensions: Iterable[str], skeleton: Callable[[str], str]) -> None:
+        """
+        Register a skeleton renderer for one or more file extensions (without dots).
+        
+        Args:
+            extensions: File extensions the renderer handles
+            skeleton: Function mapping source text to its skeleton
+        """
+        for extension in extensions:
+            cls.SKELETONS[extension.lower()] = skeleton
+    
+    @classmethod
+    def supports(cls, relative_path: str) -> bool:
+        """Whether files with this path's extension have a skeleton renderer."""
+        return os.path.splitext(relative_path)[1].lstrip(".").lower() in cls.SKELETONS
+    
+    @classmethod
+    def skeleton(cls, relative_path: str, text: str) -> Optional[str]:
+        """
+        Render a file's skeleton.
+        
+        Args:
+            relative_path: Path of the file (its extension picks the renderer)
+            text: Decoded file content
+            
+        Returns:
+            The skeleton, or None if the language has no renderer or parsing failed
+        """
+        extension = os.path.splitext(relative_path)[1].lstrip(".").lower()
+        skeleton = cls.SKELETONS.get(extension)
+        if skeleton is None:
+            return None
+        try:
+            return skeleton(text)
+        except Exception:
+            return None
+    
+    @classmethod
+    def skeleton_python(cls, text: str) -> str:
+        """
+        Render the skeleton of Python source with `ast`.
+        
+        Raises:
+            SyntaxError: If the source cannot be parsed
+        """
+        import ast
+        
+        tree = ast.parse(text)
+        tree.body = cls._python_outline(tree, ast)
+        return ast.unparse(tree)
+    
+    @classmethod
+    def _python_outline(cls, node, ast) -> list:
+        """The statements of a module or class body that make up its skeleton."""
+        outline = []
+        docstring = ast.get_docstring(node, clean=True)
+        if docstring:
+            outline.append(ast.Expr(ast.Constant(docstring.strip().split("\n", 1)[0])))
+        
+        for statement in node.body:
+            if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                outline.append(statement)
+            elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                body = []
+                docstring = ast.get_docstring(statement, clean=True)
+                if docstring:
+                    body.append(ast.Expr(ast.Constant(docstring.strip().split("\n", 1)[0])))
+                statement.body = body + [ast.Expr(ast.Constant(...))]
+                outline.append(statement)
+            elif isinstance(statement, ast.ClassDef):
+                statement.body = cls._python_outline(statement, ast) or [ast.Expr(ast.Constant(...))]
+                outline.append(statement)
+            elif isinstance(statement, (ast.Assign, ast.AnnAssign)):
+                targets = statement.targets if isinstance(statement, ast.Assign) else [statement.target]
+                if not all(isinstance(target, ast.Name) for target in targets):
+                    continue
+                if statement.value is not None and len(ast.unparse(statement.value)) > cls.MAX_VALUE_LENGTH:
+                    statement.value = ast.Constant(...)
+                outline.append(statement)
+        return outline
+    
+    @classmethod
+    def skeleton_c_like(cls, text: str, syntax: CLikeSyntax) -> str:
+        """
+        Render the skeleton of C-, Java- and JS-family source.
+        
+        The source is minified first (so comments are gone), then scanned for
+        braces outside string literals: blocks opened by a type, namespace or
+        impl header are kept and scanned further, any other block (function
+        bodies, initializers) is collapsed.
+        
+        Raises:
+            ValueError: On unbalanced braces or an unterminated literal
+        """
+        text = SourceMinifier.minify_c_like(text, syntax)
+        out: List[str] = []
+        kept_from = 0
+        header_start = 0
+        depth = 0
+        i, n = 0, len(text)
+        
+        def skip_literal(start: int) -> int:
+            # Index just past the literal starting at `start`
+            quote = text[start]
+            if quote == "'" and syntax.rust_literals:
+                literal = re.match(r"'(?:\\(?:u\{[0-9a-fA-F]*\}|x..|.)|[^'\\\n])'", text[start:start + 16])
+                return start + (len(literal.group(0)) if literal else 1)
+            if quote == "`" and syntax.backtick_strings:
+                return SourceMinifier.template_literal_end(text, start)
+            if quote == "'" and SourceMinifier.is_digit_separator(text, start):
+                return start + 1
+            j = start + 1
+            while j < n:
+                if text[j] == "\\" and not (quote == "`" and syntax.raw_backticks):
+                    j += 2
+                    continue
+                if text[j] == quote:
+                    return j + 1
+                j += 1
+            raise ValueError("unterminated literal")
+        
+        def block_end(start: int) -> int:
+            # Index of the brace closing the block opened at `start`
+            level, j = 0, start
+            while j < n:
+                char = text[j]
+                if char in "\"'`":
+                    j = skip_literal(j)
+                    continue
+                if char == "{":
+                    level += 1
+                elif char == "}":
+                    level -= 1
+                    if not level:
+                        return j
+                j += 1
+            raise ValueError("unbalanced braces")
+        
+        while i < n:
+            char = text[i]
+            if char in "\"'`":
+                i = skip_literal(i)
+            elif char == "{":
+                header = text[header_start:i].strip()
+                if cls.CONTAINER_HEADER.search(header) or (
+                        cls.AGGREGATE_HEADER.search(header) and not header.endswith(")")):
+                    depth += 1
+                    i += 1
+                else:
+                    end = block_end(i)
+                    out.append(text[kept_from:i + 1])
+                    out.append(" … ")
+                    kept_from = end
+                    i = end + 1
+                header_start = i
+            elif char == "}":
+                depth -= 1
+                if depth < 0:
+                    raise ValueError("unbalanced braces")
+                i += 1
+                header_start = i
+            elif char == ";":
+                i += 1
+                header_start = i
+            else:
+                i += 1
+        if depth:
+            raise ValueError("unbalanced braces")
+        out.append(text[kept_from:])
+        return "".join(out)
+
+
+# Built-in skeleton renderers
+SourceSkeleton.register(["py", "pyw", "pyi"], SourceSkeleton.skeleton_python)
+for _extensions, _syntax in C_LIKE_SYNTAXES:
+    SourceSkeleton.register(_extensions, functools.partial(SourceSkeleton.skeleton_c_like, syntax=_syntax))
+
+
+class FileClassifier:
+    """
+    Cheap pre-read checks that keep binaries, bundles and dumps out of the output.
+    
+    Only the file's size and its first `SNIFF_BYTES` are looked at: lockfiles and
+    minified bundles are recognised by name, binaries by NUL bytes and control
+    characters, generated code by a generator header in its leading comments,
+    and minified or encoded blobs by line length and byte entropy. Files above
+    `max_file_size` are skipped, or truncated to it with `truncate_large`.
+    """
+    
+    SNIFF_BYTES = 8192
+    DEFAULT_MAX_FILE_SIZE = 1024 * 1024
+    
+    LOCKFILE_NAMES = frozenset({
+        "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+        "Cargo.lock", "poetry.lock", "Pipfile.lock", "uv.lock", "pdm.lock", "Gemfile.lock",
+        "composer.lock", "go.sum", "mix.lock", "pubspec.lock", "Podfile.lock", "flake.lock",
+        "packages.lock.json", "gradle.lockfile", "conan.lock",
+    })
+    GENERATED_SUFFIXES = (
+        ".min.js", ".min.mjs", ".min.css", ".bundle.js", ".chunk.js", ".js.map", ".css.map",
+        "_pb2.py", "_pb2_grpc.py", ".pb.go", ".pb.cc", ".pb.h", ".g.dart", ".designer.cs",
+    )
+    # Generator headers: Go's convention, Phabricator/Meta's tag and the protoc banner.
+    # Matched against the leading comment lines only, so prose that merely says
+    # "auto-generated, do not edit" in a hand-written file is not enough.
+    GENERATED_MARKERS = re.compile(
+        rb"^// Code generated .* DO NOT EDIT\.$|@generated\b|Generated by the protocol buffer compiler\.",
+        re.MULTILINE,
+    )
+    COMMENT_PREFIXES = (b"//", b"#", b"*", b"--", b";", b"%")
+    BLOCK_COMMENTS = ((b"/*", b"*/"), (b"<!--", b"-->"), (b"{-", b"-}"), (b"(*", b"*)"))
+    # Control bytes that never appear in text files
+    BINARY_BYTES = bytes(set(range(32)) - {8, 9, 10, 12, 13}) + b"\x7f"
+    
+    def __init__(self,
+                max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+                truncate_large: bool = False,
+                skip_generated: bool = True):
+        """
+        Configure the classifier.
+        
+        Args:
+            max_file_size: Size in bytes above which a file is skipped (or truncated)
+            truncate_large: Truncate oversized files instead of skipping them
+            skip_generated: Also skip lockfiles, generated code and minified bundles
+        """
+        self.max_file_size = max_file_size
+        self.truncate_large = truncate_large
+        self.skip_generated = skip_generated
+    
+    @property
+    def fingerprint(self) -> str:
+        """Settings that change which chunks are produced (part of the cache key)."""
+        return f"{self.max_file_size}:{self.truncate_large}:{self.skip_generated}"
+    
+    def skip_reason(self, file_name: str, size: int, sample: bytes) -> Optional[str]:
+        """
+        Decide whether a file should be left out, based on its name, size and first bytes.
+        
+        Args:
+            file_name: Base name of the file
+            size: File size in bytes
+            sample: The first `SNIFF_BYTES` bytes of the file
+            
+        Returns:
+            Human-readable reason to skip the file, or None to include it
+        """
+        if self.skip_generated:
+            if file_name in self.LOCKFILE_NAMES:
+                return "lockfile"
+            if file_name.lower().endswith(self.GENERATED_SUFFIXES):
+                return "generated or minified (by name)"
+        
+        if not sample:
+            return None
+        if b"\0" in sample:
+            return "binary (NUL bytes)"
+        if len(sample.translate(None, self.BINARY_BYTES)) < len(sample) * 0.9:
+            return "binary (control characters)"
+        
+        if size > self.max_file_size and not self.truncate_large:
+            return f"too large ({size / 1024:,.0f} KB > {self.max_file_size / 1024:,.0f} KB)"
+        
+        if self.skip_generated:
+            if self.GENERATED_MARKERS.search(self.header_comment(sample[:2048])):
+                return "generated code (marker comment)"
+            if len(sample) >= 1024:
+                lines = sample.split(b"\n")
+                longest = max(len(line) for line in lines)
+                average = len(sample) / len(lines)
+                if average > 200 and self.entropy(sample) > 5.8:
+                    return "encoded data (high entropy)"
+                if longest > 1000 and average > 300:
+                    return f"minified (lines up to {longest:,} chars)"
+        return None
+    
+    @classmethod
+    def header_comment(cls, sample: bytes) -> bytes:
+        """
+        Return the comment lines at the top of a file, stripped and newline-joined.
+        
+        Blank lines are skipped; the header ends at the first line that is neither
+        a line comment nor part of a block comment.
+        """
+        header = []
+        block_end = None
+        for line in sample.splitlines():
+            line = line.strip()
+            if block_end is not None:
+                header.append(line)
+                if block_end in line:
+                    block_end = None
+                continue
+            if not line:
+                continue
+            for start, end in cls.BLOCK_COMMENTS:
+                if line.startswith(start):
+                    header.append(line)
+                    if end not in line[len(start):]:
+                        block_end = end
+                    break
+            else:
+                if not line.startswith(cls.COMMENT_PREFIXES):
+                    break
+                header.append(line)
+        return b"\n".join(header)
+    
+    @staticmethod
+    def entropy(sample: bytes) -> float:
+        """Shannon entropy of a byte string, in bits per byte."""
+        total = len(sample)
+        return -sum(
+            count / total * math.log2(count / total) for count in Counter(sample).values()
+        )
+
+
+class PipelineMetrics:
+    """
+    Wall time and counters for each stage of one run (shown by --stats / --metrics-json).
+    
+    Every stage has a record of seconds, files and bytes in and out, and tokens
+    out. Stages that run once (walk, filter, graph, rank, order, header, select) are timed with
+    `stage()`; streaming stages (cache, read, emit, write) accumulate per file
+    with `add()`. Read times are summed over worker threads, so with more than
+    one job they can exceed the run's wall time. Callables in `hooks` receive
+    `(stage_name, record)` whenever a timed stage ends, and once per streaming
+    stage when the run finishes.
+    """
+    
+    STAGE_ORDER = ("walk", "filter", "graph", "rank", "order", "header", "cache", "read", "select", "emit", "write")
+    
+    def __init__(self, hooks: Optional[List[Callable[[str, dict], None]]] = None):
+        self.hooks = list(hooks or [])
+        self.stages = {}
+        self.skipped = Counter()
+        self.extra = {}
+        self.wall_seconds = 0.0
+        self._started = time.perf_counter()
+    
+    def record(self, name: str) -> dict:
+        """The (mutable) record of a stage, created on first use."""
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {
+                "seconds": 0.0, "files_in": 0, "files_out": 0,
+                "bytes_in": 0, "bytes_out": 0, "tokens_out": 0,
+            }
+        return record
+    
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[dict]:
+        """Time a block as stage `name`; the block fills in the yielded record."""
+        record = self.record(name)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] += time.perf_counter() - started
+            for hook in self.hooks:
+                hook(name, record)
+    
+    def add(self, name: str, **counts: float) -> None:
+        """Accumulate counts (and `seconds`) into a stage."""
+        record = self.record(name)
+        for key, value in counts.items():
+            record[key] += value
+    
+    def skip(self, reason: str, count: int = 1) -> None:
+        """Count files left out, by reason (details in parentheses are dropped)."""
+        if count:
+            self.skipped[reason.split(" (", 1)[0]] += count
+    
+    def finish(self) -> None:
+        """Stop the clock and report the streaming stages to the hooks."""
+        self.wall_seconds = time.perf_counter() - self._started
+        for name in ("cache", "read", "emit", "write"):
+            if name in self.stages:
+                for hook in self.hooks:
+                    hook(name, self.stages[name])
+    
+    def as_dict(self) -> dict:
+        """JSON-serialisable summary of the run."""
+        order = {name: index for index, name in enumerate(self.STAGE_ORDER)}
+        return {
+            "wall_seconds": round(self.wall_seconds, 6),
+            "stages": {
+                name: {key: round(value, 6) if isinstance(value, float) else value
+                       for key, value in record.items()}
+                for name, record in sorted(self.stages.items(), key=lambda item: order.get(item[0], len(order)))
+            },
+            "skipped": dict(self.skipped.most_common()),
+            **self.extra,
+        }
+    
+    def format_table(self) -> str:
+        """Render the stages as a plain-text table."""
+        summary = self.as_dict()
+        lines = [
+            f"{'stage':<8} {'time':>9} {'files in':>9} {'files out':>10} "
+            f"{'MB in':>9} {'MB out':>9} {'tokens out':>11}"
+        ]
+        for name, record in summary["stages"].items():
+            lines.append(
+                f"{name:<8} {record['seconds']:>8.3f}s {record['files_in']:>9,} {record['files_out']:>10,} "
+                f"{record['bytes_in'] / (1024 * 1024):>9.2f} {record['bytes_out'] / (1024 * 1024):>9.2f} "
+                f"{record['tokens_out']:>11,}"
+            )
+        lines.append(f"{'total':<8} {summary['wall_seconds']:>8.3f}s")
+        for reason, count in summary["skipped"].items():
+            lines.append(f"  skipped {count:,} × {reason}")
+        return "\n".join(lines)
+
+
+class CodebaseProcessor:
+    """
+    A comprehensive tool for processing and analyzing codebases.
+    
+    This class scans a directory structure, filters files based on extensions and ignore patterns,
+    and creates a consolidated text file containing the project structure and file contents.
+    The output is formatted for use with AI coding agents.
+    """
+    
+    # Files above this size are memory-mapped and streamed instead of read whole.
+    # It is kept well below FileClassifier.DEFAULT_MAX_FILE_SIZE so default runs
+    # use it too: at most `jobs * 4` files are in flight, each held whole only
+    # when smaller than this, which bounds memory whatever the file sizes.
+    STREAM_THRESHOLD = 256 * 1024
+    
+    # Default directories to ignore during processing
+    DEFAULT_IGNORED_DIRECTORIES = [
+        "node_modules",      # Node.js dependencies - contains source files
+        "vendor",            # Go/PHP dependencies - contains source files  
+        "packages",          # Some package managers - contains source files
+        "deps",              # Elixir/Erlang dependencies - contains source files
+        "lib",               # Ruby gems/dependencies - contains source files
+        "gems",              # Ruby gems - contains source files
+        "bundle",            # Bundler gems - contains source files
+        "Pods",              # iOS CocoaPods - contains source files
+        "Carthage",          # iOS Carthage - contains source files
+        "gradle",            # Gradle wrapper - contains source files
+        "mvnw",              # Maven wrapper - contains source files
+        ".gradle",           # Gradle cache - contains source files
+        ".m2",               # Maven local repository - contains source files
+        "target/dependency", # Maven dependencies - contains source files
+        ".git",              # Git object store and metadata
+    ]
+    
+    # Default supported file extensions for code files
+    DEFAULT_SUPPORTED_EXTENSIONS = [
+        "py", "cpp", "java", "js", "ts", "c", "h", "cs", "go", "rs", "rb", "php",
+        "swift", "kt", "scala", "pl", "lua", "r", "dart", "html", "htm", "css",
+        "jsx", "scss", "tsx", "vue", "svelte", "sh", "bash", "ps1", "bat", "cmd",
+        "hs", "jl", "sql", "m", "ex", "exs", "vb", "fs", "groovy", "erl",
+    ]
+    
+    # Output formats and the extension of their default output file
+    OUTPUT_EXTENSIONS = {"text": "txt", "jsonl": "jsonl", "xml": "xml", "pack": "pack"}
+    OUTPUT_FORMATS = tuple(OUTPUT_EXTENSIONS)
+    
+    def __init__(self, 
+                source_directory: str,
+                additional_extensions: Optional[List[str]] = None,
+                ignored_files: Optional[List[str]] = None,
+                ignored_directories: Optional[List[str]] = None,
+                additional_files: Optional[List[str]] = None,
+                output_file: Optional[str] = None,
+                capture_output: bool = False,
+                mirror_output: Optional[IO] = None,
+                jobs: int = 1,
+                cache: Optional[ChunkCache] = None,
+                use_ignore_files: bool = True,
+                tokenizer: Optional[Union[HeuristicTokenizer, BPETokenizer]] = None,
+                max_tokens: Optional[int] = None,
+                split_tokens: Optional[int] = None,
+                split_bytes: Optional[int] = None,
+                minify: bool = False,
+                classifier: Optional[FileClassifier] = None,
+                dedupe: bool = True,
+                quiet: bool = False,
+                use_git_index: bool = False,
+                query: Optional[str] = None,
+                query_index: Optional[QueryIndex] = None,
+                entry_points: Optional[List[str]] = None,
+                import_graph: Optional[ImportGraph] = None,
+                output_format: str = "text",
+                skeletons: bool = True,
+                tree_max_entries: Optional[int] = None,
+                tree_selected_only: bool = False,
+                sniff_shebangs: bool = False,
+                cache_friendly: bool = False):
+        """
+        Initialize the CodebaseProcessor.
+        
+        Args:
+            source_directory: Path to the directory to process
+            additional_extensions: Extra file extensions to include (without dots)
+            ignored_files: Specific files to exclude from processing
+            ignored_directories: Additional directories to ignore
+            additional_files: Specific files to include regardless of extension
+            output_file: Path for the output file (defaults to {source_directory}_codebase.txt),
+                or "-" to stream it to stdout
+            capture_output: Keep the generated text in memory (see `captured_output`)
+            mirror_output: Binary file object that also receives the output as it
+                is written, e.g. a `ClipboardStream` (not used for sharded output)
+            jobs: Number of worker threads used to read source files
+            cache: Persistent chunk cache used to skip unchanged files
+            use_ignore_files: Honour .gitignore/.squeezeignore files in the project
+            tokenizer: Token counter (defaults to the 4-chars-per-token heuristic)
+            max_tokens: Token budget for the whole output; files are selected to fit it
+            split_tokens: Split the output into part files of at most this many tokens
+            split_bytes: Split the output into part files of at most this many bytes
+            minify: Minify each file per language instead of stripping all newlines
+            classifier: Pre-read checks for binary, generated and oversized files
+                (defaults to `FileClassifier()`; files in `additional_files` bypass it)
+            dedupe: Write exact duplicates of an earlier file as a reference to it
+            quiet: Do not print progress (read warnings still go to stderr)
+            use_git_index: List tracked files from `.git/index` instead of walking
+                the directory (both for the file list and the tree)
+            query: Only keep the files relevant to this query, ranked with BM25
+                (the ranks also drive the `max_tokens` selection)
+            query_index: Persistent index used for `query` (defaults to a `QueryIndex()`
+                opened for the run)
+            entry_points: Only keep the files reachable through imports from these
+                files (the tree still shows everything)
+            import_graph: Persistent import cache used for `entry_points` (defaults to
+                an `ImportGraph()` opened for the run)
+            output_format: "text", or one of `STRUCTURED_WRITERS` ("jsonl", "xml",
+                "pack"), which also write a `<output>.index.json` sidecar index
+            skeletons: Under `max_tokens`, let files that do not fit in full be
+                emitted as their skeleton (see `SourceSkeleton`) instead of omitted
+            tree_max_entries: Collapse the rest of any directory listing longer
+                than this in the tree into a one-line summary
+            tree_selected_only: Only show the selected source files (and the
+                directories holding them) in the tree
+            sniff_shebangs: Also include files without a suffix whose `#!` line
+                names a known interpreter (see `IncludeMatcher`)
+            cache_friendly: Order the output for LLM prompt-prefix caching: the
+                prompt (without the absolute project path) first, then files
+                from the least to the most recently modified, then the tree
+        """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r} (expected one of {', '.join(self.OUTPUT_FORMATS)})")
+        if output_format != "text" and (split_tokens is not None or split_bytes is not None):
+            raise ValueError("Split output is only available in the text format")
+        if cache_friendly and (split_tokens is not None or split_bytes is not None):
+            raise ValueError("Split output cannot be written in cache-friendly order")
+        self.source_directory = os.path.abspath(source_directory)
+        self.split_tokens = split_tokens
+        self.split_bytes = split_bytes
+        self.output_format = output_format
+        self.cache_friendly = cache_friendly
+        self.minify = minify
+        self.classifier = classifier or FileClassifier()
+        self.dedupe = dedupe
+        self.quiet = quiet
+        self.output_file_path = self._determine_output_path(output_file)
+        self.jobs = max(1, jobs)
+        self.cache = cache
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+        self.max_tokens = max_tokens
+        self.skeletons = skeletons
+        
+        # Initialize file and directory filters
+        self.ignored_files = ignored_files or []
+        self.additional_files = additional_files or []
+        self.ignored_directories = self._setup_ignored_directories(ignored_directories)
+        self._forced_paths = {os.path.abspath(f) for f in self.additional_files}
+        self.use_ignore_files = use_ignore_files
+        self.use_git_index = use_git_index
+        self.tree_max_entries = tree_max_entries
+        self.tree_selected_only = tree_selected_only
+        self.query = query
+        self.query_index = query_index
+        self.entry_points = [os.path.abspath(path) for path in entry_points or []]
+        self.import_graph = import_graph
+        self.ignore_matcher = self._build_ignore_matcher(self.source_directory, self.ignored_directories)
+        self.supported_extensions = self._setup_supported_extensions(additional_extensions)
+        self.include_matcher = IncludeMatcher(self.supported_extensions, sniff_shebangs=sniff_shebangs)
+        self.excluded_file_count = 0
+        
+        # Generate the AI agent prompt
+        self.ai_agent_prompt = self._generate_ai_agent_prompt()
+        
+        # Output statistics, filled in while the output is streamed
+        self.capture_output = capture_output
+        self.mirror_output = mirror_output
+        self.output_size_bytes = 0
+        self.token_estimate = 0
+        self.header_tokens = 0
+        self.file_tokens: dict = {}
+        self.omitted_files: List[Tuple[str, int]] = []
+        self.skeleton_files: List[Tuple[str, int, int]] = []
+        self.skipped_files: List[Tuple[str, str]] = []
+        self.processed_files: List[str] = []
+        self.metric_hooks: List[Callable[[str, dict], None]] = []
+        self.metrics = PipelineMetrics()
+        self.duplicate_files: List[Tuple[str, str]] = []
+        self.dedupe_saved_bytes = 0
+        self.dedupe_saved_tokens = 0
+        self._written_digests = {}
+        self.output_parts: List[str] = []
+        self.trailer_chunk = ""
+        self.index_path: Optional[str] = None
+        self.captured_output: Optional[str] = None
+        self.query_scores: dict = {}
+        self.query_candidates = 0
+        self.reachable_files = 0
+    
+    @property
+    def is_sharded(self) -> bool:
+        """Whether the output is split into part files."""
+        return self.split_tokens is not None or self.split_bytes is not None
+    
+    @property
+    def writes_to_stdout(self) -> bool:
+        """Whether `process()` streams the output to stdout (``-o -``)."""
+        return self.output_file_path == "-"
+    
+    def _determine_output_path(self, output_file: Optional[str]) -> str:
+        """Determine the output file path (a directory of parts when sharding)."""
+        if output_file == "-":
+            if self.is_sharded:
+                raise ValueError("Split output needs a directory, it cannot be written to stdout")
+            return "-"
+        if self.is_sharded:
+            if output_file:
+                root, extension = os.path.splitext(os.path.abspath(output_file))
+                return root if extension == ".txt" else os.path.abspath(output_file)
+            return f"{self.source_directory}_codebase"
+        if output_file:
+            return os.path.abspath(output_file)
+        return f"{self.source_directory}_codebase.{self.OUTPUT_EXTENSIONS[self.output_format]}"
+    
+    def _setup_ignored_directories(self, additional_ignored: Optional[List[str]]) -> List[str]:
+        """Setup the list of directories to ignore."""
+        ignored_dirs = self.DEFAULT_IGNORED_DIRECTORIES.copy()
+        if additional_ignored:
+            ignored_dirs.extend(additional_ignored)
+        return ignored_dirs
+    
+    def _build_ignore_matcher(self, root: str, ignored_dirs: List[str]) -> IgnoreMatcher:
+        """Compile the ignore rules for a walk rooted at `root`."""
+        # Tracked files are never gitignored, so the index only needs .squeezeignore
+        git_index_root = self.use_git_index and os.path.abspath(root) == self.source_directory
+        return IgnoreMatcher(
+            os.path.abspath(root),
+            self._directory_patterns(os.path.abspath(root), ignored_dirs),
+            use_ignore_files=self.use_ignore_files,
+            ignore_file_names=(".squeezeignore",) if git_index_root else IgnoreMatcher.IGNORE_FILE_NAMES,
+        )
+    
+    @staticmethod
+    def _directory_patterns(root: str, ignored_dirs: List[str]) -> List[str]:
+        """
+        Translate ignored directories into gitignore patterns.
+        
+        Bare names (e.g. "node_modules") and relative paths (e.g. the built-in
+        "target/dependency") match at any depth, and absolute paths match
+        exactly that directory under `root`. User-supplied paths are made
+        absolute first (see `resolve_ignored_directories`).
+        
+        Args:
+            root: Absolute path of the walk root
+            ignored_dirs: Directory names or paths
+            
+        Returns:
+            Directory-only gitignore patterns
+        """
+        patterns = []
+        for ignored_dir in ignored_dirs:
+            if os.path.isabs(ignored_dir):
+                relative_dir = os.path.relpath(os.path.normpath(ignored_dir), root)
+                if relative_dir == "." or relative_dir.startswith(".."):
+                    continue
+                patterns.append(f"/{relative_dir.replace(os.sep, '/')}/")
+            else:
+                name = os.path.normpath(ignored_dir).replace(os.sep, "/").strip("/")
+                patterns.append(f"**/{name}/" if "/" in name else f"{name}/")
+        return patterns
+    
+    @staticmethod
+    def resolve_ignored_directories(base_dir: str, ignored_dirs: List[str]) -> List[str]:
+        """
+        Resolve user-supplied --ignore-dir values against the project directory.
+        
+        Bare names ("tests", "tests/") are kept as they are so they match at any
+        depth; values containing a path separator ("./tests", "src/tests") are
+        joined to `base_dir` and so name exactly one directory.
+        
+        Args:
+            base_dir: Absolute project directory
+            ignored_dirs: Values as given on the command line or in a manifest
+            
+        Returns:
+            Directory names and absolute paths for `ignored_directories`
+        """
+        resolved = []
+        for ignored_dir in ignored_dirs:
+            name = ignored_dir.rstrip("/" + os.sep)
+            if os.path.isabs(ignored_dir) or "/" in name or os.sep in name:
+                resolved.append(os.path.normpath(os.path.join(base_dir, ignored_dir)))
+            else:
+                resolved.append(name or ignored_dir)
+        return resolved
+    
+    def _setup_supported_extensions(self, additional_extensions: Optional[List[str]]) -> List[str]:
+        """Setup the list of supported file extensions."""
+        extensions = self.DEFAULT_SUPPORTED_EXTENSIONS.copy()
+        if additional_extensions:
+            # Clean and add additional extensions
+            clean_extensions = [ext.lstrip(".").lower() for ext in additional_extensions]
+            extensions.extend(clean_extensions)
+        return extensions
+    
+    def _generate_ai_agent_prompt(self) -> str:
+        """Generate the prompt text for AI agents."""
+        return f"""You are an expert coding agent with context-aware understanding of software projects. While you're designed to analyze entire codebases, *only a subset of files and the project structure* has been provided due to context window constraints.  
+
+    *Your responsibilities:*  
+    1. *Accurately execute tasks* (e.g., debugging, documentation, feature implementation) *using ONLY the files currently in context*.  
+    2. *Explicitly request missing files* when needed:  
+    - State exactly which file(s) you require (using full paths from the provided project structure)  
+    - Justify why the file is essential for the task  
+    - Never assume file existence beyond the provided context  
+    3. *Prioritize solutions within scope*: If a task can be completed with available files, do so without requesting additions.  
+
+    *Critical rules:*  
+    - ❌ *NEVER* invent code from unprovided files  
+    - ❌ *NEVER* guess file contents/structure  
+    - ✅ *ALWAYS* reference the project structure when requesting files  
+    - ✅ *ALWAYS* clarify ambiguities before proceeding  
+
+    {self._compression_note()}
+
+    provided project : {os.path.basename(self.source_directory) if self.cache_friendly else self.source_directory}"""
+    
+    def _compression_note(self) -> str:
+        """Describe how the code was compressed, for the AI agent prompt."""
+        if self.minify:
+            return "Due to context limits, comments, docstrings, blank lines and extra whitespace were removed from the code and indentation was reduced. However, when responding, debugging, or providing code, always use normal, readable formatting that can be copied and pasted directly."
+        return "Due to context limits, the code is compressed by removing newlines and tabs when sent. However, when responding, debugging, or providing code, always use normal, readable formatting that can be copied and pasted directly."
+
+    def iter_project_entries(self,
+                            root: Union[str, "os.PathLike[str]", None] = None,
+                            show_hidden: bool = False,
+                            ignored_dirs: Optional[List[str]] = None,
+                            max_depth: Optional[int] = None) -> Iterator[TreeEntry]:
+        """
+        Walk the project once with `os.scandir`, yielding every entry in tree order.
+        
+        Each directory is listed exactly once and classified with the cached
+        `DirEntry` type information. Entries are checked against the compiled
+        ignore rules (including any .gitignore/.squeezeignore picked up on the
+        way), so ignored directories are pruned before they are entered. Only the listing of the directories on the current path is
+        held in memory. Hidden entries are still walked (their files are
+        candidates), but are marked as not visible in the rendered tree unless
+        `show_hidden` is set. Symlinked directories are listed but not followed.
+        
+        Args:
+            root: Root directory to start from (defaults to `source_directory`)
+            show_hidden: Whether hidden files/directories are visible in the tree
+            ignored_dirs: List of directories to ignore (defaults to `ignored_directories`)
+            max_depth: Deepest level to yield; directories at this depth are not listed
+            
+        Yields:
+            One TreeEntry per file and directory, depth first
+        """
+        root = os.fspath(root) if root is not None else self.source_directory
+        
+        # Use the processor's matcher unless a different root or rule set is requested
+        if ignored_dirs is None and os.path.abspath(root) == self.source_directory:
+            matcher = self.ignore_matcher
+        else:
+            matcher = self._build_ignore_matcher(
+                root, self.ignored_directories if ignored_dirs is None else ignored_dirs
+            )
+        
+        if self.use_git_index and matcher is self.ignore_matcher:
+            yield from self._iter_index_entries(show_hidden, max_depth)
+            return
+        
+        def list_directory(path: str, relative_dir: str, depth: int, prefix: str, visible: bool) -> Iterator[TreeEntry]:
+            try:
+                with os.scandir(path) as scanner:
+                    dir_entries = list(scanner)
+            except OSError:
+                return iter(())
+            
+            # Pick up this directory's own ignore files before filtering its entries
+            if matcher.use_ignore_files and any(
+                entry.name in matcher.ignore_file_names for entry in dir_entries
+            ):
+                matcher.load_directory(relative_dir, path)
+            
+            listing = []
+            for entry in dir_entries:
+                relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                is_dir = entry.is_dir()
+                if not matcher.is_ignored(relative_path, is_dir):
+                    listing.append((entry.name, entry.path, relative_path, is_dir,
+                                    entry.is_symlink(), entry.is_file()))
+            return self._listing_entries(listing, depth, prefix, visible, show_hidden)
+        
+        yield from self._depth_first(
+            list_directory(root, "", 0, "", True),
+            lambda entry, prefix: list_directory(
+                entry.path, entry.relative_path, entry.depth + 1, prefix, entry.visible
+            ),
+            max_depth,
+        )
+    
+    def _iter_index_entries(self, show_hidden: bool = False,
+                            max_depth: Optional[int] = None) -> Iterator[TreeEntry]:
+        """
+        Yield the project's tracked files from the git index, in tree order.
+        
+        This replaces the directory walk in `--git` mode: the tree is built from
+        the index alone, so nothing is listed or stat'ed. Tracked files are
+        never ignored by .gitignore (as in git), but the built-in and
+        --ignore-dir directories and .squeezeignore files still apply.
+        Submodules appear as empty directories.
+        
+        Raises:
+            ValueError: If `source_directory` is not inside a git repository
+        """
+        index = GitIndex.load(self.source_directory)
+        prefix = os.path.relpath(self.source_directory, index.worktree).replace(os.sep, "/")
+        prefix = "" if prefix == "." else prefix
+        matcher = self.ignore_matcher
+        
+        # Nested dicts: directory name -> children, file name -> mode
+        root_node = {}
+        squeezeignore_dirs = []
+        for relative_path, mode in index.tracked_paths(prefix):
+            *directories, name = relative_path.split("/")
+            node = root_node
+            for directory in directories:
+                child = node.get(directory)
+                if not isinstance(child, dict):
+                    child = node[directory] = {}
+                node = child
+            kind = mode & GitIndex.MODE_TYPE_MASK
+            if kind in (GitIndex.MODE_DIRECTORY, GitIndex.MODE_GITLINK):
+                node.setdefault(name, {})
+            else:
+                node[name] = mode
+            if matcher.use_ignore_files and name in matcher.ignore_file_names:
+                squeezeignore_dirs.append("/".join(directories))
+        
+        for relative_dir in squeezeignore_dirs:
+            matcher.load_directory(relative_dir, os.path.join(self.source_directory, *relative_dir.split("/")))
+        
+        def list_node(node: dict, path: str, relative_dir: str, depth: int, prefix: str, visible: bool) -> Iterator[TreeEntry]:
+            listing = []
+            for name, child in node.items():
+                relative_path = f"{relative_dir}/{name}" if relative_dir else name
+                is_dir = isinstance(child, dict)
+                if not matcher.is_ignored(relative_path, is_dir):
+                    is_symlink = not is_dir and child & GitIndex.MODE_TYPE_MASK == GitIndex.MODE_SYMLINK
+                    listing.append((name, os.path.join(path, name), relative_path, is_dir, is_symlink, not is_dir))
+            return self._listing_entries(listing, depth, prefix, visible, show_hidden)
+        
+        nodes = {"": root_node}
+        
+        def list_children(entry: TreeEntry, prefix: str) -> Iterator[TreeEntry]:
+            parent = entry.relative_path.rpartition("/")[0]
+            node = nodes[parent][entry.name]
+            nodes[entry.relative_path] = node
+            return list_node(node, entry.path, entry.relative_path, entry.depth + 1, prefix, entry.visible)
+        
+        yield from self._depth_first(
+            list_node(root_node, self.source_directory, "", 0, "", True),
+            list_children,
+            max_depth,
+        )
+    
+    @staticmethod
+    def _listing_entries(listing: List[Tuple[str, str, str, bool, bool, bool]], depth: int,
+                        prefix: str, visible: bool, show_hidden: bool) -> Iterator[TreeEntry]:
+        """
+        Turn one directory's (already filtered) listing into TreeEntry records.
+        
+        Args:
+            listing: (name, path, relative path, is_dir, is_symlink, is_file) per entry
+            depth: Depth of the entries
+            prefix: Tree-drawing prefix of the entries
+            visible: Whether the directory itself is visible in the tree
+            show_hidden: Whether hidden entries are visible
+        """
+        # Directories first, then files, alphabetically
+        listing.sort(key=lambda item: (item[5], item[0].lower()))
+        
+        shown = [show_hidden or not item[0].startswith(".") for item in listing]
+        last_shown = max((i for i, is_shown in enumerate(shown) if is_shown), default=-1)
+        return (
+            TreeEntry(
+                path=path,
+                relative_path=relative_path,
+                name=name,
+                depth=depth,
+                is_dir=is_dir,
+                is_symlink=is_symlink,
+                visible=visible and shown[i],
+                is_last=i == last_shown,
+                prefix=prefix,
+            )
+            for i, (name, path, relative_path, is_dir, is_symlink, _) in enumerate(listing)
+        )
+    
+    @staticmethod
+    def _depth_first(listing: Iterator[TreeEntry],
+                    list_children: Callable[[TreeEntry, str], Iterator[TreeEntry]],
+                    max_depth: Optional[int] = None) -> Iterator[TreeEntry]:
+        """
+        Iterative depth-first traversal over a stack of per-directory entry iterators.
+        
+        Args:
+            listing: Entries of the root directory
+            list_children: Returns the entries of a (non-symlink) directory, given
+                the directory and the tree prefix for its children
+            max_depth: Deepest level to descend to; directories at this depth
+                are yielded but `list_children` is never called for them
+        """
+        stack = [listing]
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop()
+                continue
+            
+            yield entry
+            
+            if entry.is_dir and not entry.is_symlink and (max_depth is None or entry.depth < max_depth):
+                extension = "    " if entry.is_last else "│   "
+                stack.append(list_children(entry, entry.prefix + extension))
+    
+    def scan_project(self) -> Tuple[str, List[str]]:
+        """
+        Build the directory tree and the candidate file list in a single walk.
+        
+        With `tree_max_entries` the tree is collected into a `DirectoryTree`
+        to be collapsed; with `tree_selected_only` it is left empty here and
+        rendered from the selected files instead.
+        
+        Files are matched against `include_matcher` as they are found, so
+        only candidate source files are collected; the others are only
+        counted (`excluded_file_count`) and still show in the tree.
+        
+        Returns:
+            Tuple containing:
+            - ASCII tree representation of `source_directory`
+            - Every candidate source file, in tree order
+        """
+        tree_lines: List[str] = []
+        file_paths: List[str] = []
+        tree = DirectoryTree() if self.tree_max_entries is not None else None
+        matches = self.include_matcher.matches
+        excluded = 0
+        
+        for entry in self.iter_project_entries():
+            if entry.visible and not self.tree_selected_only:
+                if tree is None:
+                    tree_lines.append(entry.tree_line)
+                else:
+                    tree.add(entry.relative_path, entry.is_dir)
+            if not entry.is_dir:
+                if matches(entry.path, entry.name):
+                    file_paths.append(entry.path)
+                else:
+                    excluded += 1
+        
+        self.excluded_file_count = excluded
+        
+        if tree is not None and not self.tree_selected_only:
+            return tree.render(self.tree_max_entries), file_paths
+        return "\n".join(tree_lines) + ("\n" if tree_lines else ""), file_paths
+    
+    def generate_directory_tree(self,
+                            root: Union[str, "os.PathLike[str]"],
+                            max_depth: Optional[int] = None,
+                            show_hidden: bool = False,
+                            ignored_dirs: Optional[List[str]] = None) -> str:
+        """
+        Generate an ASCII tree representation of the directory structure.
+        
+        Args:
+            root: Root directory to start from
+            max_depth: Maximum depth to traverse
+            show_hidden: Whether to show hidden files/directories
+            ignored_dirs: List of directories to ignore
+            
+        Returns:
+            ASCII tree representation as a string
+        """
+        if not os.path.isdir(root):
+            return f"{root} is not a directory\n"
+        
+        lines = [
+            entry.tree_line
+            for entry in self.iter_project_entries(root, show_hidden, ignored_dirs, max_depth)
+            if entry.visible
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def discover_all_files(self) -> List[str]:
+        """
+        Recursively collect every candidate source file under `source_directory`
+        while skipping any directory whose *name* matches an entry
+        in `ignored_directories` (either default or user-supplied).
+        """
+        return list(self.iter_candidate_files())
+    
+    def iter_candidate_files(self) -> Iterator[str]:
+        """Lazily yield every file under `source_directory` that `include_matcher` accepts, in tree order."""
+        matches = self.include_matcher.matches
+        for entry in self.iter_project_entries():
+            if not entry.is_dir and matches(entry.path, entry.name):
+                yield entry.path
+
+    def filter_files_by_extension(self, file_paths: List[str]) -> List[str]:
+        """
+        Filter files to include only those `include_matcher` accepts (supported
+        suffixes, well-known file names and, optionally, scripts with a shebang).
+        
+        Args:
+            file_paths: List of file paths to filter
+            
+        Returns:
+            List of filtered file paths
+        """
+        matches = self.include_matcher.matches
+        return [path for path in file_paths if matches(path)]
+    
+    def remove_files_from_ignored_directories(self, 
+                                            file_paths: List[str], 
+                                            directories_to_remove: List[str]) -> List[str]:
+        """
+        Remove files that are located in specified directories.
+        
+        Directories are matched by whole path components (so "lib" does not
+        match "src/calibration"), using the same rules as the project walk.
+        
+        Args:
+            file_paths: List of file paths
+            directories_to_remove: List of directory paths to exclude
+            
+        Returns:
+            Filtered list of file paths
+        """
+        if not directories_to_remove:
+            return file_paths
+        
+        matcher = IgnoreMatcher(
+            self.source_directory,
+            self._directory_patterns(self.source_directory, directories_to_remove),
+            use_ignore_files=False,
+        )
+        return [
+            path for path in file_paths
+            if not matcher.is_path_ignored(self._relative_posix_path(path))
+        ]
+    
+    def _relative_posix_path(self, file_path: str) -> str:
+        """Return a path relative to `source_directory`, with '/' separators."""
+        relative_path = os.path.relpath(os.path.abspath(file_path), self.source_directory)
+        return relative_path.replace(os.sep, "/")
+
+    def get_file_size_kb(self, file_path: str) -> float:
+        """
+        Get file size in kilobytes.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            File size in KB, or 0 if file not found
+        """
+        try:
+            stat_info = os.stat(file_path)
+            size_bytes = stat_info.st_size
+            return size_bytes / 1024
+        except FileNotFoundError:
+            return 0.0
+
+    @staticmethod
+    def compress_text(content: str) -> str:
+        """
+        Remove newlines and compress multiple tabs in a piece of text.
+        
+        Every chunk of the output starts with a newline, so compressing chunk by
+        chunk gives exactly the same result as compressing the whole output at once.
+        
+        Args:
+            content: Text to compress
+            
+        Returns:
+            Compressed text
+        """
+        content = content.replace("\n", "")
+        return re.sub(r"\t{2,}", "\t", content)
+    
+    def finalize_text(self, text: str) -> str:
+        """
+        Apply output-level compression to a formatted chunk.
+        
+        With `minify`, files have already been minified per language and
+        newlines are meaningful, so the text is left as is.
+        """
+        return text if self.minify else self.compress_text(text)
+    
+    def compress_file_content(self, file_path: str) -> str:
+        """
+        Remove newlines and compress multiple tabs in a file.
+        
+        Args:
+            file_path: Path to the file to compress
+            
+        Returns:
+            Path to the processed file
+            
+        Raises:
+            SystemExit: If file operations fail
+        """
+        if not isinstance(file_path, str):
+            raise TypeError("file_path must be a string")
+
+        try:
+            # Read the file content
+            with open(file_path, "r", encoding="utf-8") as file:
+                content = file.read()
+
+            # Remove newlines and compress multiple tabs
+            content = self.compress_text(content)
+
+            # Write the compressed content back
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write(content)
+
+            return file_path
+
+        except FileNotFoundError:
+            print(f"Error: '{file_path}' does not exist.", file=sys.stderr)
+            sys.exit(1)
+        except PermissionError:
+            print(f"Error: Permission denied accessing '{file_path}'.", file=sys.stderr)
+            sys.exit(1)
+        except OSError as exc:
+            print(f"OS error while processing '{file_path}': {exc}", file=sys.stderr)
+            sys.exit(1)
+        except Exception as exc:
+            print(f"Unexpected error: {exc}", file=sys.stderr)
+            sys.exit(1)
+    
+    def create_consolidated_file(self) -> Tuple[str, List[str], float]:
+        """
+        Create the final consolidated file with project structure and file contents.
+        
+        Returns:
+            Tuple containing:
+            - Path to the processed output file
+            - List of processed source files
+            - Output file size in KB
+        """
+        directory_tree, source_files = self._collect_source_files()
+        header_chunk = self._start_output(directory_tree)
+        
+        if self.is_sharded:
+            writer = ShardedOutputWriter(
+                self.output_file_path,
+                lambda part_number: self.finalize_text(self._create_part_header(part_number, directory_tree)),
+                self.tokenizer,
+                max_tokens=self.split_tokens,
+                max_bytes=self.split_bytes,
+                finalize_text=self.finalize_text,
+            )
+        elif self.writes_to_stdout:
+            writer = self._open_writer(fileobj=sys.stdout.buffer)
+        else:
+            writer = self._open_writer(self.output_file_path)
+        
+        # Stream the header and every source file through a single handle,
+        # compressing each chunk as it goes
+        with writer:
+            if not self.is_sharded:
+                writer.write_header(header_chunk)
+            for source_chunk in self._iter_output_chunks(source_files):
+                started = time.perf_counter()
+                writer.write_file(source_chunk)
+                self.metrics.add("write", files_in=1, seconds=time.perf_counter() - started)
+            if self.trailer_chunk:
+                writer.write_trailer(self.trailer_chunk)
+        
+        self.output_size_bytes = writer.byte_count
+        self.captured_output = writer.captured_text
+        if self.is_sharded:
+            # Every part repeats its own header
+            self.header_tokens = writer.token_count - sum(self.file_tokens.values())
+            self.token_estimate = writer.token_count
+            self.output_parts = [part["path"] for part in writer.parts]
+        self._finish_metrics(writer.byte_count)
+        file_size_kb = self.output_size_bytes / 1024
+        
+        return self.output_file_path, list(self.processed_files), file_size_kb
+    
+    def _open_writer(self, output_file_path: Optional[str] = None,
+                    fileobj: Optional[IO] = None) -> StreamingOutputWriter:
+        """
+        Create the writer for `output_format` (not entered yet).
+        
+        Structured formats written to a path also get a sidecar index next to it.
+        """
+        if self.output_format == "text":
+            return StreamingOutputWriter(output_file_path, capture=self.capture_output,
+                                        fileobj=fileobj, mirror=self.mirror_output)
+        if output_file_path is not None:
+            self.index_path = output_file_path + ".index.json"
+        return STRUCTURED_WRITERS[self.output_format](
+            output_file_path, self.chunk_body, capture=self.capture_output, fileobj=fileobj,
+            mirror=self.mirror_output, index_path=self.index_path if output_file_path is not None else None,
+        )
+    
+    def chunk_body(self, source_chunk: SourceChunk) -> Iterator[str]:
+        """
+        Yield a file's output chunk without the text format's file heading.
+        
+        Used by the structured writers, which carry the path themselves.
+        """
+        head, _, tail = self._format_file_content(source_chunk.relative_path, "\0").partition("\0")
+        head, tail = self.finalize_text(head), self.finalize_text(tail)
+        pieces = [source_chunk.chunk] if isinstance(source_chunk.chunk, str) else source_chunk.chunk
+        
+        # Drop the heading from the front and hold the trailer back from the end
+        skip = len(head)
+        pending = ""
+        for piece in pieces:
+            if skip:
+                cut = min(skip, len(piece))
+                piece, skip = piece[cut:], skip - cut
+            pending += piece
+            if len(pending) > len(tail):
+                yield pending[:len(pending) - len(tail)]
+                pending = pending[len(pending) - len(tail):]
+    
+    def iter_chunks(self) -> Iterator[str]:
+        """
+        Generate the consolidated output incrementally, without touching the disk.
+        
+        The first chunk is the header (prompt and project tree), followed by one
+        chunk per source file in output order (large files arrive as several
+        pieces), and in cache-friendly order, the tree last. Joining every chunk gives exactly
+        the text `process()` would write (sharding options are ignored). The
+        run's statistics (`token_estimate`, `file_tokens`, `skipped_files`, …)
+        are complete once the generator is exhausted.
+        
+        Yields:
+            Compressed chunks of output text
+        """
+        directory_tree, source_files = self._collect_source_files()
+        yield self._start_output(directory_tree)
+        for source_chunk in self._iter_output_chunks(source_files):
+            if isinstance(source_chunk.chunk, str):
+                yield source_chunk.chunk
+            else:
+                yield from source_chunk.chunk
+        if self.trailer_chunk:
+            yield self.trailer_chunk
+        self._finish_metrics()
+    
+    def _finish_metrics(self, bytes_written: Optional[int] = None) -> None:
+        """Add the run-level counters to `metrics` and stop its clock."""
+        if bytes_written is not None:
+            record = self.metrics.record("write")
+            record["files_out"] = record["files_in"]
+            record["bytes_out"] = bytes_written
+            record["tokens_out"] = self.token_estimate
+        self.metrics.extra.update({
+            "files_written": len(self.processed_files),
+            "tokens_written": self.token_estimate,
+            "header_tokens": self.header_tokens,
+            "cache": None if self.cache is None else {"hits": self.cache.hits, "misses": self.cache.misses},
+            "skeletons": {
+                "files": len(self.skeleton_files),
+                "tokens_saved": sum(full - skeleton for _, full, skeleton in self.skeleton_files),
+            },
+            "dedupe": {
+                "files": len(self.duplicate_files),
+                "bytes_saved": self.dedupe_saved_bytes,
+                "tokens_saved": self.dedupe_saved_tokens,
+            },
+        })
+        self.metrics.finish()
+    
+    def write_to(self, fileobj: IO) -> int:
+        """
+        Stream the consolidated output into an open file object.
+        
+        Args:
+            fileobj: Text or binary file object (a socket file, `sys.stdout`, …);
+                it is flushed but not closed
+            
+        Returns:
+            Number of bytes written (UTF-8)
+        """
+        directory_tree, source_files = self._collect_source_files()
+        header_chunk = self._start_output(directory_tree)
+        with self._open_writer(fileobj=fileobj) as writer:
+            writer.write_header(header_chunk)
+            for source_chunk in self._iter_output_chunks(source_files):
+                started = time.perf_counter()
+                writer.write_file(source_chunk)
+                self.metrics.add("write", files_in=1, seconds=time.perf_counter() - started)
+            if self.trailer_chunk:
+                writer.write_trailer(self.trailer_chunk)
+        self._finish_metrics(writer.byte_count)
+        
+        self.output_size_bytes = writer.byte_count
+        self.captured_output = writer.captured_text
+        return writer.byte_count
+    
+    def _collect_source_files(self) -> Tuple[str, List[str]]:
+        """
+        Walk the project once and decide which files go into the output.
+        
+        Returns:
+            The directory tree and the source files, in output order
+        """
+        self.metrics = PipelineMetrics(self.metric_hooks)
+        
+        # Discover files and build the project tree in one walk
+        with self.metrics.stage("walk") as record:
+            directory_tree, all_files = self.scan_project()
+            record["files_out"] = len(all_files) + self.excluded_file_count
+        
+        with self.metrics.stage("filter") as record:
+            # The walk already dropped the files `include_matcher` rejects
+            record["files_in"] = len(all_files) + self.excluded_file_count
+            source_files = list(all_files)
+            self.metrics.skip("extension not included", self.excluded_file_count)
+            
+            # Add additional files if specified (ignored directories and ignore files do not apply)
+            if self.additional_files:
+                known_files = set(source_files)
+                for file_path in self.additional_files:
+                    abs_path = os.path.abspath(file_path)
+                    if abs_path not in known_files:
+                        known_files.add(abs_path)
+                        source_files.append(abs_path)
+        
+            # Remove ignored files
+            if self.ignored_files:
+                ignored_abs_paths = {os.path.abspath(f) for f in self.ignored_files}
+                kept_files = [f for f in source_files 
+                            if os.path.abspath(f) not in ignored_abs_paths]
+                self.metrics.skip("--ignore", len(source_files) - len(kept_files))
+                source_files = kept_files
+            record["files_out"] = len(source_files)
+        
+        if self.entry_points:
+            with self.metrics.stage("graph") as record:
+                record["files_in"] = len(source_files)
+                source_files = self._reachable_from_entries(source_files)
+                record["files_out"] = len(source_files)
+        
+        if self.query is not None:
+            with self.metrics.stage("rank") as record:
+                record["files_in"] = len(source_files)
+                source_files = self._rank_for_query(source_files)
+                record["files_out"] = len(source_files)
+        
+        if self.cache_friendly:
+            with self.metrics.stage("order") as record:
+                record["files_in"] = len(source_files)
+                source_files = self._order_by_stability(source_files)
+                record["files_out"] = len(source_files)
+        
+        if self.tree_selected_only:
+            relative_paths = (self._relative_posix_path(f) for f in source_files)
+            directory_tree = DirectoryTree.from_paths(
+                path for path in relative_paths if not path.startswith("../")
+            ).render(self.tree_max_entries)
+        
+        return directory_tree, source_files
+    
+    def _order_by_stability(self, source_files: List[str]) -> List[str]:
+        """
+        Order files from the least to the most recently modified (ties by path).
+        
+        Editing a file only moves it to the end, so everything before it stays
+        a byte-identical prefix for the provider's prompt cache. Files that
+        cannot be stat'ed go last.
+        """
+        def stability_key(file_path: str) -> Tuple[float, str]:
+            try:
+                modified = os.stat(file_path).st_mtime_ns
+            except OSError:
+                modified = math.inf
+            return modified, self._relative_posix_path(file_path)
+        
+        return sorted(source_files, key=stability_key)
+    
+    def _reachable_from_entries(self, source_files: List[str]) -> List[str]:
+        """
+        Keep the source files reachable through imports from `entry_points`.
+        
+        Imports are read from the persistent graph, which only re-parses files
+        that changed since the previous run. Entry points are kept even when
+        their extension is not included, and so are files in `additional_files`.
+        
+        Args:
+            source_files: Candidate files, in output order
+            
+        Returns:
+            The reachable files, in the same order
+        """
+        graph = self.import_graph if self.import_graph is not None else ImportGraph()
+        try:
+            reachable = set(graph.closure(self.source_directory, self.entry_points, source_files))
+        finally:
+            if graph is not self.import_graph:
+                graph.close()
+        
+        self.reachable_files = len(reachable)
+        kept = [f for f in source_files if f in reachable or f in self._forced_paths]
+        self.metrics.skip("not reachable from --entry", len(source_files) - len(kept))
+        
+        # Entry points whose extension is not included
+        known = set(kept)
+        kept += [f for f in self.entry_points if f in reachable and f not in known]
+        return kept
+    
+    def _rank_for_query(self, source_files: List[str]) -> List[str]:
+        """
+        Keep the source files relevant to `query`.
+        
+        The BM25 index is brought up to date first, which only re-reads files
+        that changed since the previous run. Files that match no query term are
+        dropped (files in `additional_files` are always kept), and the scores
+        of the rest become their priorities for the token budget.
+        
+        Args:
+            source_files: Candidate files, in output order
+            
+        Returns:
+            The relevant files, in the same order
+        """
+        index = self.query_index if self.query_index is not None else QueryIndex()
+        try:
+            index.update(self.source_directory, source_files)
+            self.query_scores = index.rank(self.source_directory, source_files, self.query)
+        finally:
+            if index is not self.query_index:
+                index.close()
+        
+        self.query_candidates = len(source_files)
+        kept = [f for f in source_files if self.query_scores.get(f, 0) > 0 or f in self._forced_paths]
+        self.metrics.skip("not relevant to --query", len(source_files) - len(kept))
+        return kept
+    
+    def _start_output(self, directory_tree: str) -> str:
+        """
+        Reset the run's statistics and return the compressed header chunk.
+        
+        In cache-friendly order the tree goes into `trailer_chunk` instead,
+        and is counted in `header_tokens` all the same.
+        """
+        with self.metrics.stage("header") as record:
+            header_chunk = self.finalize_text(self._create_file_header(directory_tree))
+            self.trailer_chunk = (self.finalize_text(self._create_file_trailer(directory_tree))
+                                if self.cache_friendly else "")
+            self.header_tokens = self.tokenizer.count(header_chunk)
+            if self.trailer_chunk:
+                self.header_tokens += self.tokenizer.count(self.trailer_chunk)
+            record["files_out"] = 1
+            record["bytes_out"] = len(header_chunk.encode("utf-8")) + len(self.trailer_chunk.encode("utf-8"))
+            record["tokens_out"] = self.header_tokens
+        self.token_estimate = self.header_tokens
+        self.file_tokens = {}
+        self.processed_files = []
+        self.omitted_files = []
+        self.skeleton_files = []
+        self.skipped_files = []
+        self.duplicate_files = []
+        self.dedupe_saved_bytes = 0
+        self.dedupe_saved_tokens = 0
+        self._written_digests = {}
+        return header_chunk
+    
+    def _iter_output_chunks(self, source_files: List[str]) -> Iterator[SourceChunk]:
+        """
+        Yield the chunks that make it into the output, applying the token budget.
+        
+        Without a budget, chunks are streamed as files are read. With one, every
+        file has to be read before the selection can be made.
+        """
+        chunks = self._iter_source_chunks(source_files)
+        total = len(source_files)
+        if self.max_tokens is not None:
+            chunks = list(chunks)
+            with self.metrics.stage("select") as record:
+                record["files_in"] = len(chunks)
+                chunks = self._select_within_budget(chunks, self.max_tokens - self.header_tokens)
+                self.metrics.skip("over --max-tokens budget", len(self.omitted_files))
+                record["files_out"] = len(chunks)
+            total = len(chunks)
+        return self._accept_source_chunks(chunks, total)
+    
+    # Share of a file's priority its skeleton is worth in the budget selection
+    SKELETON_VALUE = 0.35
+    # Skeletons saving less than this share of the full chunk's tokens are not offered
+    MIN_SKELETON_SAVING = 0.2
+    SKELETON_NOTE = "[skeleton: signatures only, bodies omitted]\n"
+    
+    def _select_within_budget(self, chunks: List[SourceChunk], budget: int) -> List[SourceChunk]:
+        """
+        Pick the files that fit a token budget, maximising their total priority
+        (with a `query`, greedily in rank order instead).
+        
+        When everything does not fit and `skeletons` is on, each file can be
+        emitted in full, as its skeleton (worth SKELETON_VALUE of its priority)
+        or not at all, and the levels are chosen together with a
+        multiple-choice knapsack. Skeleton files are recorded in
+        `skeleton_files`, files that do not make the cut in `omitted_files`.
+        Unreadable and skipped files are passed through so they are still reported.
+        
+        Args:
+            chunks: Every source file's chunk, in output order
+            budget: Tokens available for file contents
+            
+        Returns:
+            The chosen chunks, in their original order
+        """
+        readable = [c for c in chunks if c.chunk is not None]
+        priorities = [self.file_priority(c.file_path) for c in readable]
+        skeletons: List[Optional[SourceChunk]] = [None] * len(readable)
+        if self.skeletons and sum(c.tokens for c in readable) > budget:
+            skeletons = [self._skeleton_chunk(c) for c in readable]
+        
+        # Chosen level of every readable file: 0 for full, 1 for skeleton
+        levels: List[Optional[int]] = [None] * len(readable)
+        if self.query is not None:
+            # Best-ranked files first, in full if they still fit, else as a skeleton
+            remaining = budget
+            for index in sorted(range(len(readable)), key=lambda i: -priorities[i]):
+                for level, option in enumerate((readable[index], skeletons[index])):
+                    if option is not None and option.tokens <= remaining:
+                        levels[index] = level
+                        remaining -= option.tokens
+                        break
+        elif any(skeletons):
+            levels = multiple_choice_knapsack([
+                [(c.tokens, priority)] + ([(skeleton.tokens, priority * self.SKELETON_VALUE)] if skeleton else [])
+                for c, skeleton, priority in zip(readable, skeletons, priorities)
+            ], budget)
+        else:
+            for index in knapsack_select([c.tokens for c in readable], priorities, budget):
+                levels[index] = 0
+        
+        selected = {}
+        for source_chunk, skeleton, level in zip(readable, skeletons, levels):
+            if level is None:
+                self.omitted_files.append((source_chunk.relative_path, source_chunk.tokens))
+            elif level == 1:
+                self.skeleton_files.append((source_chunk.relative_path, source_chunk.tokens, skeleton.tokens))
+                selected[source_chunk.file_path] = skeleton
+            else:
+                selected[source_chunk.file_path] = source_chunk
+        
+        return [selected.get(c.file_path, c) for c in chunks
+                if c.chunk is None or c.file_path in selected]
+    
+    def _skeleton_chunk(self, source_chunk: SourceChunk) -> Optional[SourceChunk]:
+        """
+        The skeleton rendering of a file's chunk, if it has a useful one.
+        
+        Skeletons are cached like chunks (under their own variant), so only
+        files that changed are parsed again.
+        
+        Args:
+            source_chunk: The file's full chunk
+            
+        Returns:
+            A copy of the chunk holding the skeleton, or None if the language has
+            no skeleton, the file does not parse or the skeleton saves too little
+        """
+        if not isinstance(source_chunk.chunk, str) or not SourceSkeleton.supports(source_chunk.relative_path):
+            return None
+        
+        variant = self._cache_variant(source_chunk.file_path) + "|skeleton"
+        stat_info = None
+        if self.cache is not None:
+            try:
+                stat_info = os.stat(source_chunk.file_path)
+                cached = self.cache.lookup(source_chunk.file_path, variant, stat_info)
+            except OSError:
+                stat_info, cached = None, None
+            if cached is not None and cached[3] and cached[2] == source_chunk.digest:
+                self.cache.mark_used(source_chunk.file_path, variant)
+                return source_chunk._replace(chunk=cached[0], tokens=cached[1]) if cached[0] else None
+        
+        try:
+            with open(source_chunk.file_path, "rb") as infile:
+                skeleton = SourceSkeleton.skeleton(source_chunk.relative_path, self.decode_text(infile.read()))
+        except OSError:
+            return None
+        
+        chunk, tokens = "", 0
+        if skeleton is not None:
+            chunk = self.finalize_text(self._format_file_content(source_chunk.relative_path, self.SKELETON_NOTE + skeleton))
+            tokens = self.tokenizer.count(chunk)
+            if tokens > source_chunk.tokens * (1 - self.MIN_SKELETON_SAVING):
+                chunk, tokens = "", 0
+        if stat_info is not None:
+            # An empty chunk records that the file has no useful skeleton
+            self.cache.store(source_chunk.file_path, variant, stat_info,
+                            source_chunk._replace(chunk=chunk, tokens=tokens, from_cache=False))
+        return source_chunk._replace(chunk=chunk, tokens=tokens) if chunk else None
+    
+    # Path components that mark code as less central to the project
+    LOW_PRIORITY_DIRECTORIES = frozenset({
+        "test", "tests", "spec", "specs", "__tests__", "testdata", "fixtures",
+        "example", "examples", "sample", "samples", "docs", "doc", "benchmarks", "scripts",
+    })
+    
+    def file_priority(self, file_path: str) -> float:
+        """
+        Priority of a file when selecting files for a token budget.
+        
+        Files forced in with `additional_files` always win. With a `query`, the
+        file's BM25 score is its priority. Otherwise files closer to the project
+        root rank higher, and tests, examples and docs rank lower.
+        
+        Args:
+            file_path: Absolute path of the file
+            
+        Returns:
+            Positive priority value (higher is more important)
+        """
+        if file_path in self._forced_paths:
+            return 1_000_000.0
+        if self.query is not None:
+            return self.query_scores.get(file_path, 0.0)
+        
+        parts = self._relative_posix_path(file_path).split("/")
+        priority = 100.0 / len(parts)
+        if self.LOW_PRIORITY_DIRECTORIES.intersection(p.lower() for p in parts[:-1]):
+            priority /= 4
+        return priority
+    
+    def directory_token_breakdown(self) -> List[Tuple[str, int]]:
+        """
+        Aggregate emitted tokens per directory (each file counts toward all its parents).
+        
+        Returns:
+            List of (directory, tokens), largest first ("." is the project root)
+        """
+        totals = {}
+        for relative_path, tokens in self.file_tokens.items():
+            parts = relative_path.replace(os.sep, "/").split("/")[:-1]
+            totals["."] = totals.get(".", 0) + tokens
+            for depth in range(1, len(parts) + 1):
+                directory = "/".join(parts[:depth])
+                totals[directory] = totals.get(directory, 0) + tokens
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    
+    def _create_file_header(self, directory_tree: Optional[str] = None) -> str:
+        """Create the header section of the output file (the tree goes in the trailer when cache-friendly)."""
+        if self.cache_friendly:
+            return f"""{self.ai_agent_prompt}
+    {'='*80}
+    FILE CONTENTS:
+    {'='*80}
+    """
+        if directory_tree is None:
+            directory_tree = self.generate_directory_tree(self.source_directory)
+        
+        return f"""{self.ai_agent_prompt}
+    PROJECT STRUCTURE:
+    {'-'*40}
+    {directory_tree}
+    {'='*80}
+    FILE CONTENTS:
+    {'='*80}
+    """
+    
+    def _create_file_trailer(self, directory_tree: str) -> str:
+        """Create the closing section of a cache-friendly output (the project tree)."""
+        return f"""
+    {'='*80}
+    PROJECT STRUCTURE:
+    {'-'*40}
+    {directory_tree}"""
+    
+    def _create_part_header(self, part_number: int, directory_tree: str) -> str:
+        """Create the header of one part of a sharded output."""
+        if part_number == 1:
+            prompt = self.ai_agent_prompt
+        else:
+            prompt = (f"Continuation of the codebase of {self.source_directory} "
+                    f"(see part 001 for instructions).")
+        
+        return f"""{prompt}
+    PART {part_number:03d}
+    PROJECT STRUCTURE:
+    {'-'*40}
+    {directory_tree}
+    {'='*80}
+    FILE CONTENTS (PART {part_number:03d}):
+    {'='*80}
+    """
+    
+    def _accept_source_chunks(self, chunks: Iterable[SourceChunk], total: int) -> Iterator[SourceChunk]:
+        """
+        Record each chunk in the run's statistics and pass on the ones to write.
+        
+        Skipped and unreadable files are reported instead of written, duplicates
+        are replaced by a reference, and progress is printed every 10 files.
+        
+        Args:
+            chunks: Chunks in output order
+            total: Number of chunks (for progress reporting)
+            
+        Yields:
+            The chunks to write, in order
+        """
+        # Keep stdout clean when it carries the output itself
+        progress_stream = sys.stderr if self.writes_to_stdout else sys.stdout
+        
+        for source_chunk in chunks:
+            if source_chunk.skip_reason is not None:
+                self.skipped_files.append((source_chunk.relative_path, source_chunk.skip_reason))
+                self.metrics.skip(source_chunk.skip_reason)
+                continue
+            if source_chunk.error is not None:
+                if self.use_git_index and isinstance(source_chunk.error, FileNotFoundError):
+                    # Tracked, but deleted from the working tree
+                    self.skipped_files.append((source_chunk.relative_path, "deleted from the working tree"))
+                    self.metrics.skip("deleted from the working tree")
+                    continue
+                print(f"⚠️  Could not read {source_chunk.relative_path}: {source_chunk.error}", file=sys.stderr)
+                self.metrics.skip("unreadable")
+                continue
+            
+            if self.dedupe:
+                source_chunk = self._deduplicate(source_chunk)
+            
+            self.metrics.add("emit", files_in=1, files_out=1, tokens_out=source_chunk.tokens)
+            self.file_tokens[source_chunk.relative_path] = source_chunk.tokens
+            self.token_estimate += source_chunk.tokens
+            self.processed_files.append(source_chunk.file_path)
+            yield source_chunk
+            
+            # Show progress every 10 files
+            if len(self.processed_files) % 10 == 0 and not self.quiet:
+                print(f"📦 Processed {len(self.processed_files)}/{total} files...", file=progress_stream)
+    
+    @staticmethod
+    def _chunk_bytes(chunk: Union[str, StreamedChunk]) -> int:
+        """Encoded size of a chunk (measured up front for streamed chunks)."""
+        return len(chunk.encode("utf-8")) if isinstance(chunk, str) else chunk.byte_count
+    
+    def _deduplicate(self, source_chunk: SourceChunk) -> SourceChunk:
+        """
+        Replace an exact copy of an already written file with a reference to it.
+        
+        Copies are matched on the content digest of the raw file. The reference is
+        only used when it is actually shorter than the copy (so empty files stay).
+        
+        Args:
+            source_chunk: Chunk about to be written
+            
+        Returns:
+            The chunk itself, or a one-line reference to the first copy
+        """
+        if source_chunk.digest is None:
+            return source_chunk
+        original = self._written_digests.setdefault(source_chunk.digest, source_chunk.relative_path)
+        if original == source_chunk.relative_path:
+            return source_chunk
+        
+        reference = self.finalize_text(self._format_file_content(
+            source_chunk.relative_path, f"[identical to {original}]"
+        ))
+        saved_bytes = self._chunk_bytes(source_chunk.chunk) - len(reference.encode("utf-8"))
+        if saved_bytes <= 0:
+            return source_chunk
+        
+        reference_tokens = self.tokenizer.count(reference)
+        self.duplicate_files.append((source_chunk.relative_path, original))
+        self.dedupe_saved_bytes += saved_bytes
+        self.dedupe_saved_tokens += source_chunk.tokens - reference_tokens
+        return source_chunk._replace(chunk=reference, tokens=reference_tokens)
+    
+    def _iter_source_chunks(self, source_files: List[str]) -> Iterator[SourceChunk]:
+        """
+        Yield the compressed chunk of every source file, in order.
+        
+        Chunks of unchanged files are spliced in from the cache. The remaining
+        files are read in the calling thread, or with more than one job, on a
+        thread pool with a bounded window of files in flight so reads overlap
+        without buffering the whole codebase. Fresh chunks are stored back
+        into the cache as they are consumed.
+        
+        Args:
+            source_files: List of source files to process
+            
+        Yields:
+            One SourceChunk per source file
+        """
+        from concurrent.futures import Future, ThreadPoolExecutor
+        
+        executor = ThreadPoolExecutor(max_workers=self.jobs) if self.jobs > 1 and len(source_files) > 1 else None
+        window = self.jobs * 4
+        pending = deque()
+        
+        def finish(entry) -> SourceChunk:
+            future, stat_info = entry
+            source_chunk = future.result()
+            self.metrics.add("read", files_in=1, files_out=source_chunk.chunk is not None,
+                            bytes_in=source_chunk.size, seconds=source_chunk.read_seconds)
+            if stat_info is not None and isinstance(source_chunk.chunk, str):
+                # Streamed chunks of large files are not cached
+                started = time.perf_counter()
+                self.cache.store(source_chunk.file_path, self._cache_variant(source_chunk.file_path),
+                                stat_info, source_chunk)
+                self.metrics.add("cache", seconds=time.perf_counter() - started)
+            return source_chunk
+        
+        try:
+            for file_path in source_files:
+                file_path = os.path.abspath(file_path)
+                stat_info = None
+                cached = None
+                future = None
+                
+                if self.cache is not None:
+                    started = time.perf_counter()
+                    variant = self._cache_variant(file_path)
+                    try:
+                        stat_info = os.stat(file_path)
+                        cached = self.cache.lookup(file_path, variant, stat_info)
+                    except OSError:
+                        stat_info = None
+                    
+                    if cached is not None and cached[3] and not self.cache.verify_hash:
+                        # Unchanged file: resolve immediately, keeping its place in line
+                        self.cache.mark_used(file_path, variant)
+                        future = Future()
+                        future.set_result(SourceChunk(
+                            file_path, os.path.relpath(file_path, self.source_directory),
+                            chunk=cached[0], tokens=cached[1], digest=cached[2], from_cache=True,
+                            size=stat_info.st_size,
+                        ))
+                        stat_info = None
+                    self.metrics.add("cache", files_in=1, files_out=future is not None,
+                                    seconds=time.perf_counter() - started)
+                
+                if future is None:
+                    if executor is None:
+                        future = Future()
+                        future.set_result(self._read_source_chunk(file_path, cached))
+                    else:
+                        future = executor.submit(self._read_source_chunk, file_path, cached)
+                
+                pending.append((future, stat_info))
+                if len(pending) >= window:
+                    yield finish(pending.popleft())
+            
+            while pending:
+                yield finish(pending.popleft())
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _cache_variant(self, file_path: str) -> str:
+        """Fingerprint of the settings that shape a file's chunk (part of the cache key)."""
+        variant = (f"{self.source_directory}|{self.tokenizer.name}|minify={self.minify}"
+                f"|classifier={self.classifier.fingerprint}")
+        # Forced files bypass the classifier, so their chunks are not interchangeable
+        return variant + "|forced" if file_path in self._forced_paths else variant
+    
+    def _read_source_chunk(self, file_path: str, cached: Optional[Tuple[str, int, Optional[str], bool]] = None) -> SourceChunk:
+        """
+        Read, format and compress a single source file.
+        
+        Safe to call from worker threads: it only touches the file itself.
+        
+        Args:
+            file_path: Absolute path to the source file
+            cached: Cache entry found for the file, reused if the cache verifies
+                content hashes and the hash still matches
+            
+        Returns:
+            The file's SourceChunk (with `error` set if it could not be read)
+        """
+        started = time.perf_counter()
+        relative_path = os.path.relpath(file_path, self.source_directory)
+        classifier = None if file_path in self._forced_paths else self.classifier
+        truncated_from = None
+        
+        try:
+            with open(file_path, "rb") as infile:
+                size = os.fstat(infile.fileno()).st_size
+                if classifier is None:
+                    raw_content = b""
+                    limit = size
+                else:
+                    # Sniff the start of the file before committing to a full read
+                    raw_content = infile.read(classifier.SNIFF_BYTES)
+                    reason = classifier.skip_reason(os.path.basename(file_path), size, raw_content)
+                    if reason is not None:
+                        return SourceChunk(file_path, relative_path, skip_reason=reason, size=len(raw_content),
+                                        read_seconds=time.perf_counter() - started)
+                    limit = min(size, classifier.max_file_size)
+                    if size > classifier.max_file_size:
+                        truncated_from = size
+                
+                # Streamed files are not minified (with --minify they just keep their newlines)
+                if limit > self.STREAM_THRESHOLD:
+                    return self._stream_source_chunk(file_path, relative_path, size, truncated_from, started)
+                
+                if truncated_from is not None:
+                    raw_content += infile.read(max(0, limit - len(raw_content)))
+                    raw_content = raw_content[:raw_content.rfind(b"\n") + 1] or raw_content
+                else:
+                    raw_content += infile.read()
+        except Exception as e:
+            return SourceChunk(file_path, relative_path, error=e, read_seconds=time.perf_counter() - started)
+        
+        digest = ChunkCache.content_digest(raw_content)
+        if self.cache is not None:
+            if self.cache.verify_hash and cached is not None and cached[2] == digest:
+                return SourceChunk(file_path, relative_path, chunk=cached[0],
+                                tokens=cached[1], digest=digest, from_cache=True, size=len(raw_content),
+                                read_seconds=time.perf_counter() - started)
+        
+        file_content = self.decode_text(raw_content)
+        if self.minify:
+            file_content = SourceMinifier.minify(relative_path, file_content)
+        if truncated_from is not None:
+            file_content += (f"\n… [truncated: showing the first {len(raw_content) / 1024:,.0f} KB "
+                            f"of {truncated_from / 1024:,.0f} KB]\n")
+        
+        # Format and compress the file content
+        chunk = self.finalize_text(self._format_file_content(relative_path, file_content))
+        return SourceChunk(file_path, relative_path, chunk=chunk,
+                        tokens=self.tokenizer.count(chunk), digest=digest, size=len(raw_content),
+                        read_seconds=time.perf_counter() - started)
+    
+    def _stream_source_chunk(self, file_path: str, relative_path: str, size: int,
+                            truncated_from: Optional[int], started: float) -> SourceChunk:
+        """
+        Build the streamed chunk of a file larger than STREAM_THRESHOLD.
+        
+        The file is memory-mapped and passed over once here to hash it and size
+        its chunk; its text is only produced again, piece by piece, when written.
+        """
+        limit = size
+        note = ""
+        if truncated_from is not None:
+            limit = StreamedChunk.line_limit(file_path, self.classifier.max_file_size)
+            note = (f"\n… [truncated: showing the first {limit / 1024:,.0f} KB "
+                    f"of {truncated_from / 1024:,.0f} KB]\n")
+        
+        head, _, tail = self._format_file_content(relative_path, "\0").partition("\0")
+        chunk = StreamedChunk(file_path, head, note + tail, limit, compress=not self.minify)
+        tokens, digest = chunk.measure(self.tokenizer)
+        return SourceChunk(file_path, relative_path, chunk=chunk, tokens=tokens, digest=digest,
+                        size=limit, read_seconds=time.perf_counter() - started)
+    
+    @staticmethod
+    def decode_text(raw_content: bytes) -> str:
+        """
+        Decode raw file bytes the way text-mode `open(..., errors="ignore")` would.
+        
+        Args:
+            raw_content: Raw file content
+            
+        Returns:
+            Decoded text with universal newlines
+        """
+        text = raw_content.decode("utf-8", errors="ignore")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+    
+    def _format_file_content(self, relative_path: str, file_content: str) -> str:
+        """
+        Format a single file's content as an output chunk.
+        
+        Args:
+            relative_path: Relative path of the file
+            file_content: Content of the file
+            
+        Returns:
+            The formatted (uncompressed) chunk
+        """
+        separator = f"\n{'-'*60}\n"
+        
+        return (
+            f"{separator}"
+            f"📁 File: {relative_path}\n"
+            f"{'-'*60}\n"
+            f"## File content: \n{file_content}\n"
+        )
+    
+    def process(self) -> Tuple[str, List[str], float]:
+        """
+        Main method to process the codebase.
+        
+        This is the primary entry point for using the CodebaseProcessor.
+        
+        Returns:
+            Tuple containing:
+            - Path to the processed output file
+            - List of processed source files  
+            - Output file size in KB
+        """
+        return self.create_consolidated_file()
+    
+
+
+
+
+class BatchResult(NamedTuple):
+    """Outcome of squeezing one project of a batch."""
+    directory: str
+    output_path: Optional[str]
+    seconds: float
+    files: int = 0
+    size_bytes: int = 0
+    tokens: int = 0
+    skipped: int = 0
+    error: Optional[str] = None
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """
+    Read a batch manifest: one project directory per line.
+    
+    Blank lines and lines starting with "#" are ignored, and relative paths are
+    resolved against the manifest's own directory ("-" reads stdin, relative
+    to the current directory). A directory listed more than once is squeezed
+    once: later entries are dropped with a warning, as they would otherwise
+    race on the same default output file.
+    
+    Args:
+        manifest_path: Path of the manifest file, or "-"
+        
+    Returns:
+        Project directories in manifest order, without duplicates
+    """
+    if manifest_path == "-":
+        lines = sys.stdin.read().splitlines()
+        base = ""
+    else:
+        with open(manifest_path, "r", encoding="utf-8") as manifest:
+            lines = manifest.read().splitlines()
+        base = os.path.dirname(manifest_path)
+    
+    directories = []
+    seen = {}
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        directory = os.path.normpath(os.path.join(base, os.path.expanduser(line)))
+        key = os.path.normcase(os.path.abspath(directory))
+        if key in seen:
+            print(f"⚠️  {manifest_path}:{line_number}: {line} is already listed on line {seen[key]}, skipping it",
+                file=sys.stderr)
+            continue
+        seen[key] = line_number
+        directories.append(directory)
+    return directories
+
+
+@functools.lru_cache(maxsize=4)
+def _load_tokenizer(vocab_path: str) -> BPETokenizer:
+    """Load a BPE vocabulary once per process (batch workers reuse it across projects)."""
+    return BPETokenizer.from_file(vocab_path)
+
+
+def squeeze_project(directory: str,
+                    output_file: Optional[str] = None,
+                    options: Optional[dict] = None,
+                    cache_options: Optional[dict] = None,
+                    tokenizer_vocab: Optional[str] = None) -> BatchResult:
+    """
+    Squeeze a single project of a batch (runs in a worker process).
+    
+    Never raises for a failing project: the failure is returned in `error`.
+    
+    Args:
+        directory: Project directory
+        output_file: Output path (defaults to the processor's {directory}_codebase.txt)
+        options: `CodebaseProcessor` keyword arguments shared by the batch; relative
+            paths in `ignored_files`, `ignored_directories`, `additional_files` and
+            `entry_points` are resolved against `directory`
+        cache_options: `ChunkCache` keyword arguments, or None to run without the cache
+        tokenizer_vocab: Local BPE rank file to count tokens with
+        
+    Returns:
+        The project's BatchResult
+    """
+    import sqlite3
+    
+    started = time.perf_counter()
+    options = dict(options or {})
+    cache = None
+    try:
+        base_dir = os.path.abspath(directory)
+        if not os.path.isdir(base_dir):
+            raise NotADirectoryError(f"Not a directory: {directory}")
+        
+        # Same resolution as the CLI applies to a single PROJECT_DIR
+        for key in ("ignored_files", "additional_files", "entry_points"):
+            options[key] = [path if os.path.isabs(path) else os.path.abspath(os.path.join(base_dir, path))
+                            for path in options.get(key) or []]
+        options["ignored_directories"] = CodebaseProcessor.resolve_ignored_directories(
+            base_dir, options.get("ignored_directories") or []
+        )
+        
+        if cache_options is not None:
+            try:
+                cache = ChunkCache(**cache_options)
+            except (OSError, sqlite3.Error):
+                cache = None
+        
+        processor = CodebaseProcessor(
+            base_dir,
+            output_file=output_file,
+            cache=cache,
+            tokenizer=_load_tokenizer(tokenizer_vocab) if tokenizer_vocab else None,
+            quiet=True,
+            **options
+        )
+        output_path, processed_files, _ = processor.process()
+        return BatchResult(directory, output_path, time.perf_counter() - started,
+                        files=len(processed_files), size_bytes=processor.output_size_bytes,
+                        tokens=processor.token_estimate, skipped=len(processor.skipped_files))
+    except Exception as e:
+        return BatchResult(directory, None, time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+    finally:
+        if cache is not None:
+            with contextlib.suppress(sqlite3.Error):
+                cache.close()
+
+
+def batch_output_paths(directories: List[str], output_dir: Optional[str] = None,
+                    extension: str = "txt") -> List[Optional[str]]:
+    """
+    Choose the output path of every project of a batch.
+    
+    Without `output_dir` each project gets its default output next to it. With
+    it, outputs are named after the project directory, and projects that share
+    a name are told apart with a numeric suffix (api_codebase.txt, api-2_codebase.txt).
+    """
+    if output_dir is None:
+        return [None] * len(directories)
+    
+    paths = []
+    seen = Counter()
+    for directory in directories:
+        name = os.path.basename(os.path.abspath(directory)) or "project"
+        seen[name] += 1
+        if seen[name] > 1:
+            name = f"{name}-{seen[name]}"
+        paths.append(os.path.join(output_dir, f"{name}_codebase.{extension}"))
+    return paths
+
+
+def run_batch(directories: List[str],
+            output_dir: Optional[str] = None,
+            workers: int = 1,
+            options: Optional[dict] = None,
+            cache_options: Optional[dict] = None,
+            tokenizer_vocab: Optional[str] = None) -> Iterator[BatchResult]:
+    """
+    Squeeze many projects, one `CodebaseProcessor` each, on a process pool.
+    
+    Every worker pays interpreter startup once and then keeps its imports and
+    loaded tokenizer for all the projects it is handed.
+    
+    Args:
+        directories: Project directories (see `read_manifest`)
+        output_dir: Directory for all outputs (see `batch_output_paths`); created if needed
+        workers: Number of worker processes (1 runs every project in this process)
+        options, cache_options, tokenizer_vocab: Shared settings (see `squeeze_project`)
+        
+    Yields:
+        One BatchResult per project, in order of completion
+    """
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    extension = CodebaseProcessor.OUTPUT_EXTENSIONS[(options or {}).get("output_format", "text")]
+    jobs = list(zip(directories, batch_output_paths(directories, output_dir, extension)))
+    
+    if workers <= 1 or len(jobs) <= 1:
+        for directory, output_file in jobs:
+            yield squeeze_project(directory, output_file, options, cache_options, tokenizer_vocab)
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = {
+            executor.submit(squeeze_project, directory, output_file, options, cache_options, tokenizer_vocab): directory
+            for directory, output_file in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed for running out of memory)
+                yield BatchResult(futures[future], None, 0.0, error=f"{type(e).__name__}: {e}")
+
+
+class WarmCodebaseProcessor(CodebaseProcessor):
+    """
+    CodebaseProcessor that keeps its walk between runs (used by the daemon).
+    
+    The first run walks the project as usual and records the stat of every
+    directory it lists, of the ignore files that could apply to them and of
+    .git/index and info/exclude. Later runs reuse the tree and file list until
+    `changed()` reports that one of those moved. File contents are checked on
+    every run anyway, through the chunk cache's stat key.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._snapshot: Optional[Tuple[str, List[str]]] = None
+        self._watched: dict = {}
+        self._recording = False
+    
+    @property
+    def is_warm(self) -> bool:
+        """Whether the next run reuses the previous walk."""
+        return self._snapshot is not None
+    
+    @staticmethod
+    def _stat_key(path: str) -> Optional[Tuple[int, int, int]]:
+        """What the watcher compares for a path (None while it does not exist)."""
+        try:
+            stat_info = os.stat(path)
+        except OSError:
+            return None
+        return stat_info.st_mtime_ns, stat_info.st_size, stat_info.st_ino
+    
+    def _watch(self, path: str) -> None:
+        """Record the current stat of a path the walk depends on."""
+        self._watched[path] = self._stat_key(path)
+    
+    def _watch_directory(self, directory: str) -> None:
+        """Record a directory and its ignore files, before the directory is listed."""
+        self._watch(directory)
+        if self.ignore_matcher.use_ignore_files:
+            for name in self.ignore_matcher.ignore_file_names:
+                self._watch(os.path.join(directory, name))
+    
+    def changed(self) -> bool:
+        """Check whether anything the cached walk depends on has changed since."""
+        return any(self._stat_key(path) != key for path, key in list(self._watched.items()))
+    
+    def scan_project(self) -> Tuple[str, List[str]]:
+        """Walk the project on the first run, then return the same result until it changes."""
+        if self._snapshot is not None:
+            return self._snapshot
+        
+        self._watched = {}
+        repository = GitIndex.find_repository(self.source_directory)
+        if repository is not None:
+            self._watch(os.path.join(repository[1], "info", "exclude"))
+            if self.use_git_index:
+                self._watch(os.path.join(repository[1], "index"))
+        self._watch_directory(self.source_directory)
+        
+        self._recording = True
+        try:
+            self._snapshot = super().scan_project()
+        finally:
+            self._recording = False
+        return self._snapshot
+    
+    def iter_project_entries(self, root=None, show_hidden: bool = False,
+                            ignored_dirs: Optional[List[str]] = None,
+                            max_depth: Optional[int] = None) -> Iterator[TreeEntry]:
+        """Walk like CodebaseProcessor, recording every directory entered by `scan_project`."""
+        for entry in super().iter_project_entries(root, show_hidden, ignored_dirs, max_depth):
+            if self._recording and entry.is_dir and not entry.is_symlink:
+                self._watch_directory(entry.path)
+            yield entry
+
+
+DAEMON_DEFAULT_PORT = 7391
+
+
+def daemon_address(address: Optional[str] = None) -> Union[str, Tuple[str, int]]:
+    """
+    Resolve the address of the daemon.
+    
+    Accepts "unix:PATH", "HOST:PORT" or a bare "PORT". By default the daemon
+    listens on a Unix socket in the cache directory, or on localhost where
+    Unix sockets are not available. TCP addresses must be loopback addresses:
+    the daemon serves file contents to anyone who can connect.
+    
+    Returns:
+        A socket path (str) or a (host, port) tuple
+        
+    Raises:
+        ValueError: If the address is malformed or not a loopback address
+    """
+    import socket
+    
+    if address is None:
+        if hasattr(socket, "AF_UNIX"):
+            return os.path.join(ChunkCache.default_cache_dir(), "daemon.sock")
+        return "127.0.0.1", DAEMON_DEFAULT_PORT
+    if address.startswith("unix:"):
+        return os.path.abspath(os.path.expanduser(address[len("unix:"):]))
+    
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    if not port.isdigit():
+        raise ValueError(f"Invalid address {address!r} (expected unix:PATH, HOST:PORT or PORT)")
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        raise ValueError(f"Refusing to use non-loopback address {host!r}")
+    return host, int(port)
+
+
+def format_address(address: Union[str, Tuple[str, int]]) -> str:
+    """Show a daemon address the way `--listen` accepts it."""
+    return f"unix:{address}" if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
 
-            try:
-                # Read the file content
-                with open(file_path, "r", encoding="utf-8") as file:
-                    content = file.read()
-
-                # Remove newlines and compress multiple tabs
-                content = content.replace("\n", "")
-                content = re.sub(r"\t{2,}", "\t", content)
-
-                # Write the compressed content back
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(content)
-
-                return file_path
-
-            except FileNotFoundError:
-                print(f"Error: '{file_path}' does not exist.", file=sys.stderr)
-                sys.exit(1)
-            except PermissionError:
-                print(f"Error: Permission denied accessing '{file_path}'.", file=sys.stderr)
-                sys.exit(1)
-            except OSError as exc:
-                print(f"OS error while processing '{file_path}': {exc}", file=sys.stderr)
-                sys.exit(1)
-            except Exception as exc:
-                print(f"Unexpected error: {exc}", file=sys.stderr)
-                sys.exit(1)
-        
-        def create_consolidated_file(self) -> Tuple[str, List[str], float]:
-            """
-            Create the final consolidated file with project structure and file contents.
-            
-            Returns:
-                Tuple containing:
-                - Path to the processed output file
-                - List of processed source files
-                - Output file size in KB
-            """
-            # Discover and filter files
-            all_files = self.discover_all_files()
-            source_files = self.filter_files_by_extension(all_files)
-            
-            # Add additional files if specified
-            if self.additional_files:
-                for file_path in self.additional_files:
-                    abs_path = os.path.abspath(file_path)
-                    if abs_path not in source_files:
-                        source_files.append(abs_path)
+class SqueezeServer:
+    """
+    Local daemon that keeps projects warm between squeezes.
+    
+    Each (project, settings) pair gets a WarmCodebaseProcessor whose walk is
+    reused until a background polling watcher sees the project's directories
+    or ignore files change. Chunks live in a shared MemoryChunkCache and are
+    revalidated by stat on every request, so edits are always picked up.
+    Requests are served one at a time, as HTTP over a Unix socket or a
+    loopback TCP port:
+    
+        POST /squeeze   {"directory": ..., "options": {...}} -> the output text, streamed
+                        with chunked encoding; the run's summary follows as trailers
+        GET  /status    warm projects and cache statistics (JSON)
+        POST /shutdown  stop the daemon
+    """
+    
+    # Request options, passed on to CodebaseProcessor (classifier settings aside)
+    REQUEST_OPTIONS = (
+        "additional_extensions", "ignored_files", "ignored_directories", "additional_files",
+        "use_ignore_files", "max_tokens", "skeletons", "minify", "dedupe", "use_git_index",
+        "tree_max_entries", "tree_selected_only", "sniff_shebangs", "cache_friendly",
+    )
+    CLASSIFIER_OPTIONS = ("max_file_size", "truncate_large", "skip_generated")
+    
+    def __init__(self,
+                cache: Optional[MemoryChunkCache] = None,
+                tokenizer: Optional[Union[HeuristicTokenizer, BPETokenizer]] = None,
+                poll_interval: float = 0.5,
+                max_projects: int = 16,
+                jobs: int = 1):
+        """
+        Initialize the server.
         
-            # Remove ignored files
-            if self.ignored_files:
-                ignored_abs_paths = [os.path.abspath(f) for f in self.ignored_files]
-                source_files = [f for f in source_files 
-                            if os.path.abspath(f) not in ignored_abs_paths]
+        Args:
+            cache: Chunk cache shared by every project (defaults to an in-memory one)
+            tokenizer: Token counter (defaults to the 4-chars-per-token heuristic)
+            poll_interval: Seconds between two checks of the watched paths
+            max_projects: Number of (project, settings) pairs kept warm
+            jobs: Worker threads used to read files that are not cached
+        """
+        import threading
+        
+        self.cache = cache if cache is not None else MemoryChunkCache()
+        self.tokenizer = tokenizer
+        self.poll_interval = poll_interval
+        self.max_projects = max_projects
+        self.jobs = jobs
+        self.requests = 0
+        self._projects = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._http = None
+    
+    def squeeze(self, directory: str, write: Callable[[bytes], None], options: Optional[dict] = None) -> dict:
+        """
+        Squeeze a project, reusing whatever is still warm.
+        
+        The output is handed to `write` chunk by chunk as it is produced, so
+        the daemon never holds a whole dump in memory.
+        
+        Args:
+            directory: Absolute project directory
+            write: Receives the output as UTF-8 bytes, in pieces
+            options: Settings (see REQUEST_OPTIONS and CLASSIFIER_OPTIONS)
             
-            # Additional safety check: remove files from ignored directories
-            if self.ignored_directories:
-                source_files = self.remove_files_from_ignored_directories(
-                    source_files, self.ignored_directories
-                )
+        Returns:
+            A summary of the run
             
-            # Create the header with project structure
-            header = self._create_file_header()
+        Raises:
+            ValueError: For a missing directory or an unknown option (before
+                anything is written)
+        """
+        import json
+        
+        options = dict(options or {})
+        unknown = set(options) - set(self.REQUEST_OPTIONS) - set(self.CLASSIFIER_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown option(s): {', '.join(sorted(unknown))}")
+        directory = os.path.abspath(directory)
+        if not os.path.isdir(directory):
+            raise ValueError(f"Not a directory: {directory}")
+        
+        started = time.perf_counter()
+        key = (directory, json.dumps(options, sort_keys=True))
+        with self._lock:
+            processor = self._projects.pop(key, None)
+            if processor is None:
+                processor = self._create_processor(directory, options)
+            self._projects[key] = processor
+            while len(self._projects) > self.max_projects:
+                self._projects.pop(next(iter(self._projects)))
+        
+            warm = processor.is_warm
+            nbytes = 0
+            for chunk in processor.iter_chunks():
+                data = chunk.encode("utf-8")
+                nbytes += len(data)
+                write(data)
+            self.cache.flush()
+            self.requests += 1
+        
+        return {
+            "files": len(processor.processed_files),
+            "tokens": processor.token_estimate,
+            "bytes": nbytes,
+            "skipped": len(processor.skipped_files),
+            "walk": "warm" if warm else "cold",
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+    
+    def _create_processor(self, directory: str, options: dict) -> WarmCodebaseProcessor:
+        """Build the warm processor of a (project, settings) pair."""
+        classifier_options = {name: options.pop(name) for name in self.CLASSIFIER_OPTIONS if name in options}
+        return WarmCodebaseProcessor(
+            directory,
+            output_file="-",
+            cache=self.cache,
+            tokenizer=self.tokenizer,
+            classifier=FileClassifier(**classifier_options),
+            jobs=self.jobs,
+            quiet=True,
+            **options
+        )
+    
+    def poll(self) -> int:
+        """
+        Check every warm project once and drop the walks that went stale.
+        
+        Returns:
+            Number of projects invalidated
+        """
+        with self._lock:
+            processors = list(self._projects.values())
+        stale = [processor for processor in processors if processor.is_warm and processor.changed()]
+        with self._lock:
+            for processor in stale:
+                # A new processor also recompiles the ignore rules
+                for key, current in list(self._projects.items()):
+                    if current is processor:
+                        del self._projects[key]
+        return len(stale)
+    
+    def status(self) -> dict:
+        """Warm projects and cache statistics."""
+        import json
+        
+        with self._lock:
+            projects = [{"directory": key[0], "options": json.loads(key[1]), "warm": processor.is_warm}
+                        for key, processor in self._projects.items()]
+        return {
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "projects": projects,
+            "cache": {"hits": self.cache.hits, "misses": self.cache.misses,
+                    "bytes": getattr(self.cache, "size_bytes", None)},
+        }
+    
+    def _watch_loop(self) -> None:
+        """Poll the warm projects until the server stops."""
+        while not self._stopped.wait(self.poll_interval):
+            self.poll()
+    
+    def serve_forever(self, address: Union[str, Tuple[str, int]]) -> None:
+        """
+        Serve requests until `shutdown()` (or POST /shutdown) is called.
+        
+        Args:
+            address: Socket path or (host, port), see `daemon_address`
+        """
+        import threading
+        
+        self._http = self._create_http_server(address)
+        watcher = threading.Thread(target=self._watch_loop, name="codesqueeze-watcher", daemon=True)
+        watcher.start()
+        try:
+            self._http.serve_forever()
+        finally:
+            self._stopped.set()
+            self._http.server_close()
+            if isinstance(address, str):
+                with contextlib.suppress(OSError):
+                    os.unlink(address)
+    
+    def shutdown(self) -> None:
+        """Stop `serve_forever()` (safe to call from a request handler)."""
+        import threading
+        
+        if self._http is not None:
+            # shutdown() blocks until the serving loop exits, so not from its own thread
+            threading.Thread(target=self._http.shutdown, daemon=True).start()
+    
+    def _create_http_server(self, address: Union[str, Tuple[str, int]]):
+        """Bind the HTTP server to a Unix socket path or a (host, port) pair."""
+        import http.server
+        import json
+        import socket
+        import socketserver
+        
+        squeezer = self
+        
+        class RequestHandler(http.server.BaseHTTPRequestHandler):
+            server_version = "CodeSqueeze"
+            # Chunked responses need HTTP/1.1
+            protocol_version = "HTTP/1.1"
+            SUMMARY_FIELDS = ("files", "tokens", "bytes", "skipped", "walk", "seconds")
             
-            # Write header to output file
-            with open(self.output_file_path, "w", encoding="utf-8") as outfile:
-                outfile.write(header)
+            def log_message(self, format, *args):
+                pass
             
-            # Process each source file
-            processed_count = self._process_source_files(source_files)
+            def send_body(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, str(value))
+                self.end_headers()
+                self.wfile.write(body)
             
-            # Compress the final output file
-            compressed_path = self.compress_file_content(self.output_file_path)
-            file_size_kb = self.get_file_size_kb(self.output_file_path)
+            def send_json(self, status: int, payload: dict):
+                self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json")
             
-            return compressed_path, source_files, file_size_kb
-        
-        def _create_file_header(self) -> str:
-            """Create the header section of the output file."""
-            directory_tree = self.generate_directory_tree(self.source_directory)
+            def do_GET(self):
+                if self.path == "/status":
+                    self.send_json(200, squeezer.status())
+                else:
+                    self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
             
-            return f"""{self.ai_agent_prompt}
-    PROJECT STRUCTURE:
-    {'-'*40}
-    {directory_tree}
-    {'='*80}
-    FILE CONTENTS:
-    {'='*80}
-    """
-        
-        def _process_source_files(self, source_files: List[str]) -> int:
-            """
-            Process each source file and append to output file.
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if self.path == "/shutdown":
+                    self.send_json(200, {"status": "stopping"})
+                    squeezer.shutdown()
+                    return
+                if self.path != "/squeeze":
+                    self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+                    return
+                self.send_output(body)
             
-            Args:
-                source_files: List of source files to process
+            def send_output(self, body: bytes):
+                """
+                Stream a squeeze with chunked transfer encoding.
                 
-            Returns:
-                Number of successfully processed files
-            """
-            processed_count = 0
-            
-            for file_path in source_files:
-                relative_path = os.path.relpath(file_path, self.source_directory)
+                The run's summary is only known at the end, so it follows the
+                last chunk as trailer fields (X-CodeSqueeze-Files, …).
+                """
+                started = False
+                
+                def write(data: bytes):
+                    nonlocal started
+                    if not started:
+                        started = True
+                        self.send_response(200)
+                        self.send_header("Content-Type", "text/plain; charset=utf-8")
+                        self.send_header("Transfer-Encoding", "chunked")
+                        self.send_header("Trailer", ", ".join(f"X-CodeSqueeze-{name.title()}"
+                                                              for name in self.SUMMARY_FIELDS))
+                        self.end_headers()
+                    if data:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
                 
                 try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as infile:
-                        file_content = infile.read()
+                    request = json.loads(body or b"{}")
+                    summary = squeezer.squeeze(request["directory"], write, request.get("options"))
                 except Exception as e:
-                    click.echo(click.style(
-                        f"⚠️  Could not read {relative_path}: {e}", fg='yellow'
-                    ))
-                    continue
-                
-                # Append file content with proper formatting
-                self._append_file_content(relative_path, file_content)
-                
-                processed_count += 1
-                
-                # Show progress every 10 files
-                if processed_count % 10 == 0:
-                    click.echo(f"📦 Processed {processed_count}/{len(source_files)} files...")
-            
-            return processed_count
-        
-        def _append_file_content(self, relative_path: str, file_content: str) -> None:
-            """
-            Append a single file's content to the output file.
-            
-            Args:
-                relative_path: Relative path of the file
-                file_content: Content of the file
-            """
-            separator = f"\n{'-'*60}\n"
-            
-            with open(self.output_file_path, "a", encoding="utf-8") as outfile:
-                outfile.write(
-                    f"{separator}"
-                    f"📁 File: {relative_path}\n"
-                    f"{'-'*60}\n"
-                    f"## File content: \n{file_content}\n"
-                )
+                    if started:
+                        # Too late for an error status: cut the stream short, which
+                        # the client reports as an incomplete response
+                        self.close_connection = True
+                    elif isinstance(e, (KeyError, TypeError, ValueError)):
+                        self.send_json(400, {"error": f"{type(e).__name__}: {e}"})
+                    else:
+                        self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                    return
+                write(b"")
+                trailers = "".join(f"X-CodeSqueeze-{name.title()}: {summary[name]}\r\n"
+                                for name in self.SUMMARY_FIELDS)
+                self.wfile.write(b"0\r\n" + trailers.encode("ascii") + b"\r\n")
         
-        def process(self) -> Tuple[str, List[str], float]:
-            """
-            Main method to process the codebase.
+        if isinstance(address, str):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(address)  # left behind by a daemon that did not shut down cleanly
+            os.makedirs(os.path.dirname(address), exist_ok=True)
             
-            This is the primary entry point for using the CodebaseProcessor.
+            class UnixHTTPServer(socketserver.UnixStreamServer):
+                def get_request(self):
+                    request, _ = super().get_request()
+                    return request, ("local", 0)
             
-            Returns:
-                Tuple containing:
-                - Path to the processed output file
-                - List of processed source files  
-                - Output file size in KB
-            """
-            return self.create_consolidated_file()
+            old_umask = os.umask(0o177)  # the socket is only for the current user
+            try:
+                return UnixHTTPServer(address, RequestHandler)
+            finally:
+                os.umask(old_umask)
         
-except Exception as error:
-        print(error)
+        server_class = http.server.HTTPServer
+        if ":" in address[0]:
+            server_class = type("HTTPServerV6", (http.server.HTTPServer,), {"address_family": socket.AF_INET6})
+        return server_class(address, RequestHandler)
 
 
+def request_daemon(address: Union[str, Tuple[str, int]], method: str, path: str,
+                body: Optional[dict] = None, timeout: float = 600.0,
+                output: Optional[IO] = None) -> Tuple[int, dict, bytes]:
+    """
+    Send one request to a running daemon.
+    
+    Args:
+        address: Socket path or (host, port), see `daemon_address`
+        method: HTTP method
+        path: Endpoint, e.g. "/squeeze"
+        body: JSON request body
+        timeout: Seconds to wait for the response
+        output: Binary file object that a successful response body is copied
+            into block by block instead of being returned
+        
+    Returns:
+        Status code, response headers (including trailer fields) and response
+        body (empty when it went to `output`)
+        
+    Raises:
+        ConnectionAbortedError: If the response is cut short (the run failed midway)
+        OSError: If the daemon cannot be reached
+    """
+    import http.client
+    import json
+    import socket
+    
+    class TrailerHTTPResponse(http.client.HTTPResponse):
+        """HTTPResponse that keeps the trailer fields of a chunked body instead of dropping them."""
+        
+        trailers: dict = {}
+        
+        def _read_and_discard_trailer(self):
+            self.trailers = {}
+            while True:
+                line = self.fp.readline(65537)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                self.trailers[name.strip()] = value.strip()
+    
+    if isinstance(address, str):
+        class UnixHTTPConnection(http.client.HTTPConnection):
+            response_class = TrailerHTTPResponse
+            
+            def connect(self):
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(self.timeout)
+                self.sock.connect(address)
+        
+        connection = UnixHTTPConnection("localhost", timeout=timeout)
+    else:
+        connection = http.client.HTTPConnection(address[0], address[1], timeout=timeout)
+        connection.response_class = TrailerHTTPResponse
+    
+    try:
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        if output is None or response.status != 200:
+            data = response.read()
+        else:
+            data = b""
+            while True:
+                block = response.read(64 * 1024)
+                if not block:
+                    break
+                output.write(block)
+        return response.status, {**dict(response.getheaders()), **response.trailers}, data
+    except http.client.IncompleteRead as e:
+        raise ConnectionAbortedError(f"The daemon's response was cut short ({e!r})") from e
+    finally:
+        connection.close()
 
 
-@click.command(
-    context_settings=dict(help_option_names=["-h", "--help"]),
-    epilog="""
+CLI_EPILOG = """
 \b
 EXAMPLES:
     Basic usage (creates myproject_codebase.txt):
@@ -601,9 +5840,63 @@ EXAMPLES:
     Include non-code files and set custom output:
         $ codesqueeze myproject -f README.md -f docs/notes.txt -o complete_project.txt
 
+    Stream to stdout and pipe it into another program (messages go to stderr):
+        $ codesqueeze myproject -o - | llm "Review this codebase"
+
     Copy result directly to clipboard:
         $ codesqueeze myproject --copy
 
+    Only tracked files, listed from the git index without walking the tree:
+        $ codesqueeze myproject --git
+
+    Collapse directories with more than 20 entries in the project tree:
+        $ codesqueeze myproject --tree-max-entries 20
+
+    Read files on 8 worker threads (useful on network filesystems):
+        $ codesqueeze myproject --jobs 8
+
+    Keep the output under 100k tokens, counted with a local BPE vocabulary:
+        $ codesqueeze myproject --max-tokens 100000 --tokenizer-vocab cl100k_base.tiktoken
+        (files that do not fit in full keep their signatures; --no-skeleton drops them)
+
+    Only the files relevant to a question, best first within the budget:
+        $ codesqueeze myproject --query "how are sessions refreshed" --max-tokens 50000
+
+    Only the files reachable through imports from an entry point:
+        $ codesqueeze monorepo --entry services/billing/main.py --entry web/src/index.tsx
+
+    Minify per language instead of stripping newlines (safe for Python, YAML, shell):
+        $ codesqueeze myproject --minify
+
+    Include the first 256 KB of big files instead of skipping them:
+        $ codesqueeze myproject --max-file-size 256 --truncate-large
+
+    Stable prefix for LLM prompt caching (least recently modified files first, tree last):
+        $ codesqueeze myproject --cache-friendly
+
+    One JSON record per file, plus a byte-offset index (myproject_codebase.jsonl.index.json):
+        $ codesqueeze myproject --format jsonl
+
+    Split the output into parts of at most 30k tokens (myproject_codebase/part-001.txt, …):
+        $ codesqueeze myproject --split-tokens 30000
+
+    See where the time goes, and keep the numbers for a dashboard:
+        $ codesqueeze myproject --stats --metrics-json squeeze-metrics.json
+
+    Ignore the chunk cache, or throw it away and start over:
+        $ codesqueeze myproject --no-cache
+        $ codesqueeze myproject --rebuild-cache
+
+    Squeeze every project listed in repos.txt on 8 processes, outputs in squeezed/:
+        $ codesqueeze --batch repos.txt --workers 8 -o squeezed --batch-report report.json
+
+    Keep projects warm in a daemon and squeeze through it in milliseconds:
+        $ codesqueeze serve &
+        $ codesqueeze client myproject > prompt.txt
+
+    Squeeze a project directory that is itself called serve or client:
+        $ codesqueeze ./serve
+
     Complex example with multiple options:
         $ codesqueeze myproject -e md -e yaml -i config.py --ignore-dir tests -f LICENSE -o project_export.txt --copy
 
@@ -617,151 +5910,945 @@ SUPPORTED FILE TYPES (by default):
 
 \b
 NOTES:
-    • Files are compressed (whitespace removed) to save space
+    • Files are compressed (whitespace removed) to save space; --minify strips
+      comments and docstrings per language while keeping code valid
+    • Identical files are written once; later copies point to the first one
+    • Compressed files are cached in ~/.cache/codesqueeze, so unchanged files are not re-read
     • Output includes project structure tree and file contents
     • Perfect for sharing with AI assistants like ChatGPT, Claude, or GitHub Copilot
     • Use --copy to get a ready-to-paste prompt for AI tools
-""",
-)
-@click.argument(
-    "directory",
-    type=click.Path(exists=True, file_okay=False, dir_okay=True),
-    metavar="PROJECT_DIR",
-)
-@click.option(
-    "-e",
-    "--extra-extensions",
-    multiple=True,
-    metavar="EXT",
-    help="Include additional file extensions (without dot). Can be used multiple times.",
-)
-@click.option(
-    "-i",
-    "--ignore",
-    multiple=True,
-    metavar="FILE",
-    help="Exclude specific files from processing. Path relative to PROJECT_DIR.",
-)
-@click.option(
-    "--ignore-dir",
-    "--ignore-directory", 
-    "ignore_directory",
-    multiple=True,
-    metavar="DIR",
-    help="Exclude entire directories from processing. Path relative to PROJECT_DIR.",
-)
-@click.option(
-    "-f",
-    "--add-files",
-    multiple=True,
-    metavar="FILE",
-    help="Force include specific files, even if they don't match normal extensions.",
-)
-@click.option(
-    "-o",
-    "--output",
-    type=click.Path(),
-    metavar="FILENAME",
-    help="Custom output filename (default: PROJECT_DIR_codebase.txt).",
-)
-@click.option(
-    "-c",
-    "--copy",
-    is_flag=True,
-    help="Copy the generated file content to clipboard as an AI-ready prompt.",
-)
-def cli(directory, extra_extensions, ignore, ignore_directory, add_files, output, copy):
-    """
-    Transform your entire codebase into a single, AI-friendly text file.
-
-    \b
-    PROJECT_DIR: The directory containing your project to process
-    
-    \b
-    WHAT IT DOES:
-    • Scans your project directory recursively
-    • Includes all common programming language files automatically  
-    • Creates a structured text file with project tree + file contents
-    • Compresses whitespace to maximize content in AI context windows
-    • Generates files perfect for ChatGPT, Claude, and other AI assistants
-
-    \b
-    AUTOMATICALLY IGNORED:
-    • Dependencies: node_modules, vendor, __pycache__, .git
-    • Build outputs: dist, build, target
-    • IDE files: .vscode, .idea
-    • Binary and media files
-    """
-    
-    # Convert directory to absolute path
-    base_dir = os.path.abspath(directory)
-    
-    # Process ignored files (convert to absolute paths relative to base_dir)
-    processed_ignored = []
-    for f in ignore:
-        # If absolute path, use as-is, otherwise make relative to base_dir
-        if os.path.isabs(f):
-            processed_ignored.append(f)
-        else:
-            processed_ignored.append(os.path.abspath(os.path.join(base_dir, f)))
-    
-    # Process add_files
-    processed_add_files = []
-    for f in add_files:
-        # If absolute path, use as-is, otherwise make relative to base_dir
-        if os.path.isabs(f):
-            processed_add_files.append(f)
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def build_cli():
+    """
+    Build the click command.
+    
+    click is only imported here, so importing CodeSqueeze as a library does not
+    pay for it. `CodeSqueeze.cli` still resolves to the command (see `__getattr__`).
+    """
+    import click
+    
+    class SqueezeGroup(click.Group):
+        """
+        Top-level command group: `squeeze` (the default), `serve` and `client`.
+        
+        Arguments that do not start with a subcommand name go to `squeeze`, so
+        `codesqueeze myproject` works as before. Subcommand names always win: a
+        project directory called serve or client is given as ./serve or with an
+        explicit `codesqueeze squeeze serve`.
+        """
+        
+        default_command = "squeeze"
+        
+        def parse_args(self, ctx, args):
+            if not args or args[0] not in self.commands:
+                args = [self.default_command, *args]
+            return super().parse_args(ctx, args)
+    
+    @click.command(
+        "squeeze",
+        context_settings=dict(help_option_names=["-h", "--help"]),
+        epilog=CLI_EPILOG,
+    )
+    @click.argument(
+        "directory",
+        type=click.Path(exists=True, file_okay=False, dir_okay=True),
+        metavar="PROJECT_DIR",
+        required=False,
+    )
+    @click.option(
+        "-e",
+        "--extra-extensions",
+        multiple=True,
+        metavar="EXT",
+        help="Include additional file extensions (without dot; multi-part ones such as d.ts work too). "
+             "Can be used multiple times.",
+    )
+    @click.option(
+        "--sniff-shebangs",
+        is_flag=True,
+        help="Also include files without an extension whose #! line names a known interpreter "
+             "(python, bash, node, …).",
+    )
+    @click.option(
+        "-i",
+        "--ignore",
+        multiple=True,
+        metavar="FILE",
+        help="Exclude specific files from processing. Path relative to PROJECT_DIR.",
+    )
+    @click.option(
+        "--ignore-dir",
+        "--ignore-directory", 
+        "ignore_directory",
+        multiple=True,
+        metavar="DIR",
+        help="Exclude directories from processing: a bare name at any depth, a path relative to PROJECT_DIR.",
+    )
+    @click.option(
+        "-f",
+        "--add-files",
+        multiple=True,
+        metavar="FILE",
+        help="Force include specific files, even if they don't match normal extensions.",
+    )
+    @click.option(
+        "-o",
+        "--output",
+        type=click.Path(allow_dash=True),
+        metavar="FILENAME",
+        help="Custom output filename (default: PROJECT_DIR_codebase.txt), or - for stdout.",
+    )
+    @click.option(
+        "-c",
+        "--copy",
+        is_flag=True,
+        help="Copy the generated file content to clipboard as an AI-ready prompt.",
+    )
+    @click.option(
+        "-j",
+        "--jobs",
+        type=click.IntRange(min=1),
+        default=1,
+        show_default=True,
+        metavar="N",
+        help="Read and compress files on N worker threads (output order is unchanged).",
+    )
+    @click.option(
+        "--no-cache",
+        is_flag=True,
+        help="Do not read or update the persistent chunk cache.",
+    )
+    @click.option(
+        "--rebuild-cache",
+        is_flag=True,
+        help="Discard every cached chunk and rebuild the cache from scratch.",
+    )
+    @click.option(
+        "--cache-verify",
+        is_flag=True,
+        help="Only reuse cached chunks whose content hash still matches (slower, safer).",
+    )
+    @click.option(
+        "--cache-size",
+        type=click.IntRange(min=1),
+        default=ChunkCache.DEFAULT_MAX_BYTES // (1024 * 1024),
+        show_default=True,
+        metavar="MB",
+        help="Maximum size of the chunk cache before old entries are evicted.",
+    )
+    @click.option(
+        "--no-gitignore",
+        is_flag=True,
+        help="Do not honour .gitignore / .squeezeignore files inside PROJECT_DIR.",
+    )
+    @click.option(
+        "--git",
+        "use_git_index",
+        is_flag=True,
+        help="List tracked files straight from .git/index instead of walking the directory.",
+    )
+    @click.option(
+        "--tree-max-entries",
+        type=click.IntRange(min=1),
+        metavar="N",
+        help="In the project tree, show at most N entries per directory and summarize the rest "
+             "(e.g. \"… 4,312 more files (.png ×4,000, .json ×312)\").",
+    )
+    @click.option(
+        "--tree-selected-only",
+        is_flag=True,
+        help="Only show the included files, and the directories holding them, in the project tree.",
+    )
+    @click.option(
+        "--max-tokens",
+        type=click.IntRange(min=1),
+        metavar="N",
+        help="Token budget for the whole output; the most important files that fit are kept.",
+    )
+    @click.option(
+        "--no-skeleton",
+        is_flag=True,
+        help="With --max-tokens, omit files that do not fit instead of keeping their signatures only "
+             "(imports, classes, function signatures, first docstring line).",
+    )
+    @click.option(
+        "--query",
+        metavar="TEXT",
+        help="Only include the files relevant to TEXT, ranked with BM25 over a persistent "
+             "word index (best first within --max-tokens).",
+    )
+    @click.option(
+        "--entry",
+        "entry_points",
+        multiple=True,
+        metavar="FILE",
+        help="Only include files reachable through imports from FILE (Python, JS/TS, Go, Rust). "
+             "Path relative to PROJECT_DIR. Can be used multiple times.",
+    )
+    @click.option(
+        "--tokenizer-vocab",
+        type=click.Path(exists=True, dir_okay=False),
+        envvar="CODESQUEEZE_TOKENIZER_VOCAB",
+        metavar="FILE",
+        help="Count tokens with a local tiktoken-style BPE rank file (e.g. cl100k_base.tiktoken).",
+    )
+    @click.option(
+        "--token-report",
+        is_flag=True,
+        help="Show a per-file and per-directory token breakdown.",
+    )
+    @click.option(
+        "--split-tokens",
+        type=click.IntRange(min=1),
+        metavar="N",
+        help="Write part-001.txt, part-002.txt, … of at most N tokens each into a directory.",
+    )
+    @click.option(
+        "--split-bytes",
+        type=click.IntRange(min=1),
+        metavar="N",
+        help="Write part-001.txt, part-002.txt, … of at most N bytes each into a directory.",
+    )
+    @click.option(
+        "-m",
+        "--minify",
+        is_flag=True,
+        help="Minify per language (drop comments, docstrings, blank lines) and keep newlines, "
+             "instead of stripping every newline. Files over 256 KB are streamed unminified.",
+    )
+    @click.option(
+        "--cache-friendly",
+        is_flag=True,
+        help="Order the output for LLM prompt caching: prompt first (no absolute path), then files "
+             "from least to most recently modified, then the project tree.",
+    )
+    @click.option(
+        "--format",
+        "output_format",
+        type=click.Choice(CodebaseProcessor.OUTPUT_FORMATS),
+        default="text",
+        show_default=True,
+        help="Output format: one record per file as JSON lines, XML elements or a compact pack, "
+             "each with a OUTPUT.index.json of byte offsets for random access.",
+    )
+    @click.option(
+        "--max-file-size",
+        type=click.IntRange(min=1),
+        default=FileClassifier.DEFAULT_MAX_FILE_SIZE // 1024,
+        show_default=True,
+        metavar="KB",
+        help="Skip files larger than this (see --truncate-large).",
+    )
+    @click.option(
+        "--truncate-large",
+        is_flag=True,
+        help="Include the first --max-file-size KB of oversized files instead of skipping them.",
+    )
+    @click.option(
+        "--include-generated",
+        is_flag=True,
+        help="Keep lockfiles, generated code and minified bundles (binaries are always skipped).",
+    )
+    @click.option(
+        "--no-dedupe",
+        is_flag=True,
+        help="Write every copy of identical files in full instead of referencing the first one.",
+    )
+    @click.option(
+        "--stats",
+        is_flag=True,
+        help="Print a per-stage table of wall time, files, bytes and tokens.",
+    )
+    @click.option(
+        "--metrics-json",
+        type=click.Path(dir_okay=False, writable=True),
+        metavar="PATH",
+        help="Write per-stage timings and counters as JSON to PATH.",
+    )
+    @click.option(
+        "--batch",
+        type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+        metavar="MANIFEST",
+        help="Squeeze every project directory listed in MANIFEST (one per line) instead of "
+             "PROJECT_DIR; -o then names the output directory.",
+    )
+    @click.option(
+        "--workers",
+        type=click.IntRange(min=1),
+        default=os.cpu_count() or 1,
+        show_default="CPU count",
+        metavar="N",
+        help="Squeeze N --batch projects at a time on worker processes.",
+    )
+    @click.option(
+        "--batch-report",
+        type=click.Path(dir_okay=False, writable=True),
+        metavar="PATH",
+        help="Write the --batch summary (per-project time, size, status) as JSON to PATH.",
+    )
+    @click.option(
+        "-q",
+        "--quiet",
+        is_flag=True,
+        help="Print nothing but warnings and errors (no banner, progress or summary).",
+    )
+    def squeeze(directory, extra_extensions, sniff_shebangs, ignore, ignore_directory, add_files, output, copy, jobs,
+            no_cache, rebuild_cache, cache_verify, cache_size, no_gitignore, use_git_index,
+            tree_max_entries, tree_selected_only, max_tokens, no_skeleton, query, entry_points, tokenizer_vocab,
+            token_report, split_tokens, split_bytes, minify, cache_friendly, output_format, max_file_size, truncate_large, include_generated, no_dedupe, stats, metrics_json,
+            batch, workers, batch_report, quiet):
+        """
+        Transform your entire codebase into a single, AI-friendly text file.
+
+        \b
+        PROJECT_DIR: The directory containing your project to process
+        (or use --batch MANIFEST to process many projects at once)
+    
+        \b
+        WHAT IT DOES:
+        • Scans your project directory recursively
+        • Includes all common programming language files automatically  
+        • Creates a structured text file with project tree + file contents
+        • Compresses whitespace to maximize content in AI context windows
+        • Generates files perfect for ChatGPT, Claude, and other AI assistants
+
+        \b
+        AUTOMATICALLY IGNORED:
+        • Anything matched by .gitignore / .squeezeignore files (at any level)
+        • Dependencies: node_modules, vendor, __pycache__, .git
+        • Build outputs: dist, build, target
+        • IDE files: .vscode, .idea
+        • Binary and media files, lockfiles, generated code and minified bundles
+        • Files over --max-file-size (1 MB by default)
+        """
+        to_stdout = output == "-"
+        
+        # The banner is only for people watching a terminal
+        if not quiet and not to_stdout and sys.stdout.isatty():
+            print_banner()
+        
+        classifier = FileClassifier(
+            max_file_size=max_file_size * 1024,
+            truncate_large=truncate_large,
+            skip_generated=not include_generated,
+        )
+        
+        if batch is not None:
+            if directory is not None:
+                raise click.UsageError("Pass either PROJECT_DIR or --batch MANIFEST, not both.")
+            if copy or to_stdout or token_report or stats or metrics_json:
+                raise click.UsageError(
+                    "--batch cannot be combined with --copy, -o -, --token-report, --stats or --metrics-json."
+                )
+            run_batch_command(
+                batch, output, workers, batch_report, quiet,
+                options=dict(
+                    additional_extensions=list(extra_extensions),
+                    ignored_files=list(ignore),
+                    ignored_directories=list(ignore_directory),
+                    additional_files=list(add_files),
+                    jobs=jobs,
+                    use_ignore_files=not no_gitignore,
+                    max_tokens=max_tokens,
+                    skeletons=not no_skeleton,
+                    query=query,
+                    entry_points=list(entry_points),
+                    split_tokens=split_tokens,
+                    split_bytes=split_bytes,
+                    minify=minify,
+                    output_format=output_format,
+                    classifier=classifier,
+                    dedupe=not no_dedupe,
+                    use_git_index=use_git_index,
+                    tree_max_entries=tree_max_entries,
+                    tree_selected_only=tree_selected_only,
+                    sniff_shebangs=sniff_shebangs,
+                    cache_friendly=cache_friendly,
+                ),
+                no_cache=no_cache, rebuild_cache=rebuild_cache, cache_verify=cache_verify,
+                cache_size=cache_size, tokenizer_vocab=tokenizer_vocab,
+            )
+            return
+        if directory is None:
+            raise click.UsageError("Missing argument 'PROJECT_DIR' (or pass --batch MANIFEST).")
+        
+        # Convert directory to absolute path
+        base_dir = os.path.abspath(directory)
+    
+        # Process ignored files (convert to absolute paths relative to base_dir)
+        processed_ignored = []
+        for f in ignore:
+            # If absolute path, use as-is, otherwise make relative to base_dir
+            if os.path.isabs(f):
+                processed_ignored.append(f)
+            else:
+                processed_ignored.append(os.path.abspath(os.path.join(base_dir, f)))
+    
+        # Process add_files
+        processed_add_files = []
+        for f in add_files:
+            # If absolute path, use as-is, otherwise make relative to base_dir
+            if os.path.isabs(f):
+                processed_add_files.append(f)
+            else:
+                processed_add_files.append(os.path.abspath(os.path.join(base_dir, f)))
+    
+        # Process entry points (relative to base_dir, like --add-files)
+        processed_entry_points = []
+        for f in entry_points:
+            entry_path = f if os.path.isabs(f) else os.path.abspath(os.path.join(base_dir, f))
+            if not os.path.isfile(entry_path):
+                raise click.BadParameter(f"File '{f}' does not exist.", param_hint="--entry")
+            processed_entry_points.append(entry_path)
+    
+        # Process ignored directories (bare names match at any depth, paths are anchored)
+        processed_ignored_dirs = CodebaseProcessor.resolve_ignored_directories(base_dir, ignore_directory)
+    
+        if copy and (split_tokens or split_bytes):
+            raise click.UsageError("--copy cannot be combined with --split-tokens/--split-bytes.")
+        if to_stdout and (split_tokens or split_bytes):
+            raise click.UsageError("-o - cannot be combined with --split-tokens/--split-bytes.")
+        if output_format != "text" and (split_tokens or split_bytes):
+            raise click.UsageError("--format cannot be combined with --split-tokens/--split-bytes.")
+        if cache_friendly and (split_tokens or split_bytes):
+            raise click.UsageError("--cache-friendly cannot be combined with --split-tokens/--split-bytes.")
+    
+        # Load the tokenizer
+        tokenizer = None
+        if tokenizer_vocab:
+            try:
+                tokenizer = BPETokenizer.from_file(tokenizer_vocab)
+            except (OSError, ValueError) as e:
+                raise click.BadParameter(str(e), param_hint="--tokenizer-vocab")
+    
+        # Open the persistent chunk cache
+        import sqlite3
+        
+        cache = None
+        if not no_cache:
+            try:
+                cache = ChunkCache(
+                    max_bytes=cache_size * 1024 * 1024,
+                    verify_hash=cache_verify,
+                    rebuild=rebuild_cache,
+                )
+            except (OSError, sqlite3.Error) as e:
+                click.echo(click.style(f"⚠️  Chunk cache disabled: {e}", fg='yellow'), err=True)
+    
+        # Stream --copy straight into the clipboard tool when there is one
+        clipboard = ClipboardStream.open() if copy else None
+    
+        # Create the file collector
+        collector = CodebaseProcessor(
+            source_directory=directory,
+            additional_extensions=extra_extensions,
+            ignored_files=processed_ignored,
+            ignored_directories=processed_ignored_dirs,
+            additional_files=processed_add_files,
+            output_file=output,
+            capture_output=copy and clipboard is None,
+            mirror_output=clipboard,
+            jobs=jobs,
+            cache=cache,
+            use_ignore_files=not no_gitignore,
+            tokenizer=tokenizer,
+            max_tokens=max_tokens,
+            skeletons=not no_skeleton,
+            query=query,
+            entry_points=processed_entry_points,
+            split_tokens=split_tokens,
+            split_bytes=split_bytes,
+            minify=minify,
+            output_format=output_format,
+            classifier=classifier,
+            dedupe=not no_dedupe,
+            quiet=quiet,
+            use_git_index=use_git_index,
+            tree_max_entries=tree_max_entries,
+            tree_selected_only=tree_selected_only,
+            sniff_shebangs=sniff_shebangs,
+            cache_friendly=cache_friendly,
+        )
+    
+        # Generate the codebase file
+        try:
+            final_file, processed_files, total_size_kb = collector.process()
+        except BaseException as e:
+            if clipboard is not None:
+                # Leave the clipboard as it was rather than copy partial output
+                clipboard.abort()
+            if isinstance(e, ValueError):
+                raise click.ClickException(str(e))
+            raise
+        finally:
+            if cache is not None:
+                cache.close()
+    
+        # Print results (--quiet keeps only warnings and errors)
+        # and goes to stderr when stdout carries the output itself
+        if quiet:
+            echo = lambda *args, **kwargs: None
         else:
-            processed_add_files.append(os.path.abspath(os.path.join(base_dir, f)))
+            echo = functools.partial(click.echo, err=to_stdout)
+        echo("\n" + click.style("✓ Successfully processed files:", fg='green', bold=True))
+        for f in processed_files:
+            rel_path = os.path.relpath(f, base_dir)
+            if token_report and rel_path in collector.file_tokens:
+                echo(f"  • {rel_path} ({collector.file_tokens[rel_path]:,} tokens)")
+            else:
+                echo(f"  • {rel_path}")
+    
+        if collector.skipped_files:
+            echo("\n" + click.style(
+                f"⏭️  Skipped {len(collector.skipped_files)} files:", fg='yellow', bold=True
+            ))
+            for rel_path, reason in collector.skipped_files:
+                echo(f"  • {rel_path} ({reason})")
+    
+        if collector.duplicate_files:
+            echo("\n" + click.style(
+                f"♻️  Deduplicated {len(collector.duplicate_files)} files "
+                f"(saved {collector.dedupe_saved_bytes / 1024:,.1f} KB, {collector.dedupe_saved_tokens:,} tokens):",
+                fg='cyan', bold=True
+            ))
+            for rel_path, original in collector.duplicate_files:
+                echo(f"  • {rel_path} → {original}")
+    
+        if entry_points:
+            echo("\n" + click.style(
+                f"🧭 {collector.reachable_files:,} files reachable from {len(entry_points)} entry point"
+                f"{'s' if len(entry_points) != 1 else ''}",
+                fg='cyan', bold=True
+            ))
+    
+        if query is not None:
+            echo("\n" + click.style(
+                f"🔎 Query matched {len(collector.query_scores):,} of {collector.query_candidates:,} files",
+                fg='cyan', bold=True
+            ))
+    
+        if collector.skeleton_files:
+            saved_tokens = sum(full - skeleton for _, full, skeleton in collector.skeleton_files)
+            echo("\n" + click.style(
+                f"🦴 Reduced {len(collector.skeleton_files)} files to signatures (saved {saved_tokens:,} tokens) "
+                f"to fit --max-tokens:",
+                fg='yellow', bold=True
+            ))
+            for rel_path, full, skeleton in collector.skeleton_files:
+                echo(f"  • {rel_path} ({full:,} → {skeleton:,} tokens)")
     
-    # Process ignored directories
-    processed_ignored_dirs = []
-    for d in ignore_directory:
-        if os.path.isabs(d):
-            processed_ignored_dirs.append(d)
+        if collector.omitted_files:
+            omitted_tokens = sum(tokens for _, tokens in collector.omitted_files)
+            echo("\n" + click.style(
+                f"✂️  Omitted {len(collector.omitted_files)} files ({omitted_tokens:,} tokens) to fit --max-tokens:",
+                fg='yellow', bold=True
+            ))
+            for rel_path, tokens in collector.omitted_files:
+                echo(f"  • {rel_path} ({tokens:,} tokens)")
+    
+        if token_report:
+            echo("\n" + click.style("🧮 Tokens by directory:", fg='magenta', bold=True))
+            echo(f"  {'(header and tree)':<50} {collector.header_tokens:>12,}")
+            for directory_name, tokens in collector.directory_token_breakdown()[:25]:
+                echo(f"  {directory_name:<50} {tokens:>12,}")
+    
+        if collector.is_sharded:
+            echo("\n" + click.style("📄 Output parts:", fg='cyan', bold=True))
+            echo(f"  {final_file}/ ({len(collector.output_parts)} parts, see index.txt)")
         else:
-            processed_ignored_dirs.append(os.path.join(base_dir, d))
+            echo("\n" + click.style("📄 Output file:", fg='cyan', bold=True))
+            echo(f"  {'<stdout>' if to_stdout else final_file}")
+            if collector.index_path is not None:
+                echo(f"  Index: {collector.index_path}")
     
-    # Create the file collector
-    collector = CodebaseProcessor(
-        source_directory=directory,
-        additional_extensions=extra_extensions,
-        ignored_files=processed_ignored,
-        ignored_directories=processed_ignored_dirs,
-        additional_files=processed_add_files,
-        output_file=output
-    )
+        total_size_mb = total_size_kb / 1024
+        echo(click.style(f"  Size: {total_size_mb:.2f} MB", fg='blue'))
     
-    # Generate the codebase file
-    final_file, processed_files, total_size_kb = collector.process()
+        # Tokens were counted while the output was written
+        token_label = "Tokens" if tokenizer is not None else "Estimated tokens"
+        echo(click.style(f"  {token_label}: {collector.token_estimate:,}", fg='magenta'))
+        if max_tokens is not None:
+            echo(click.style(f"  Token budget: {max_tokens:,}", fg='magenta'))
     
-    # Print results
-    click.echo("\n" + click.style("✓ Successfully processed files:", fg='green', bold=True))
-    for f in processed_files:
-        rel_path = os.path.relpath(f, base_dir)
-        click.echo(f"  • {rel_path}")
+        if cache is not None:
+            echo(click.style(
+                f"  Cache: {cache.hits:,} reused, {cache.misses:,} rebuilt", fg='blue'
+            ))
+        
+        if stats:
+            # Explicitly requested, so shown even with --quiet
+            click.echo("\n" + click.style("⏱️  Pipeline stages:", fg='magenta', bold=True), err=to_stdout)
+            click.echo(collector.metrics.format_table(), err=to_stdout)
+        
+        if metrics_json:
+            import json
+            
+            with open(metrics_json, "w", encoding="utf-8") as metrics_file:
+                json.dump(collector.metrics.as_dict(), metrics_file, indent=2)
     
-    click.echo("\n" + click.style("📄 Output file:", fg='cyan', bold=True))
-    click.echo(f"  {final_file}")
+        if copy:
+            query_suffix = f"\n\nQuery: {query or '[provide your query]'}"
+            if clipboard is not None:
+                # The output was streamed into the clipboard tool as it was written
+                clipboard.write(query_suffix.encode("utf-8"))
+                try:
+                    clipboard.close()
+                except OSError as e:
+                    click.echo(click.style(f"⚠️  Could not copy to the clipboard: {e}", fg='yellow'), err=True)
+                    return
+            else:
+                import pyperclip
+                
+                pyperclip.copy(collector.captured_output + query_suffix)
+            echo(click.style(f"\n✓ Successfully Copied as prompt!\n", fg='cyan'))
     
-    total_size_mb = total_size_kb / 1024
-    click.echo(click.style(f"  Size: {total_size_mb:.2f} MB", fg='blue'))
+    @click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+    @click.option(
+        "--listen",
+        metavar="ADDRESS",
+        help="unix:PATH, HOST:PORT or PORT (loopback only). "
+             "Default: a Unix socket in the cache directory.",
+    )
+    @click.option(
+        "--poll-interval",
+        type=click.FloatRange(min=0.05),
+        default=0.5,
+        show_default=True,
+        metavar="SECONDS",
+        help="How often the watcher checks projects for added, removed or renamed files.",
+    )
+    @click.option(
+        "--max-projects",
+        type=click.IntRange(min=1),
+        default=16,
+        show_default=True,
+        metavar="N",
+        help="Number of (project, settings) pairs kept warm.",
+    )
+    @click.option(
+        "-j",
+        "--jobs",
+        type=click.IntRange(min=1),
+        default=1,
+        show_default=True,
+        metavar="N",
+        help="Read files that are not cached yet on N worker threads.",
+    )
+    @click.option(
+        "--no-cache",
+        is_flag=True,
+        help="Keep chunks in memory only, without reading or updating the persistent chunk cache.",
+    )
+    @click.option(
+        "--cache-verify",
+        is_flag=True,
+        help="Only reuse persistent cache entries whose content hash still matches.",
+    )
+    @click.option(
+        "--cache-size",
+        type=click.IntRange(min=1),
+        default=ChunkCache.DEFAULT_MAX_BYTES // (1024 * 1024),
+        show_default=True,
+        metavar="MB",
+        help="Maximum size of the in-memory and of the persistent chunk cache.",
+    )
+    @click.option(
+        "--tokenizer-vocab",
+        type=click.Path(exists=True, dir_okay=False),
+        envvar="CODESQUEEZE_TOKENIZER_VOCAB",
+        metavar="FILE",
+        help="Count tokens with a local tiktoken-style BPE rank file.",
+    )
+    @click.option(
+        "-q",
+        "--quiet",
+        is_flag=True,
+        help="Print nothing but warnings and errors.",
+    )
+    def serve(listen, poll_interval, max_projects, jobs, no_cache, cache_verify, cache_size,
+            tokenizer_vocab, quiet):
+        """
+        Run a local daemon that keeps projects warm for `client`.
+
+        \b
+        The directory tree, file list and compressed chunks of every project
+        it is asked for stay in memory. A polling watcher notices added,
+        removed and renamed files and changed ignore files; edited files are
+        picked up on every request. Stop it with Ctrl-C or `client --shutdown`.
+        """
+        import sqlite3
+        
+        try:
+            address = daemon_address(listen)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--listen")
+        
+        with contextlib.suppress(OSError):
+            request_daemon(address, "GET", "/status", timeout=2)
+            raise click.ClickException(f"A daemon is already listening on {format_address(address)}.")
+        
+        tokenizer = None
+        if tokenizer_vocab:
+            try:
+                tokenizer = BPETokenizer.from_file(tokenizer_vocab)
+            except (OSError, ValueError) as e:
+                raise click.BadParameter(str(e), param_hint="--tokenizer-vocab")
+        
+        backing = None
+        if not no_cache:
+            try:
+                backing = ChunkCache(max_bytes=cache_size * 1024 * 1024, verify_hash=cache_verify)
+            except (OSError, sqlite3.Error) as e:
+                click.echo(click.style(f"⚠️  Chunk cache disabled: {e}", fg='yellow'), err=True)
+        
+        server = SqueezeServer(
+            cache=MemoryChunkCache(backing, max_bytes=cache_size * 1024 * 1024),
+            tokenizer=tokenizer,
+            poll_interval=poll_interval,
+            max_projects=max_projects,
+            jobs=jobs,
+        )
+        if not quiet:
+            click.echo(click.style(
+                f"🚀 CodeSqueeze daemon listening on {format_address(address)} (pid {os.getpid()})",
+                fg='cyan', bold=True,
+            ))
+        try:
+            server.serve_forever(address)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            raise click.ClickException(f"Could not listen on {format_address(address)}: {e}")
+        finally:
+            server.cache.close()
+        if not quiet:
+            click.echo(click.style("✓ Daemon stopped", fg='green'))
     
-    # Estimate tokens (simplified: 4 chars ≈ 1 token)
-    try:
-        with open(final_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        token_estimate = len(content) // 4
-        click.echo(click.style(f"  Estimated tokens: {token_estimate:,}", fg='magenta'))
-    except Exception as e:
-        click.echo(click.style(f"  Token estimation failed: {e}", fg='yellow'))
+    @click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+    @click.argument(
+        "directory",
+        type=click.Path(exists=True, file_okay=False, dir_okay=True),
+        metavar="PROJECT_DIR",
+        required=False,
+    )
+    @click.option("-e", "--extra-extensions", multiple=True, metavar="EXT",
+                help="Include additional file extensions (without dot).")
+    @click.option("--sniff-shebangs", is_flag=True,
+                help="Also include extensionless scripts with a known #! interpreter.")
+    @click.option("-i", "--ignore", multiple=True, metavar="FILE",
+                help="Exclude specific files. Path relative to PROJECT_DIR.")
+    @click.option("--ignore-dir", "ignore_directory", multiple=True, metavar="DIR",
+                help="Exclude directories: a bare name at any depth, a path relative to PROJECT_DIR.")
+    @click.option("-f", "--add-files", multiple=True, metavar="FILE",
+                help="Force include specific files.")
+    @click.option("-o", "--output", type=click.Path(allow_dash=True), default="-", metavar="FILENAME",
+                help="Write the output to FILENAME instead of stdout.")
+    @click.option("--no-gitignore", is_flag=True,
+                help="Do not honour .gitignore / .squeezeignore files.")
+    @click.option("--git", "use_git_index", is_flag=True,
+                help="List tracked files straight from .git/index.")
+    @click.option("--tree-max-entries", type=click.IntRange(min=1), metavar="N",
+                help="Show at most N entries per directory in the tree.")
+    @click.option("--tree-selected-only", is_flag=True,
+                help="Only show the included files in the tree.")
+    @click.option("--max-tokens", type=click.IntRange(min=1), metavar="N",
+                help="Token budget for the whole output.")
+    @click.option("--no-skeleton", is_flag=True,
+                help="Omit files that do not fit --max-tokens instead of keeping their signatures.")
+    @click.option("-m", "--minify", is_flag=True,
+                help="Minify per language instead of stripping every newline.")
+    @click.option("--cache-friendly", is_flag=True,
+                help="Order the output for LLM prompt caching (stable files first, tree last).")
+    @click.option("--max-file-size", type=click.IntRange(min=1),
+                default=FileClassifier.DEFAULT_MAX_FILE_SIZE // 1024, show_default=True, metavar="KB",
+                help="Skip files larger than this (see --truncate-large).")
+    @click.option("--truncate-large", is_flag=True,
+                help="Include the first --max-file-size KB of oversized files.")
+    @click.option("--include-generated", is_flag=True,
+                help="Keep lockfiles, generated code and minified bundles.")
+    @click.option("--no-dedupe", is_flag=True,
+                help="Write every copy of identical files in full.")
+    @click.option("--connect", metavar="ADDRESS",
+                help="Address of the daemon (as given to `serve --listen`).")
+    @click.option("--status", is_flag=True, help="Show the daemon's warm projects and cache statistics.")
+    @click.option("--shutdown", is_flag=True, help="Stop the daemon.")
+    @click.option("-q", "--quiet", is_flag=True, help="Do not print the summary line.")
+    def client(directory, extra_extensions, sniff_shebangs, ignore, ignore_directory, add_files, output, no_gitignore,
+            use_git_index, tree_max_entries, tree_selected_only, max_tokens, no_skeleton, minify, cache_friendly,
+            max_file_size, truncate_large, include_generated, no_dedupe, connect, status, shutdown, quiet):
+        """
+        Squeeze PROJECT_DIR through a running `serve` daemon.
+
+        \b
+        Takes the same settings as the main command and writes the same
+        output (to stdout by default), but reuses everything the daemon
+        still has warm from earlier requests.
+        """
+        import json
+        
+        try:
+            address = daemon_address(connect)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--connect")
+        
+        def request(method, path, body=None, output=None):
+            try:
+                return request_daemon(address, method, path, body, output=output)
+            except ConnectionAbortedError as e:
+                raise click.ClickException(str(e))
+            except OSError as e:
+                raise click.ClickException(
+                    f"No CodeSqueeze daemon on {format_address(address)} ({e}). Start one with `serve`."
+                )
+        
+        if status or shutdown:
+            _, _, body = request("POST", "/shutdown", {}) if shutdown else request("GET", "/status")
+            click.echo(json.dumps(json.loads(body), indent=2))
+            return
+        if directory is None:
+            raise click.UsageError("Missing argument 'PROJECT_DIR'.")
+        
+        base_dir = os.path.abspath(directory)
+        absolute = lambda paths: [os.path.abspath(os.path.join(base_dir, path)) for path in paths]
+        options = dict(
+            additional_extensions=list(extra_extensions),
+            ignored_files=absolute(ignore),
+            ignored_directories=CodebaseProcessor.resolve_ignored_directories(base_dir, ignore_directory),
+            additional_files=absolute(add_files),
+            use_ignore_files=not no_gitignore,
+            max_tokens=max_tokens,
+            skeletons=not no_skeleton,
+            minify=minify,
+            dedupe=not no_dedupe,
+            use_git_index=use_git_index,
+            tree_max_entries=tree_max_entries,
+            tree_selected_only=tree_selected_only,
+            sniff_shebangs=sniff_shebangs,
+            cache_friendly=cache_friendly,
+            max_file_size=max_file_size * 1024,
+            truncate_large=truncate_large,
+            skip_generated=not include_generated,
+        )
+        # The output is streamed straight from the socket into its destination
+        try:
+            with contextlib.ExitStack() as stack:
+                output_file = sys.stdout.buffer if output == "-" else stack.enter_context(open(output, "wb"))
+                code, headers, body = request("POST", "/squeeze", {"directory": base_dir, "options": options},
+                                            output=output_file)
+                output_file.flush()
+            if code != 200:
+                raise click.ClickException(json.loads(body).get("error", f"HTTP {code}"))
+        except click.ClickException:
+            if output != "-":
+                with contextlib.suppress(OSError):
+                    os.remove(output)
+            raise
+        
+        if not quiet:
+            header = lambda name: headers.get(f"X-CodeSqueeze-{name}", "?")
+            click.echo(click.style(
+                f"✓ {header('Files')} files, {int(header('Tokens')):,} tokens in "
+                f"{float(header('Seconds')) * 1000:.0f} ms ({header('Walk')} walk)", fg='green',
+            ), err=True)
+    
+    cli = SqueezeGroup(
+        commands=[squeeze, serve, client],
+        context_settings=dict(help_option_names=["-h", "--help"]),
+    )
+    
+    def run_batch_command(manifest, output_dir, workers, report_path, quiet, options,
+                        no_cache, rebuild_cache, cache_verify, cache_size, tokenizer_vocab):
+        """Run --batch: squeeze every project of the manifest and print a summary."""
+        import sqlite3
+        
+        echo = (lambda *args, **kwargs: None) if quiet else click.echo
+        try:
+            directories = read_manifest(manifest)
+        except (OSError, UnicodeDecodeError) as e:
+            raise click.BadParameter(str(e), param_hint="--batch")
+        if not directories:
+            raise click.BadParameter("the manifest lists no project directories", param_hint="--batch")
+        
+        if tokenizer_vocab:
+            # Fail once up front rather than once per project
+            try:
+                BPETokenizer.from_file(tokenizer_vocab)
+            except (OSError, ValueError) as e:
+                raise click.BadParameter(str(e), param_hint="--tokenizer-vocab")
+        
+        cache_options = None
+        if not no_cache:
+            cache_options = dict(max_bytes=cache_size * 1024 * 1024, verify_hash=cache_verify)
+            if rebuild_cache:
+                # Wipe it once here; the workers then share the fresh cache
+                try:
+                    ChunkCache(rebuild=True, **cache_options).close()
+                except (OSError, sqlite3.Error) as e:
+                    click.echo(click.style(f"⚠️  Chunk cache disabled: {e}", fg='yellow'), err=True)
+                    cache_options = None
+        
+        workers = min(workers, len(directories))
+        echo(click.style(f"📦 Squeezing {len(directories)} projects on {workers} worker"
+                        f"{'s' if workers != 1 else ''}...", fg='cyan', bold=True))
+        
+        started = time.perf_counter()
+        results = {}
+        for result in run_batch(directories, output_dir, workers, options, cache_options, tokenizer_vocab):
+            results[result.directory] = result
+            progress = f"[{len(results)}/{len(directories)}]"
+            if result.error is None:
+                echo(f"  {progress} ✓ {result.directory} ({result.seconds:.1f} s)")
+            else:
+                click.echo(click.style(f"  {progress} ✗ {result.directory}: {result.error}", fg='red'), err=True)
+        elapsed = time.perf_counter() - started
+        
+        # Summary in manifest order
+        ordered = [results[directory] for directory in directories]
+        failed = [result for result in ordered if result.error is not None]
+        width = max(len("Project"), *(len(result.directory) for result in ordered))
+        echo("\n" + click.style("📊 Batch summary:", fg='cyan', bold=True))
+        echo(f"  {'Project':<{width}}  {'Status':<6}  {'Files':>6}  {'Size':>10}  {'Tokens':>11}  {'Time':>8}")
+        for result in ordered:
+            status = "ok" if result.error is None else "failed"
+            echo(f"  {result.directory:<{width}}  {status:<6}  {result.files:>6,}  "
+                f"{result.size_bytes / 1024:>7,.0f} KB  {result.tokens:>11,}  {result.seconds:>6.1f} s")
+        summary_color = 'red' if failed else 'green'
+        echo(click.style(
+            f"  {len(ordered) - len(failed)} succeeded, {len(failed)} failed in {elapsed:.1f} s", fg=summary_color
+        ))
+        
+        if report_path:
+            import json
+            
+            with open(report_path, "w", encoding="utf-8") as report_file:
+                json.dump({
+                    "workers": workers,
+                    "seconds": elapsed,
+                    "succeeded": len(ordered) - len(failed),
+                    "failed": len(failed),
+                    "projects": [result._asdict() for result in ordered],
+                }, report_file, indent=2)
+        
+        if failed:
+            click.get_current_context().exit(1)
     
-    if copy:
-        with open(final_file, "r") as file:
-            text = file.read()
-        text = text + "\n\nQuery: [provide your query]"
-        pyperclip.copy(text)
-        click.echo(click.style(f"\n✓ Successfully Copied as prompt!\n", fg='cyan'))
+    return cli
+
+
+def __getattr__(name):
+    """Build the `cli` command lazily on first access."""
+    if name == "cli":
+        return build_cli()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main(args: Optional[List[str]] = None):
+    """Run the command-line interface."""
+    build_cli()(args=args)
+
 
 if __name__ == '__main__':
-    cli()
+    main()
@@ -0,0 +1,377 @@
+"""
+Benchmark every stage of the CodeSqueeze pipeline on synthetic repositories.
+
+Run from the repository root (no network access or extra packages needed):
+
+    python benchmarks/bench.py                      # 1k files, mixed layout
+    python benchmarks/bench.py --size 100k --shape wide
+    python benchmarks/bench.py --size 1k --size 100k --json results.json
+
+Generated repositories are kept in --workdir and reused by later runs with the
+same parameters, so only the first run pays for generation. Each size runs in
+its own process so the peak RSS figures do not leak between sizes.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CodeSqueeze import ChunkCache, CodebaseProcessor  # noqa: E402
+
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SHAPES = ("mixed", "wide", "deep")
+
+SOURCE_EXTENSIONS = ("py", "js", "ts", "go", "rs", "java", "c", "rb")
+OTHER_EXTENSIONS = ("md", "txt", "csv", "svg")
+IGNORED_DIRECTORIES = ("node_modules", "build", "dist", "target", "vendor", ".cache")
+
+# Generator version: bump when the generated content changes, so stale repos are rebuilt
+GENERATOR_VERSION = 1
+
+
+def synthetic_source(rng: random.Random, extension: str, lines: int) -> str:
+    """Plausible-looking source text (comments, indentation, long and short lines)."""
+    comment = "#" if extension in ("py", "rb") else "//"
+    out = [f"{comment} synthetic {extension} module {rng.randrange(1 << 30):08x}"]
+    for i in range(lines):
+        depth = rng.randrange(4)
+        kind = rng.random()
+        if kind < 0.15:
+            out.append(f"{'    ' * depth}{comment} note {i}: {'lorem ipsum ' * rng.randrange(1, 6)}")
+        elif kind < 0.25:
+            out.append("")
+        else:
+            name = f"value_{rng.randrange(10_000)}"
+            out.append(f"{'    ' * depth}{name} = compute({i}, \"{'x' * rng.randrange(40)}\")\t\t")
+    return "\n".join(out) + "\n"
+
+
+def ignore_rules(rng: random.Random, count: int) -> str:
+    """A .gitignore mixing literal names, globs, anchored paths and negations."""
+    rules = ["# generated ignore rules"]
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            rules.append(f"*.tmp{i}")
+        elif kind == 1:
+            rules.append(f"/generated_{i}/")
+        elif kind == 2:
+            rules.append(f"**/cache_{i}/**")
+        elif kind == 3:
+            rules.append(f"secret_{i}.txt")
+        else:
+            rules.append(f"!keep_{i}.{rng.choice(SOURCE_EXTENSIONS)}")
+    return "\n".join(rules) + "\n"
+
+
+def directory_layout(rng: random.Random, file_count: int, shape: str) -> list:
+    """Relative directories to spread `file_count` files over."""
+    if shape == "wide":
+        # A handful of huge, flat directories
+        return [f"pkg_{i:03d}" for i in range(max(1, file_count // 2_000))] or ["pkg_000"]
+    if shape == "deep":
+        # Long chains of single-child directories
+        directories = []
+        for chain in range(max(1, file_count // 400)):
+            path = f"deep_{chain:04d}"
+            for level in range(rng.randrange(20, 60)):
+                path = f"{path}/level_{level:02d}"
+                directories.append(path)
+        return directories
+    # mixed: a balanced tree about 4 levels deep, ~40 files per directory
+    directories = []
+    for i in range(max(1, file_count // 40)):
+        parts = [f"d{rng.randrange(12)}" for _ in range(rng.randrange(1, 5))]
+        directories.append("/".join(["src"] + parts + [f"m{i}"]))
+    return directories
+
+
+def generate_repository(root: str, file_count: int, shape: str, seed: int,
+                        large_files: int, binary_ratio: float, rule_count: int) -> dict:
+    """
+    Write a synthetic repository under `root`.
+
+    Returns:
+        Summary of what was generated (files, bytes, ignored files)
+    """
+    rng = random.Random(seed)
+    directories = directory_layout(rng, file_count, shape)
+    summary = {"files": 0, "bytes": 0, "binary": 0, "large": 0, "ignored": 0}
+
+    def write(relative_path: str, data: bytes) -> None:
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as handle:
+            handle.write(data)
+        summary["files"] += 1
+        summary["bytes"] += len(data)
+
+    write(".gitignore", ignore_rules(rng, rule_count).encode())
+    for directory in rng.sample(directories, min(len(directories), 20)):
+        write(f"{directory}/.gitignore", ignore_rules(rng, max(1, rule_count // 10)).encode())
+
+    # ~5% of the files live in directories that are ignored by default
+    ignored_count = file_count // 20
+    for i in range(ignored_count):
+        directory = rng.choice(directories)
+        write(f"{directory}/{rng.choice(IGNORED_DIRECTORIES)}/dep_{i}.js",
+              synthetic_source(rng, "js", rng.randrange(5, 40)).encode())
+    summary["ignored"] = ignored_count
+
+    for i in range(file_count - summary["files"]):
+        directory = rng.choice(directories)
+        roll = rng.random()
+        if roll < binary_ratio:
+            # Binary assets, half of them disguised with a source extension
+            extension = "png" if i % 2 else rng.choice(SOURCE_EXTENSIONS)
+            write(f"{directory}/asset_{i}.{extension}", rng.randbytes(rng.randrange(256, 16_384)))
+            summary["binary"] += 1
+        elif roll < binary_ratio + 0.1:
+            extension = rng.choice(OTHER_EXTENSIONS)
+            write(f"{directory}/doc_{i}.{extension}", synthetic_source(rng, extension, rng.randrange(5, 60)).encode())
+        else:
+            extension = rng.choice(SOURCE_EXTENSIONS)
+            lines = int(rng.lognormvariate(3.5, 1.0)) + 1
+            write(f"{directory}/file_{i}.{extension}", synthetic_source(rng, extension, lines).encode())
+
+    for i in range(large_files):
+        extension = rng.choice(SOURCE_EXTENSIONS)
+        write(f"{rng.choice(directories)}/large_{i}.{extension}",
+              synthetic_source(rng, extension, rng.randrange(20_000, 60_000)).encode())
+        summary["large"] += 1
+
+    return summary
+
+
+def ensure_repository(args: argparse.Namespace, file_count: int) -> tuple:
+    """Generate the repository for `file_count` files, or reuse an identical earlier one."""
+    params = {
+        "version": GENERATOR_VERSION, "files": file_count, "shape": args.shape, "seed": args.seed,
+        "large_files": args.large_files, "binary_ratio": args.binary_ratio, "rules": args.rules,
+    }
+    name = f"repo-{file_count}-{args.shape}-s{args.seed}"
+    root = os.path.join(args.workdir, name)
+    marker = os.path.join(args.workdir, f"{name}.json")
+
+    if os.path.exists(marker):
+        with open(marker) as handle:
+            stored = json.load(handle)
+        if stored["params"] == params:
+            return root, stored["summary"], 0.0
+
+    shutil.rmtree(root, ignore_errors=True)
+    started = time.perf_counter()
+    summary = generate_repository(root, file_count, args.shape, args.seed,
+                                  args.large_files, args.binary_ratio, args.rules)
+    elapsed = time.perf_counter() - started
+    with open(marker, "w") as handle:
+        json.dump({"params": params, "summary": summary}, handle)
+    return root, summary, elapsed
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def total_size(paths: list) -> int:
+    size = 0
+    for path in paths:
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+
+def run_benchmark(args: argparse.Namespace, file_count: int) -> dict:
+    """Time every stage on one synthetic repository."""
+    root, summary, generation_time = ensure_repository(args, file_count)
+    processor = CodebaseProcessor(root, output_file=os.path.join(args.workdir, "bench_output.txt"),
+                                  jobs=args.jobs, quiet=True)
+    results = []
+
+    def stage(name: str, function, files_of=None, bytes_of=None):
+        started = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - started
+        files = files_of(value) if files_of else 0
+        size = bytes_of(value) if bytes_of else 0
+        results.append({
+            "stage": name,
+            "seconds": elapsed,
+            "files": files,
+            "bytes": size,
+            "files_per_s": files / elapsed if elapsed and files else 0.0,
+            "mb_per_s": size / (1024 * 1024) / elapsed if elapsed and size else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        return value
+
+    stage("generate_directory_tree", lambda: processor.generate_directory_tree(root))
+    all_files = stage("discover_all_files", processor.discover_all_files, files_of=len)
+    all_bytes = total_size(all_files)
+    results[-1]["bytes"] = all_bytes
+    candidates = stage("filter_files_by_extension",
+                       lambda: processor.filter_files_by_extension(all_files), files_of=len)
+    ignored_dirs = [os.path.join(root, name) for name in IGNORED_DIRECTORIES]
+    stage("remove_files_from_ignored_directories",
+          lambda: processor.remove_files_from_ignored_directories(candidates, ignored_dirs), files_of=len)
+    stage("scan_project (tree + files, one walk)", processor.scan_project,
+          files_of=lambda value: len(value[1]))
+    _, source_files = stage("collect source files (walk + all filters)", processor._collect_source_files,
+                            files_of=lambda value: len(value[1]))
+    source_bytes = total_size(source_files)
+
+    def process_source_files():
+        processor._start_output("")
+        return sum(len(chunk.chunk) for chunk in processor._iter_output_chunks(source_files))
+
+    stage(f"process source files (read + compress, jobs={args.jobs})", process_source_files,
+          files_of=lambda _: len(source_files), bytes_of=lambda _: source_bytes)
+
+    if args.cache:
+        cache_dir = tempfile.mkdtemp(prefix="codesqueeze-bench-cache-")
+        try:
+            processor.cache = ChunkCache(cache_dir)
+            stage("process source files (cold cache)", process_source_files,
+                  files_of=lambda _: len(source_files), bytes_of=lambda _: source_bytes)
+            stage("process source files (warm cache)", process_source_files,
+                  files_of=lambda _: len(source_files), bytes_of=lambda _: source_bytes)
+            processor.cache.close()
+        finally:
+            processor.cache = None
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # compress_file_content rewrites files in place, so work on a scratch copy
+    sample = random.Random(args.seed).sample(source_files, min(len(source_files), args.compress_sample))
+    scratch = tempfile.mkdtemp(prefix="codesqueeze-bench-compress-")
+    try:
+        copies = []
+        for i, path in enumerate(sample):
+            copy = os.path.join(scratch, f"{i}_{os.path.basename(path)}")
+            shutil.copyfile(path, copy)
+            copies.append(copy)
+        copy_bytes = total_size(copies)
+
+        def compress_all():
+            # Undecodable (binary) files are reported and exit; count them as skipped
+            with contextlib.redirect_stderr(io.StringIO()):
+                for path in copies:
+                    try:
+                        processor.compress_file_content(path)
+                    except SystemExit:
+                        pass
+            return copies
+
+        stage("compress_file_content", compress_all, files_of=len, bytes_of=lambda _: copy_bytes)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    stage("process() end to end", processor.process,
+          files_of=lambda value: len(value[1]), bytes_of=lambda _: source_bytes)
+
+    return {
+        "size": file_count,
+        "shape": args.shape,
+        "repository": root,
+        "generated": summary,
+        "generation_seconds": generation_time,
+        "total_bytes": all_bytes,
+        "stages": results,
+    }
+
+
+def print_report(report: dict) -> None:
+    generated = report["generated"]
+    print(f"\n{report['size']:,} files ({report['shape']}), {report['total_bytes'] / (1024 * 1024):,.1f} MB "
+          f"({generated['binary']:,} binary, {generated['large']} large, {generated['ignored']:,} in ignored dirs)")
+    if report["generation_seconds"]:
+        print(f"generated in {report['generation_seconds']:.1f}s at {report['repository']}")
+    print(f"{'stage':<58} {'time':>9} {'files':>10} {'files/s':>11} {'MB/s':>9} {'peak RSS':>10}")
+    print("-" * 112)
+    for result in report["stages"]:
+        files = f"{result['files']:,}" if result["files"] else ""
+        rate = f"{result['files_per_s']:,.0f}" if result["files_per_s"] else ""
+        throughput = f"{result['mb_per_s']:,.1f}" if result["mb_per_s"] else ""
+        print(f"{result['stage']:<58} {result['seconds']:>8.3f}s {files:>10} {rate:>11} "
+              f"{throughput:>9} {result['peak_rss_mb']:>7.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", action="append", choices=sorted(SIZES),
+                        help="Repository size (repeatable, default: 1k).")
+    parser.add_argument("--files", type=int, help="Exact number of files (overrides --size).")
+    parser.add_argument("--shape", choices=SHAPES, default="mixed", help="Directory layout (default: mixed).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generator.")
+    parser.add_argument("--large-files", type=int, default=5, help="Number of multi-MB source files.")
+    parser.add_argument("--binary-ratio", type=float, default=0.05, help="Fraction of binary files.")
+    parser.add_argument("--rules", type=int, default=200, help="Number of rules in the root .gitignore.")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker threads for reading files.")
+    parser.add_argument("--cache", action="store_true", help="Also time cold and warm chunk-cache runs.")
+    parser.add_argument("--compress-sample", type=int, default=2_000,
+                        help="Files to run compress_file_content on.")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "codesqueeze-bench"),
+                        help="Where generated repositories are kept between runs.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON.")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    counts = [args.files] if args.files else [SIZES[size] for size in (args.size or ["1k"])]
+
+    if len(counts) == 1:
+        reports = [run_benchmark(args, counts[0])]
+        print_report(reports[0])
+    else:
+        # One process per size keeps peak RSS honest
+        reports = []
+        for count in counts:
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+                result_path = handle.name
+            child = [arg for arg in sys.argv[1:]]
+            command = [sys.executable, os.path.abspath(__file__), *strip_size_args(child),
+                       "--files", str(count), "--json", result_path]
+            subprocess.run(command, check=True)
+            with open(result_path) as handle:
+                reports.extend(json.load(handle))
+            os.unlink(result_path)
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(reports, handle, indent=2)
+
+
+def strip_size_args(argv: list) -> list:
+    """Drop --size/--files/--json from an argument list (the parent passes its own)."""
+    stripped = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in ("--size", "--files", "--json"):
+            skip = True
+            continue
+        if arg.startswith(("--size=", "--files=", "--json=")):
+            continue
+        stripped.append(arg)
+    return stripped
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# CodeSqueeze is a single module at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep the persistent caches of every test in its own directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def make_project(tmp_path):
+    """Create a project from a {relative path: content} mapping and return its root."""
+    def make(files, root="project"):
+        base = tmp_path / root
+        for relative_path, content in files.items():
+            path = base / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, bytes):
+                path.write_bytes(content)
+            else:
+                path.write_text(content, encoding="utf-8")
+        base.mkdir(exist_ok=True)
+        return base
+    return make
@@ -0,0 +1,88 @@
+import itertools
+import random
+
+import pytest
+
+from CodeSqueeze import knapsack_select, multiple_choice_knapsack
+
+
+def instances(count, size, max_weight):
+    rng = random.Random(2024)
+    for _ in range(count):
+        weights = [rng.randint(0, max_weight) for _ in range(size)]
+        values = [round(rng.uniform(0, 10), 3) for _ in range(size)]
+        capacity = rng.randint(0, sum(weights))
+        yield weights, values, capacity
+
+
+def best_subset_value(weights, values, capacity):
+    best = 0.0
+    for mask in itertools.product((0, 1), repeat=len(weights)):
+        if sum(w for w, take in zip(weights, mask) if take) <= capacity:
+            best = max(best, sum(v for v, take in zip(values, mask) if take))
+    return best
+
+
+@pytest.mark.parametrize("weights, values, capacity", list(instances(60, 10, 40)))
+def test_knapsack_select_is_optimal(weights, values, capacity):
+    chosen = knapsack_select(weights, values, capacity)
+    assert chosen == sorted(set(chosen))
+    assert sum(weights[i] for i in chosen) <= capacity
+    assert sum(values[i] for i in chosen) == pytest.approx(best_subset_value(weights, values, capacity))
+
+
+@pytest.mark.parametrize("weights, values, capacity", list(instances(20, 10, 5000)))
+def test_knapsack_select_scaled_weights_never_overflow(weights, values, capacity):
+    # With fewer buckets than the capacity, weights are rounded up: the result
+    # may miss the optimum but must still fit
+    chosen = knapsack_select(weights, values, capacity, resolution=16)
+    assert sum(weights[i] for i in chosen) <= capacity
+
+
+def test_knapsack_select_edge_cases():
+    assert knapsack_select([3, 4], [1.0, 1.0], 10) == [0, 1]
+    assert knapsack_select([0, 2, 0], [1.0, 1.0, 1.0], 0) == [0, 2]
+    assert knapsack_select([11], [5.0], 10) == []
+
+
+def group_instances(count, size, max_weight):
+    rng = random.Random(7)
+    for _ in range(count):
+        groups = []
+        for _ in range(size):
+            # A full rendering and a cheaper, less valuable skeleton
+            full_weight, full_value = rng.randint(1, max_weight), round(rng.uniform(1, 10), 3)
+            skeleton = (rng.randint(0, full_weight), round(full_value * rng.uniform(0, 1), 3))
+            groups.append([(full_weight, full_value), skeleton][:rng.randint(1, 2)])
+        capacity = rng.randint(0, sum(group[0][0] for group in groups))
+        yield groups, capacity
+
+
+def best_choice_value(groups, capacity):
+    best = 0.0
+    for picks in itertools.product(*[[None, *range(len(group))] for group in groups]):
+        options = [group[k] for group, k in zip(groups, picks) if k is not None]
+        if sum(weight for weight, _ in options) <= capacity:
+            best = max(best, sum(value for _, value in options))
+    return best
+
+
+@pytest.mark.parametrize("groups, capacity", list(group_instances(60, 7, 30)))
+def test_multiple_choice_knapsack_is_optimal(groups, capacity):
+    chosen = multiple_choice_knapsack(groups, capacity)
+    assert len(chosen) == len(groups)
+    options = [group[k] for group, k in zip(groups, chosen) if k is not None]
+    assert sum(weight for weight, _ in options) <= capacity
+    assert sum(value for _, value in options) == pytest.approx(best_choice_value(groups, capacity))
+
+
+@pytest.mark.parametrize("groups, capacity", list(group_instances(20, 7, 5000)))
+def test_multiple_choice_knapsack_scaled_weights_never_overflow(groups, capacity):
+    chosen = multiple_choice_knapsack(groups, capacity, resolution=16)
+    assert sum(group[k][0] for group, k in zip(groups, chosen) if k is not None) <= capacity
+
+
+def test_multiple_choice_knapsack_edge_cases():
+    assert multiple_choice_knapsack([[(5, 3.0), (1, 1.0)], [(5, 3.0)]], 6) == [1, 0]
+    assert multiple_choice_knapsack([[(5, 3.0), (0, 1.0)], [(2, 1.0)]], 0) == [1, None]
+    assert multiple_choice_knapsack([], 10) == []
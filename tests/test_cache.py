@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from CodeSqueeze import ChunkCache, CodebaseProcessor, FileClassifier, MemoryChunkCache, SourceChunk
+
+GENERATED = "// Code generated by stringer. DO NOT EDIT.\npackage colors\n\nconst Red = 1\n"
+
+
+def squeeze(project, cache, **options):
+    processor = CodebaseProcessor(
+        str(project), output_file=str(project.parent / "out.txt"), cache=cache, quiet=True, **options
+    )
+    processor.create_consolidated_file()
+    processed = sorted(os.path.relpath(path, project) for path in processor.processed_files)
+    return processed, dict(processor.skipped_files)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ChunkCache(cache_dir=str(tmp_path / "chunks"))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def project(make_project):
+    return make_project({"main.go": "package main\n\nfunc main() {}\n", "colors_string.go": GENERATED})
+
+
+def test_forced_file_does_not_leak_into_later_runs(project, cache):
+    forced = [str(project / "colors_string.go")]
+    assert squeeze(project, cache, additional_files=forced)[0] == ["colors_string.go", "main.go"]
+    processed, skipped = squeeze(project, cache)
+    assert processed == ["main.go"]
+    assert skipped == {"colors_string.go": "generated code (marker comment)"}
+    assert squeeze(project, cache, additional_files=forced)[0] == ["colors_string.go", "main.go"]
+
+
+def test_forced_file_keeps_its_full_content_after_a_truncating_run(make_project, cache):
+    project = make_project({"big.py": "".join(f"value_{i} = {i}\n" for i in range(2000))})
+    classifier = FileClassifier(max_file_size=1024, truncate_large=True)
+    squeeze(project, cache, classifier=classifier)
+    truncated = (project.parent / "out.txt").read_text()
+    squeeze(project, cache, classifier=classifier, additional_files=[str(project / "big.py")])
+    full = (project.parent / "out.txt").read_text()
+    assert "value_1999" not in truncated and "value_1999" in full
+
+
+def test_settings_and_edits_invalidate_cached_chunks(project, cache):
+    squeeze(project, cache)
+    squeeze(project, cache)
+    assert cache.hits == 1 and cache.misses == 1
+    
+    squeeze(project, cache, minify=True)
+    assert cache.misses == 2
+    
+    main = project / "main.go"
+    main.write_text("package main\n\nfunc main() { println(1) }\n")
+    os.utime(main, ns=(main.stat().st_atime_ns, main.stat().st_mtime_ns + 10**9))
+    squeeze(project, cache)
+    assert "println(1)" in (project.parent / "out.txt").read_text()
+    assert cache.misses == 3
+
+
+def test_nbytes_is_the_encoded_length(tmp_path, cache):
+    path = tmp_path / "u.py"
+    path.write_text("x = 'héllo wörld'\n", encoding="utf-8")
+    chunk = "x = 'héllo wörld'"
+    cache.store(str(path), "v", path.stat(), SourceChunk(str(path), "u.py", chunk=chunk, tokens=5))
+    cache.flush()
+    stored = cache._db.execute("SELECT nbytes FROM chunks").fetchone()[0]
+    assert stored == len(chunk.encode("utf-8")) > len(chunk)
+
+
+def test_memory_cache_is_bounded_by_encoded_bytes(tmp_path):
+    path = tmp_path / "u.py"
+    path.write_text("")
+    memory = MemoryChunkCache(max_bytes=45)
+    for i in range(3):
+        memory.store(str(path), f"v{i}", path.stat(), SourceChunk(str(path), "u.py", chunk="é" * 10, tokens=1))
+    assert memory.size_bytes == 40
+    assert memory.lookup(str(path), "v0", path.stat()) is None
+    assert memory.lookup(str(path), "v2", path.stat())[0] == "é" * 10
@@ -0,0 +1,53 @@
+import pytest
+
+from CodeSqueeze import FileClassifier
+
+
+def reason(file_name, text):
+    data = text.encode()
+    return FileClassifier().skip_reason(file_name, len(data), data)
+
+
+@pytest.mark.parametrize("file_name, text", [
+    ("api.pb.gw.go", "// Code generated by protoc-gen-grpc-gateway. DO NOT EDIT.\n\npackage api\n"),
+    ("schema.go", "// Copyright 2024 Example\n\n// Code generated by ent, DO NOT EDIT.\n\npackage ent\n"),
+    ("Schema.java", "/*\n * Licensed under MIT.\n *\n * @generated by codegen\n */\npackage a;\n"),
+    ("types.ts", "/* @generated */\nexport type A = string;\n"),
+    ("messages.py", "# -*- coding: utf-8 -*-\n# Generated by the protocol buffer compiler.  DO NOT EDIT!\n"
+                    "# source: messages.proto\nimport sys\n"),
+])
+def test_generator_headers_are_skipped(file_name, text):
+    assert reason(file_name, text) == "generated code (marker comment)"
+
+
+@pytest.mark.parametrize("file_name, text", [
+    # Hand-written code that talks about generated code
+    ("models.py", '"""Models; the SQL schema is auto-generated from these, do not edit it by hand."""\n'
+                  "class User:\n    pass\n"),
+    ("models.py", "# These classes are auto-generated in spirit. Do not edit without review.\nclass User:\n    pass\n"),
+    ("gen.go", "package gen\n\n// Code generated by hand. DO NOT EDIT.\nfunc F() {}\n"),
+    ("writer.go", "package gen\n\nconst header = \"// Code generated by tool. DO NOT EDIT.\"\n"),
+    ("codegen.py", "import re\n\nMARKER = '@generated'\n"),
+    ("notes.go", "// Code generated by people, edit freely.\npackage notes\n"),
+])
+def test_prose_about_generated_code_is_not_skipped(file_name, text):
+    assert reason(file_name, text) is None
+
+
+def test_header_comment_stops_at_first_code_line():
+    sample = b"#!/usr/bin/env python\n\n# one\n/* two\n   three */\nx = 1\n# four\n"
+    assert FileClassifier.header_comment(sample) == b"#!/usr/bin/env python\n# one\n/* two\nthree */"
+
+
+def test_include_generated_keeps_marked_files():
+    data = b"// Code generated by stringer. DO NOT EDIT.\npackage a\n"
+    assert FileClassifier(skip_generated=False).skip_reason("a.go", len(data), data) is None
+
+
+@pytest.mark.parametrize("file_name, data, expected", [
+    ("Cargo.lock", b"[[package]]\n", "lockfile"),
+    ("app.min.js", b"var a=1;", "generated or minified (by name)"),
+    ("logo.png", b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR", "binary (NUL bytes)"),
+])
+def test_name_and_content_checks(file_name, data, expected):
+    assert FileClassifier().skip_reason(file_name, len(data), data) == expected
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from CodeSqueeze import build_cli
+
+
+@pytest.fixture
+def project_named_like_subcommands(tmp_path, monkeypatch):
+    for name in ("serve", "client"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}_app.py").write_text("print('hi')\n")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_subcommand_names_always_dispatch(project_named_like_subcommands):
+    result = CliRunner().invoke(build_cli(), ["client", "--help"], prog_name="codesqueeze")
+    assert result.exit_code == 0, result.output
+    assert "Usage: codesqueeze client" in result.output
+
+
+@pytest.mark.parametrize("args", [["./serve"], ["squeeze", "serve"]])
+def test_directory_named_like_a_subcommand_needs_a_path_or_explicit_squeeze(project_named_like_subcommands, args):
+    result = CliRunner().invoke(build_cli(), [*args, "--no-cache", "-q", "-o", "out.txt"])
+    assert result.exit_code == 0, result.output
+    assert "serve_app.py" in (project_named_like_subcommands / "out.txt").read_text(encoding="utf-8")
+
+
+def test_project_directory_and_options_default_to_squeeze(project_named_like_subcommands):
+    result = CliRunner().invoke(build_cli(), ["--no-cache", "-q", "-o", "out.txt", "client"])
+    assert result.exit_code == 0, result.output
+    assert "client_app.py" in (project_named_like_subcommands / "out.txt").read_text(encoding="utf-8")
+    
+    help_result = CliRunner().invoke(build_cli(), ["--help"])
+    assert help_result.exit_code == 0 and "PROJECT_DIR" in help_result.output
+
+
+def test_batch_manifest_duplicates_are_squeezed_once(make_project, tmp_path, capsys):
+    from CodeSqueeze import read_manifest
+    
+    make_project({"api/app.py": "x = 1\n", "web/app.py": "x = 2\n"}, root="projects")
+    manifest = tmp_path / "projects" / "manifest.txt"
+    manifest.write_text("api\nweb\n# comment\n./api\napi/\n")
+    
+    directories = read_manifest(str(manifest))
+    assert [os.path.basename(path) for path in directories] == ["api", "web"]
+    assert capsys.readouterr().err.count("already listed on line 1") == 2
+    
+    result = CliRunner().invoke(build_cli(), ["--batch", str(manifest), "--no-cache", "--workers", "2"])
+    assert result.exit_code == 0, result.output
+    assert "[2/2]" in result.output and "[3/" not in result.output
@@ -0,0 +1,48 @@
+import sys
+
+import pytest
+
+from CodeSqueeze import ClipboardStream
+
+
+@pytest.fixture
+def fake_clip(tmp_path):
+    """An executable named `clip` that saves its stdin to received.bin."""
+    script = tmp_path / "clip"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"open({str(tmp_path / 'received.bin')!r}, 'wb').write(sys.stdin.buffer.read())\n"
+    )
+    script.chmod(0o755)
+    return script, tmp_path / "received.bin"
+
+
+def test_windows_uses_clip(monkeypatch):
+    monkeypatch.setattr(sys, "platform", "win32")
+    assert ClipboardStream.candidate_commands() == [["clip"]]
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="runs a POSIX script as the fake tool")
+def test_clip_is_fed_utf16_with_a_bom(fake_clip):
+    script, received = fake_clip
+    data = "naïve → 東京\n".encode("utf-8")
+    stream = ClipboardStream([str(script)])
+    # Split inside multi-byte sequences
+    for i in range(len(data)):
+        stream.write(data[i:i + 1])
+    stream.close()
+    assert stream.byte_count == len(data)
+    assert received.read_bytes() == b"\xff\xfe" + "naïve → 東京\n".encode("utf-16-le")
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="runs a POSIX script as the fake tool")
+def test_other_tools_get_utf8_unchanged(fake_clip, tmp_path):
+    script, received = fake_clip
+    other = tmp_path / "xsel"
+    other.write_text(script.read_text())
+    other.chmod(0o755)
+    stream = ClipboardStream([str(other)])
+    stream.write("é".encode("utf-8"))
+    stream.close()
+    assert received.read_bytes() == "é".encode("utf-8")
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+import pytest
+
+from CodeSqueeze import SqueezeServer, request_daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__("socket"), "AF_UNIX"), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A SqueezeServer on a Unix socket whose watcher only runs when `poll()` is called."""
+    server = SqueezeServer(poll_interval=3600)
+    address = str(tmp_path / "daemon.sock")
+    thread = threading.Thread(target=server.serve_forever, args=(address,), daemon=True)
+    thread.start()
+    for _ in range(200):
+        if os.path.exists(address):
+            break
+        time.sleep(0.01)
+    yield server, address
+    request_daemon(address, "POST", "/shutdown", {})
+    thread.join(5)
+
+
+def squeeze(address, project, tmp_path, **options):
+    output = tmp_path / "out.txt"
+    with open(output, "wb") as output_file:
+        code, headers, body = request_daemon(
+            address, "POST", "/squeeze", {"directory": str(project), "options": options}, output=output_file
+        )
+    assert code == 200, body
+    return output.read_text(encoding="utf-8"), headers
+
+
+def touch_later(path):
+    """Bump a path's mtime so the change is visible even on coarse-grained filesystems."""
+    stat_info = os.stat(path)
+    os.utime(path, ns=(stat_info.st_atime_ns, stat_info.st_mtime_ns + 2 * 10**9))
+
+
+def test_edit_then_rerequest(daemon, make_project, tmp_path):
+    server, address = daemon
+    project = make_project({"app.py": "x = 1\n", "pkg/mod.py": "y = 2\n"})
+    
+    text, headers = squeeze(address, project, tmp_path)
+    assert "x = 1" in text and "y = 2" in text
+    assert headers["X-CodeSqueeze-Walk"] == "cold"
+    assert int(headers["X-CodeSqueeze-Bytes"]) == len(text.encode("utf-8"))
+    assert int(headers["X-CodeSqueeze-Files"]) == 2
+    
+    # Nothing changed: the walk is reused and every chunk comes from memory
+    hits = server.cache.hits
+    assert server.poll() == 0
+    again, headers = squeeze(address, project, tmp_path)
+    assert again == text
+    assert headers["X-CodeSqueeze-Walk"] == "warm"
+    assert server.cache.hits == hits + 2
+    
+    # Edited content: the walk stays warm, the chunk is revalidated by stat
+    (project / "app.py").write_text("x = 'edited'\n")
+    touch_later(project / "app.py")
+    assert server.poll() == 0
+    edited, headers = squeeze(address, project, tmp_path)
+    assert "x = 'edited'" in edited and "x = 1" not in edited
+    assert headers["X-CodeSqueeze-Walk"] == "warm"
+    
+    # A new file changes the directory: the watcher drops the warm walk
+    (project / "pkg" / "new.py").write_text("z = 3\n")
+    touch_later(project / "pkg")
+    assert server.poll() == 1
+    added, headers = squeeze(address, project, tmp_path)
+    assert "z = 3" in added and headers["X-CodeSqueeze-Walk"] == "cold"
+    assert int(headers["X-CodeSqueeze-Files"]) == 3
+    
+    # So does a new ignore rule
+    (project / ".gitignore").write_text("pkg/\n")
+    assert server.poll() == 1
+    ignored, _ = squeeze(address, project, tmp_path)
+    assert "y = 2" not in ignored and "x = 'edited'" in ignored
+
+
+def test_output_is_streamed_in_pieces(make_project):
+    project = make_project({f"mod_{i}.py": f"value = {i}\n" for i in range(5)})
+    pieces = []
+    summary = SqueezeServer().squeeze(str(project), pieces.append)
+    assert len(pieces) == 6  # the header, then one piece per file
+    assert summary["bytes"] == sum(map(len, pieces))
+
+
+def test_bad_request_gets_an_error_status(daemon, tmp_path):
+    _, address = daemon
+    code, _, body = request_daemon(address, "POST", "/squeeze", {"directory": str(tmp_path / "missing")})
+    assert code == 400 and b"Not a directory" in body
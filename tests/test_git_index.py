@@ -0,0 +1,92 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from CodeSqueeze import CodebaseProcessor, GitIndex
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+FILES = [
+    "README.md", "setup.py",
+    # Shared prefixes exercise v4 path compression, in both directions
+    "src/pkg/__init__.py", "src/pkg/module.py", "src/pkg/module_test.py",
+    "src/pkg/sub/deep/leaf.py", "src/pkga.py", "src/z.py",
+    "docs/naïve café.md", "a" * 120 + "/" + "b" * 120 + ".py",
+]
+
+
+def git(root, *args):
+    return subprocess.run(["git", "-C", str(root), *args], check=True,
+                        capture_output=True).stdout
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    git(root, "init", "-q")
+    for path in FILES:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(f"# {path}\n", encoding="utf-8")
+    os.chmod(root / "setup.py", 0o755)
+    if hasattr(os, "symlink"):
+        os.symlink("README.md", root / "link.md")
+    git(root, "add", "-A")
+    # Intent-to-add and skip-worktree need the extended flags of v3+
+    (root / "later.py").write_text("x = 1\n")
+    git(root, "add", "-N", "later.py")
+    return root
+
+
+def ls_files(root):
+    """(path, mode, stage) of every index entry, as git reports them."""
+    entries = []
+    for record in git(root, "ls-files", "--stage", "-z").split(b"\0"):
+        if record:
+            info, path = record.split(b"\t", 1)
+            mode, _, stage = info.split(b" ")
+            entries.append((os.fsdecode(path), int(mode, 8), int(stage)))
+    return entries
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_entries_match_git_ls_files(repo, version):
+    if version == 2:
+        # v2 cannot store intent-to-add entries
+        git(repo, "rm", "-q", "--cached", "later.py")
+    git(repo, "update-index", "--index-version", str(version))
+    with open(repo / ".git" / "index", "rb") as index_file:
+        assert int.from_bytes(index_file.read(8)[4:], "big") == version
+    
+    index = GitIndex.load(str(repo / "src"))
+    assert index.worktree == str(repo)
+    assert [(entry.path, entry.mode, entry.stage) for entry in index.entries] == ls_files(repo)
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_skip_worktree_entries_are_not_tracked_paths(repo, version):
+    git(repo, "update-index", "--skip-worktree", "src/pkg/module.py")
+    git(repo, "update-index", "--index-version", str(version))
+    
+    index = GitIndex.load(str(repo))
+    skipped = [entry.path for entry in index.entries if entry.skip_worktree]
+    assert skipped == ["src/pkg/module.py"]
+    assert dict(index.tracked_paths("src/pkg")) == {
+        "__init__.py": 0o100644, "module_test.py": 0o100644, "sub/deep/leaf.py": 0o100644,
+    }
+
+
+def test_git_mode_lists_the_same_files_as_a_walk(repo):
+    git(repo, "update-index", "--index-version", "4")
+    walked = CodebaseProcessor(str(repo), capture_output=True, quiet=True)
+    indexed = CodebaseProcessor(str(repo), use_git_index=True, capture_output=True, quiet=True)
+    assert indexed.discover_all_files() == walked.discover_all_files()
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError, match="signature"):
+        GitIndex.parse(b"XXXX" + bytes(8))
+    with pytest.raises(ValueError, match="version 5"):
+        GitIndex.parse(b"DIRC" + (5).to_bytes(4, "big") + bytes(4))
@@ -0,0 +1,176 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from CodeSqueeze import CodebaseProcessor, IgnoreMatcher, build_cli
+
+
+def relative_files(processor):
+    return sorted(
+        os.path.relpath(path, processor.source_directory).replace(os.sep, "/")
+        for path in processor.discover_all_files()
+    )
+
+
+@pytest.fixture
+def nested_tests_project(make_project):
+    return make_project({
+        "app.py": "x = 1\n",
+        "tests/test_app.py": "x = 2\n",
+        "src/tests/test_src.py": "x = 3\n",
+        "src/pkg/tests/test_pkg.py": "x = 4\n",
+        "src/pkg/mod.py": "x = 5\n",
+    })
+
+
+@pytest.mark.parametrize("values, expected", [
+    # A bare name matches at any depth, like the built-in ignores
+    (["tests"], ["app.py", "src/pkg/mod.py"]),
+    (["tests/"], ["app.py", "src/pkg/mod.py"]),
+    # A path is anchored at the project root
+    (["./tests"], ["app.py", "src/pkg/mod.py", "src/pkg/tests/test_pkg.py", "src/tests/test_src.py"]),
+    (["src/tests"], ["app.py", "src/pkg/mod.py", "src/pkg/tests/test_pkg.py", "tests/test_app.py"]),
+    (["src/pkg"], ["app.py", "src/tests/test_src.py", "tests/test_app.py"]),
+])
+def test_ignore_dir_depth_semantics(nested_tests_project, values, expected):
+    base_dir = str(nested_tests_project)
+    processor = CodebaseProcessor(
+        base_dir,
+        ignored_directories=CodebaseProcessor.resolve_ignored_directories(base_dir, values),
+        capture_output=True,
+        quiet=True,
+    )
+    assert relative_files(processor) == expected
+
+
+def test_absolute_ignore_dir_names_one_directory(nested_tests_project):
+    processor = CodebaseProcessor(
+        str(nested_tests_project),
+        ignored_directories=[str(nested_tests_project / "src" / "tests")],
+        capture_output=True,
+        quiet=True,
+    )
+    assert "src/tests/test_src.py" not in relative_files(processor)
+    assert "tests/test_app.py" in relative_files(processor)
+
+
+def test_resolve_ignored_directories(tmp_path):
+    base_dir = str(tmp_path)
+    assert CodebaseProcessor.resolve_ignored_directories(base_dir, ["tests", "dist/", "a/b", "./c", "/abs/d"]) == [
+        "tests", "dist", os.path.join(base_dir, "a", "b"), os.path.join(base_dir, "c"), os.path.normpath("/abs/d"),
+    ]
+
+
+def test_cli_ignore_dir_matches_nested_directories(nested_tests_project, tmp_path):
+    from click.testing import CliRunner
+    
+    output = tmp_path / "out.txt"
+    result = CliRunner().invoke(build_cli(), [
+        str(nested_tests_project), "--ignore-dir", "tests", "--no-cache", "-q", "-o", str(output),
+    ])
+    assert result.exit_code == 0, result.output
+    text = output.read_text(encoding="utf-8")
+    assert "x = 5" in text
+    assert "test_app.py" not in text and "test_src.py" not in text and "test_pkg.py" not in text
+
+
+GITIGNORE = """\
+# comment
+*.log
+!keep.log
+/build/
+docs/*.md
+!docs/README.md
+**/cache/
+a/**/b.py
+\\#literal.py
+trailing\\ space.py
+[Tt]emp*
+sub/
+nested/deep/
+*.tmp/
+excluded/
+!excluded/inner.py
+"""
+
+SUB_GITIGNORE = """\
+*.py
+!keep.py
+/local/
+"""
+
+PATHS = [
+    "app.log", "keep.log", "src/app.log", "src/keep.log",
+    "build/out.py", "src/build/out.py",
+    "docs/guide.md", "docs/README.md", "docs/api/ref.md",
+    "cache/x.py", "src/cache/x.py",
+    "a/b.py", "a/x/b.py", "a/x/y/b.py", "b.py",
+    "#literal.py", "trailing space.py",
+    "Temp1.py", "temp2.py", "src/Temporary.py",
+    "sub/x.py", "src/sub/x.py",
+    "nested/deep/x.py", "src/nested/deep/x.py",
+    "dir.tmp/x.py", "file.tmp",
+    "excluded/inner.py", "excluded/other.py",
+    "pkg/mod.py", "pkg/keep.py", "pkg/local/x.txt", "pkg/inner/local/x.txt", "pkg/data.txt",
+]
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_gitignore_parity_with_git(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    subprocess.run(["git", "init", "-q", str(root)], check=True)
+    (root / ".gitignore").write_text(GITIGNORE)
+    (root / "pkg").mkdir()
+    (root / "pkg" / ".gitignore").write_text(SUB_GITIGNORE)
+    for path in PATHS:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text("")
+    
+    checked = subprocess.run(
+        ["git", "-C", str(root), "check-ignore", "--no-index", "--stdin"],
+        input="\n".join(PATHS), capture_output=True, text=True,
+    )
+    assert checked.returncode in (0, 1), checked.stderr
+    git_ignored = set(checked.stdout.splitlines())
+    
+    matcher = IgnoreMatcher(str(root), [])
+    for directory in ("", "pkg"):
+        matcher.load_directory(directory, os.path.join(str(root), directory))
+    ours = {path for path in PATHS if matcher.is_path_ignored(path)}
+    assert git_ignored and ours == git_ignored
+
+
+def test_builtin_relative_ignore_matches_nested_modules(make_project):
+    project = make_project({
+        "app/Main.java": "class Main {}\n",
+        "target/dependency/Dep.java": "class Dep {}\n",
+        "module/target/dependency/Dep.java": "class Dep {}\n",
+    })
+    processor = CodebaseProcessor(str(project), capture_output=True, quiet=True)
+    assert relative_files(processor) == ["app/Main.java"]
+
+
+def test_tree_max_depth_does_not_list_deeper_directories(make_project, monkeypatch):
+    base = make_project({
+        "top.py": "x = 1\n",
+        "a/mid.py": "x = 2\n",
+        "a/b/deep.py": "x = 3\n",
+        "a/b/c/deeper.py": "x = 4\n",
+    })
+    processor = CodebaseProcessor(str(base), capture_output=True, quiet=True)
+    
+    listed = []
+    scandir = os.scandir
+    
+    def recording_scandir(path):
+        listed.append(os.path.relpath(path, base).replace(os.sep, "/"))
+        return scandir(path)
+    
+    monkeypatch.setattr(os, "scandir", recording_scandir)
+    tree = processor.generate_directory_tree(str(base), max_depth=1)
+    
+    assert [line.split(" ")[-1] for line in tree.splitlines()] == ["a", "b", "mid.py", "top.py"]
+    assert listed == [".", "a"]
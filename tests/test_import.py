@@ -0,0 +1,19 @@
+import subprocess
+import sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[1]
+
+DEFERRED = ("click", "pyfiglet", "pyperclip", "sqlite3", "tokenize",
+            "concurrent.futures", "base64")
+
+
+def test_import_does_not_load_deferred_modules():
+    code = (
+        "import sys, CodeSqueeze\n"
+        f"print(' '.join(m for m in {DEFERRED!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+    assert result.stderr == ""
@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from CodeSqueeze import ImportGraph
+
+
+@pytest.fixture
+def graph(tmp_path):
+    import_graph = ImportGraph(str(tmp_path / "graph"))
+    yield import_graph
+    import_graph.close()
+
+
+def reachable(graph, project, *entries):
+    files = sorted(str(path) for path in project.rglob("*") if path.is_file())
+    closure = graph.closure(str(project), [str(project / entry) for entry in entries], files)
+    return sorted(os.path.relpath(path, project).replace(os.sep, "/") for path in closure)
+
+
+def test_python(make_project, graph):
+    project = make_project({
+        "app/__init__.py": "",
+        "app/main.py": (
+            "import os\n"
+            "import lib.tools\n"
+            "from app import config\n"
+            "from .util import helper\n"
+        ),
+        "app/config.py": "DEBUG = False\n",
+        "app/util.py": "from ..lib.extra import thing\n",
+        "app/unused.py": "",
+        "lib/tools.py": "",
+        "lib/extra.py": "thing = 1\n",
+        "cli.py": "from pkg.core import run\n",
+        "src/pkg/__init__.py": "",
+        "src/pkg/core.py": "def run(): pass\n",
+    })
+    assert reachable(graph, project, "app/main.py") == [
+        "app/__init__.py", "app/config.py", "app/main.py", "app/util.py",
+        "lib/extra.py", "lib/tools.py",
+    ]
+    # src/ layouts resolve from the project root
+    assert reachable(graph, project, "cli.py") == ["cli.py", "src/pkg/__init__.py", "src/pkg/core.py"]
+
+
+def test_javascript_and_typescript(make_project, graph):
+    project = make_project({
+        "src/index.ts": (
+            'import { a } from "./a";\n'
+            'import b from "./b.js";\n'
+            'import type { Shape } from "./types";\n'
+            'export * from "./lib";\n'
+            'const c = require("./c");\n'
+            'const lazy = import("./lazy");\n'
+            'import React from "react";\n'
+        ),
+        "src/a.ts": "export const a = 1;\n",
+        "src/b.ts": "export default 2;\n",
+        "src/types.d.ts": "export type Shape = {};\n",
+        "src/lib/index.ts": 'export * from "../../shared/util.mjs";\n',
+        "shared/util.mjs": "export const u = 1;\n",
+        "src/c.js": "module.exports = 3;\n",
+        "src/lazy.tsx": "export default () => null;\n",
+        "src/unused.ts": "",
+    })
+    assert reachable(graph, project, "src/index.ts") == [
+        "shared/util.mjs", "src/a.ts", "src/b.ts", "src/c.js", "src/index.ts",
+        "src/lazy.tsx", "src/lib/index.ts", "src/types.d.ts",
+    ]
+
+
+def test_go(make_project, graph):
+    project = make_project({
+        "go.mod": "module example.com/app\n\ngo 1.21\n",
+        "main.go": (
+            "package main\n\n"
+            "import (\n"
+            '\t"fmt"\n'
+            '\tstore "example.com/app/internal/store"\n'
+            ")\n"
+        ),
+        "flags.go": "package main\n",
+        "internal/store/store.go": 'package store\n\nimport "example.com/app/internal/util"\n',
+        "internal/store/store_test.go": 'package store\n\nimport "example.com/app/internal/unused"\n',
+        "internal/util/util.go": "package util\n",
+        "internal/unused/unused.go": "package unused\n",
+    })
+    # A package is all of its directory's files, tests excluded
+    assert reachable(graph, project, "main.go") == [
+        "flags.go", "internal/store/store.go", "internal/util/util.go", "main.go",
+    ]
+
+
+def test_rust(make_project, graph):
+    project = make_project({
+        "Cargo.toml": '[package]\nname = "app"\n',
+        "src/main.rs": "mod config;\nmod net;\n\nfn main() {}\n",
+        "src/config.rs": "use crate::util::parse;\n",
+        "src/util.rs": "pub fn parse() {}\n",
+        "src/net/mod.rs": "pub mod client;\nuse super::config::Settings;\n",
+        "src/net/client.rs": "use self::retry::Policy;\n",
+        "src/net/client/retry.rs": "pub struct Policy;\n",
+        "src/unused.rs": "",
+    })
+    assert reachable(graph, project, "src/main.rs") == [
+        "src/config.rs", "src/main.rs", "src/net/client.rs", "src/net/client/retry.rs",
+        "src/net/mod.rs", "src/util.rs",
+    ]
+
+
+def test_unchanged_files_are_not_parsed_again(make_project, graph):
+    project = make_project({
+        "main.py": "import helper\n",
+        "helper.py": "",
+        "other.py": "",
+    })
+    assert reachable(graph, project, "main.py") == ["helper.py", "main.py"]
+    assert graph.parsed == 2
+    
+    assert reachable(graph, project, "main.py") == ["helper.py", "main.py"]
+    assert graph.parsed == 2
+    
+    main = project / "main.py"
+    main.write_text("import other\n")
+    stat_info = os.stat(main)
+    os.utime(main, ns=(stat_info.st_atime_ns, stat_info.st_mtime_ns + 10_000_000_000))
+    assert reachable(graph, project, "main.py") == ["main.py", "other.py"]
+    assert graph.parsed == 4
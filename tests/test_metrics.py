@@ -0,0 +1,19 @@
+from CodeSqueeze import CodebaseProcessor
+
+
+def test_query_ranking_and_cache_friendly_ordering_are_separate_stages(make_project):
+    project = make_project({
+        "cache.py": "def evict_entry(): pass\n",
+        "server.py": "def serve(): pass\n",
+        "util.py": "def evict_all(): pass\n",
+    })
+    processor = CodebaseProcessor(str(project), query="evict", cache_friendly=True,
+                                capture_output=True, quiet=True)
+    processor.process()
+    
+    stages = processor.metrics.as_dict()["stages"]
+    names = list(stages)
+    assert names.index("rank") + 1 == names.index("order")
+    assert stages["rank"]["files_out"] == 2
+    assert stages["order"]["files_in"] == stages["order"]["files_out"] == 2
+    assert "order" in processor.metrics.format_table()
@@ -0,0 +1,98 @@
+import pytest
+
+from CodeSqueeze import SourceMinifier, SourceSkeleton
+
+
+def test_nested_template_literal_is_kept_whole():
+    source = 'const url = `${base ? `https://${host}` : ""}/api`; // trailing comment\nlet x = 1;\n'
+    assert SourceMinifier.minify("a.js", source) == 'const url = `${base ? `https://${host}` : ""}/api`;\nlet x = 1;'
+
+
+def test_template_literal_substitution_with_braces_and_strings():
+    source = 'const s = `a ${ {k: "}"}.k } b ${`c${"`"}`}`;\n// gone\n'
+    assert SourceMinifier.minify("a.ts", source) == 'const s = `a ${ {k: "}"}.k } b ${`c${"`"}`}`;'
+
+
+def test_unterminated_template_literal_falls_back_to_original_text():
+    source = "let s = `abc ${x\n// kept\n"
+    assert SourceMinifier.minify("a.js", source) == source
+
+
+@pytest.mark.parametrize("path, source, expected", [
+    ("a.c", "int main(void) { /* c */ return 0; } // end\n", "int main(void) { return 0; }"),
+    ("a.go", "package main\n\nvar s = `raw // not a comment`\n", "package main\nvar s = `raw // not a comment`"),
+    ("a.rs", "fn f<'a>(x: &'a str) -> char { '}' } /* a /* nested */ comment */\n",
+     "fn f<'a>(x: &'a str) -> char { '}' }"),
+])
+def test_c_like_comments_are_stripped_and_literals_kept(path, source, expected):
+    assert SourceMinifier.minify(path, source) == expected
+
+
+def test_python_minify_round_trips_to_equivalent_code():
+    source = 'def f(a, b=2):\n    """Docstring."""\n    # comment\n\n    return a + b  # sum\n\n\nclass C:\n    """Only a docstring."""\n'
+    minified = SourceMinifier.minify("a.py", source)
+    assert "Docstring" not in minified and "comment" not in minified
+    namespace = {}
+    exec(minified, namespace)
+    assert namespace["f"](1) == 3
+
+
+def test_python_skeleton_keeps_signatures_and_drops_bodies():
+    source = (
+        "import os\n\n"
+        "class Store:\n"
+        '    """Key-value store.\n\n    More details.\n    """\n'
+        "    limit: int = 10\n\n"
+        "    def get(self, key: str) -> bytes:\n"
+        '        """Return a value."""\n'
+        "        return os.environ[key].encode()\n"
+    )
+    skeleton = SourceSkeleton.skeleton("store.py", source)
+    assert "import os" in skeleton
+    assert "def get(self, key: str) -> bytes:" in skeleton
+    assert "Return a value." in skeleton and "More details" not in skeleton
+    assert "os.environ" not in skeleton
+    compile(skeleton, "store.py", "exec")
+
+
+def test_js_skeleton_with_nested_template_literal():
+    source = 'export class A {\n  url() { return `${b ? `{${h}` : "}"}`; }\n}\nexport function f(x) { return x; }\n'
+    assert SourceSkeleton.skeleton("a.js", source) == "export class A {\nurl() { … }\n}\nexport function f(x) { … }"
+
+
+def test_skeleton_of_unparsable_or_unknown_file_is_none():
+    assert SourceSkeleton.skeleton("a.py", "def broken(:\n") is None
+    assert SourceSkeleton.skeleton("notes.md", "# Title\n") is None
+
+
+def test_minifier_and_skeleton_share_the_c_like_table():
+    from CodeSqueeze import C_LIKE_SYNTAXES, STYLESHEET_SYNTAXES
+    
+    for extensions, syntax in C_LIKE_SYNTAXES:
+        for extension in extensions:
+            assert SourceMinifier.MINIFIERS[extension].keywords["syntax"] is syntax
+            assert SourceSkeleton.SKELETONS[extension].keywords["syntax"] is syntax
+    for extensions, _ in STYLESHEET_SYNTAXES:
+        assert not any(SourceSkeleton.supports(f"a.{extension}") for extension in extensions)
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("int x = 1'000; // c\nint y = 2; /* z */\n", "int x = 1'000;\nint y = 2;"),
+    ("auto h = 0xFF'FF; long b = 0b1010'1010; // c\n", "auto h = 0xFF'FF; long b = 0b1010'1010;"),
+    # Prefixed character literals still open a literal
+    ("wchar_t c = L'/'; char8_t d = u8'\"'; // c\n", "wchar_t c = L'/'; char8_t d = u8'\"';"),
+])
+def test_cpp_digit_separators_do_not_open_a_char_literal(source, expected):
+    assert SourceMinifier.minify("a.cpp", source) == expected
+
+
+def test_cpp_skeleton_with_digit_separators():
+    source = "int f() { return 1'000; }\nstruct S { char g() { return '}'; } };\n"
+    assert SourceSkeleton.skeleton("a.cpp", source) == "int f() { … }\nstruct S { char g() { … } };"
+
+
+def test_matlab_m_files_are_not_treated_as_c():
+    source = "x = 1; % comment\ny = 'a // b';\n"
+    assert SourceMinifier.minify("script.m", source) == source.rstrip("\n")
+    assert not SourceSkeleton.supports("script.m")
+    assert SourceSkeleton.supports("view.mm")
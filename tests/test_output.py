@@ -0,0 +1,277 @@
+import os
+
+import pytest
+
+from CodeSqueeze import CodebaseProcessor, HeuristicTokenizer, ShardedOutputWriter, SourceChunk
+
+
+def part_files(directory):
+    return sorted(name for name in os.listdir(directory) if ShardedOutputWriter.PART_FILE_PATTERN.fullmatch(name))
+
+
+def test_header_over_the_limit_leaves_no_part_behind(tmp_path):
+    writer = ShardedOutputWriter(str(tmp_path / "parts"), lambda number: "h" * 100, HeuristicTokenizer(),
+                                max_bytes=50)
+    with pytest.raises(ValueError, match="header"):
+        with writer:
+            writer.write_file(SourceChunk("a.py", "a.py", chunk="x", tokens=1))
+    assert part_files(tmp_path / "parts") == []
+    assert not (tmp_path / "parts" / "index.txt").exists()
+
+
+def test_header_over_the_limit_on_a_later_part_keeps_earlier_parts(tmp_path):
+    headers = {1: "h" * 10}
+    writer = ShardedOutputWriter(str(tmp_path / "parts"), lambda number: headers.get(number, "h" * 100),
+                                HeuristicTokenizer(), max_bytes=50)
+    with pytest.raises(ValueError):
+        with writer:
+            writer.write_file(SourceChunk("a.py", "a.py", chunk="a" * 30, tokens=1))
+            writer.write_file(SourceChunk("b.py", "b.py", chunk="b" * 30, tokens=1))
+    assert part_files(tmp_path / "parts") == ["part-001.txt"]
+
+
+@pytest.fixture
+def sharded_run(make_project, tmp_path):
+    project = make_project({
+        f"pkg/module_{i}.py": "".join(f"def function_{i}_{j}(value):\n    return value * {j}\n" for j in range(40))
+        for i in range(6)
+    })
+    processor = CodebaseProcessor(str(project), output_file=str(tmp_path / "parts"), split_bytes=6000, quiet=True)
+    processor.create_consolidated_file()
+    return processor, tmp_path / "parts"
+
+
+def test_sharded_parts_respect_the_limit_and_match_the_index(sharded_run):
+    processor, directory = sharded_run
+    names = part_files(directory)
+    assert len(names) > 1
+    assert [os.path.basename(path) for path in processor.output_parts] == names
+    
+    index_lines = [line for line in (directory / "index.txt").read_text(encoding="utf-8").splitlines()
+                   if not line.startswith(" ")]
+    assert [line.split(":", 1)[0] for line in index_lines] == names
+    for name, line in zip(names, index_lines):
+        size = (directory / name).stat().st_size
+        assert size <= 6000
+        assert f", {size} bytes" in line
+    assert sum((directory / name).stat().st_size for name in names) == processor.output_size_bytes
+
+
+def test_sharded_parts_hold_every_file_once(sharded_run):
+    processor, directory = sharded_run
+    text = "".join((directory / name).read_text(encoding="utf-8") for name in part_files(directory))
+    for i in range(6):
+        assert text.count(f"File: pkg/module_{i}.py") == 1
+        assert f"function_{i}_39" in text
+
+
+def test_oversized_file_is_split_into_continuations(make_project, tmp_path):
+    project = make_project({"big.py": "".join(f"value_{i} = {i}\n" for i in range(1500))})
+    processor = CodebaseProcessor(str(project), output_file=str(tmp_path / "parts"), split_bytes=8000, quiet=True)
+    processor.create_consolidated_file()
+    names = part_files(tmp_path / "parts")
+    texts = [(tmp_path / "parts" / name).read_text(encoding="utf-8") for name in names]
+    assert len(names) > 2
+    assert all("File: big.py (continued)" in text for text in texts[1:])
+    assert all((tmp_path / "parts" / name).stat().st_size <= 8000 for name in names)
+    assert "value_1499 = 1499" in texts[-1]
+
+
+@pytest.fixture
+def small_project(make_project):
+    return make_project({
+        "pkg/a.py": 'def f():\n    return "é <&> ]]>"\n',
+        "b.py": "x = 1\n",
+    })
+
+
+@pytest.mark.parametrize("output_format", ["jsonl", "xml", "pack"])
+def test_structured_index_offsets_address_each_file(small_project, tmp_path, output_format):
+    import json
+    
+    from CodeSqueeze import read_indexed_chunk
+    
+    output = tmp_path / f"out.{output_format}"
+    processor = CodebaseProcessor(str(small_project), output_file=str(output), output_format=output_format,
+                                quiet=True)
+    processor.create_consolidated_file()
+    
+    index = json.loads((tmp_path / f"out.{output_format}.index.json").read_text(encoding="utf-8"))
+    assert index["format"] == output_format
+    assert sorted(index["files"]) == ["b.py", "pkg/a.py"]
+    data = output.read_bytes()
+    for relative_path, entry in index["files"].items():
+        assert entry["offset"] + entry["length"] <= len(data)
+        record = data[entry["offset"]:entry["offset"] + entry["length"]]
+        if output_format == "pack":
+            # Pack records are the raw bodies
+            assert record.decode("utf-8") == read_indexed_chunk(str(output), relative_path)
+        else:
+            assert relative_path.encode("utf-8") in record
+    
+    assert read_indexed_chunk(str(output), "pkg/a.py") == 'def f():    return "é <&> ]]>"'
+    assert read_indexed_chunk(str(output), "b.py") == "x = 1"
+    assert read_indexed_chunk(str(output), "missing.py") is None
+
+
+def test_pack_output_is_readable_without_the_sidecar(small_project, tmp_path):
+    from CodeSqueeze import read_indexed_chunk
+    
+    output = tmp_path / "out.pack"
+    CodebaseProcessor(str(small_project), output_file=str(output), output_format="pack",
+                    quiet=True).create_consolidated_file()
+    os.remove(str(output) + ".index.json")
+    assert read_indexed_chunk(str(output), "pkg/a.py") == 'def f():    return "é <&> ]]>"'
+
+
+def test_jsonl_records_tile_the_file(small_project, tmp_path):
+    import json
+    
+    output = tmp_path / "out.jsonl"
+    CodebaseProcessor(str(small_project), output_file=str(output), output_format="jsonl",
+                    quiet=True).create_consolidated_file()
+    index = json.loads((tmp_path / "out.jsonl.index.json").read_text(encoding="utf-8"))
+    spans = sorted([(index["header"]["offset"], index["header"]["length"])]
+                + [(entry["offset"], entry["length"]) for entry in index["files"].values()])
+    position = 0
+    for offset, length in spans:
+        assert offset == position
+        position += length
+    assert position <= output.stat().st_size
+
+
+def test_large_files_are_streamed_unminified_with_minify(make_project, monkeypatch):
+    from CodeSqueeze import StreamedChunk
+    
+    source = "".join(f"# comment {i}\nvalue_{i} = {i}\n" for i in range(50))
+    project = make_project({"big.py": source, "small.py": "# gone\nx = 1\n"})
+    monkeypatch.setattr(CodebaseProcessor, "STREAM_THRESHOLD", 256)
+    processor = CodebaseProcessor(str(project), minify=True, quiet=True)
+    
+    big = processor._read_source_chunk(str(project / "big.py"))
+    assert isinstance(big.chunk, StreamedChunk)
+    assert source in str(big.chunk)
+    assert str(big.chunk) == processor._format_file_content("big.py", source)
+    assert big.tokens == processor.tokenizer.count(str(big.chunk))
+    
+    small = processor._read_source_chunk(str(project / "small.py"))
+    assert isinstance(small.chunk, str) and "# gone" not in small.chunk
+
+
+def test_streamed_chunk_matches_the_in_memory_chunk(make_project, monkeypatch):
+    project = make_project({"big.py": "".join(f"def f_{i}():\r\n\t\treturn {i}\r\n" for i in range(200))})
+    in_memory = CodebaseProcessor(str(project), quiet=True)._read_source_chunk(str(project / "big.py"))
+    monkeypatch.setattr(CodebaseProcessor, "STREAM_THRESHOLD", 256)
+    monkeypatch.setattr("CodeSqueeze.StreamedChunk.BLOCK_SIZE", 97)
+    streamed = CodebaseProcessor(str(project), quiet=True)._read_source_chunk(str(project / "big.py"))
+    assert not isinstance(streamed.chunk, str)
+    assert str(streamed.chunk) == in_memory.chunk
+    assert (streamed.tokens, streamed.digest) == (in_memory.tokens, in_memory.digest)
+
+
+PEAK_RSS_SCRIPT = """
+import resource, sys
+import CodeSqueeze
+
+project, output = sys.argv[1], sys.argv[2]
+CodeSqueeze.CodebaseProcessor(
+    project, output_file=output, additional_files=[project + "/big.py"], quiet=True,
+    **({"split_bytes": 4 * 1024 * 1024} if len(sys.argv) > 3 else {}),
+).create_consolidated_file()
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss_kb(project, output, *extra):
+    import subprocess
+    import sys
+    
+    result = subprocess.run(
+        [sys.executable, "-c", PEAK_RSS_SCRIPT, str(project), str(output), *extra],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return int(result.stdout.split()[-1])
+
+
+def write_large_python_file(path, megabytes):
+    line = "def function_{0}(value):\n    return value * 2  # comment {0}\n"
+    with open(path, "w", encoding="utf-8") as outfile:
+        i = 0
+        while outfile.tell() < megabytes * 1024 * 1024:
+            outfile.write("".join(line.format(j) for j in range(i, i + 1000)))
+            i += 1000
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs resource.getrusage (POSIX)")
+@pytest.mark.parametrize("extra", [(), ("sharded",)], ids=["single", "sharded"])
+def test_peak_memory_stays_flat_for_large_files(tmp_path, extra):
+    peaks = []
+    for megabytes in (4, 48):
+        project = tmp_path / f"p{megabytes}"
+        project.mkdir()
+        write_large_python_file(project / "big.py", megabytes)
+        peaks.append(peak_rss_kb(project, tmp_path / f"out{megabytes}", *extra))
+    # 44 MB more input may not cost more than a few blocks of extra memory
+    assert peaks[1] - peaks[0] < 12 * 1024, peaks
+
+
+@pytest.mark.parametrize("limits", [{"max_bytes": 3000}, {"max_tokens": 700}, {"max_bytes": 5000, "max_tokens": 900}])
+def test_streamed_chunk_is_sharded_without_losing_text(tmp_path, monkeypatch, limits):
+    from CodeSqueeze import StreamedChunk
+    
+    monkeypatch.setattr(StreamedChunk, "BLOCK_SIZE", 1000)
+    source = tmp_path / "big.py"
+    source.write_text("".join(f"value_{i} = 'é{i}'\n" for i in range(2000)), encoding="utf-8")
+    chunk = StreamedChunk(str(source), "HEAD:", ":TAIL", source.stat().st_size)
+    tokenizer = HeuristicTokenizer()
+    tokens, _ = chunk.measure(tokenizer)
+    
+    writer = ShardedOutputWriter(str(tmp_path / "parts"), lambda number: f"[part {number}]", tokenizer, **limits)
+    with writer:
+        writer.write_file(SourceChunk(str(source), "big.py", chunk=chunk, tokens=tokens))
+    
+    marker = writer.finalize_text(f"\n{'-'*60}\n📁 File: big.py (continued)\n{'-'*60}\n")
+    bodies = []
+    for number, name in enumerate(part_files(tmp_path / "parts"), 1):
+        data = (tmp_path / "parts" / name).read_bytes()
+        text = data.decode("utf-8")
+        assert text.startswith(f"[part {number}]")
+        body = text[len(f"[part {number}]"):]
+        if number > 1:
+            assert body.startswith(marker)
+            body = body[len(marker):]
+        bodies.append(body)
+        if "max_bytes" in limits:
+            assert len(data) <= limits["max_bytes"]
+        if "max_tokens" in limits:
+            assert writer.parts[number - 1]["tokens"] <= limits["max_tokens"]
+    assert len(bodies) > 2
+    assert "".join(bodies) == str(chunk)
+
+
+def test_pack_counts_characters_and_bytes_separately(tmp_path):
+    import json
+    
+    from CodeSqueeze import PackOutputWriter
+    
+    output = tmp_path / "out.pack"
+    header, tree = "Projekt: naïve 東京\n", "└── café.py\n"
+    with PackOutputWriter(str(output), body_of=lambda chunk: [chunk.chunk]) as writer:
+        writer.write_header(header)
+        writer.write_trailer(tree)
+    
+    index_text = json.dumps(writer.index_document())
+    assert writer.byte_count == output.stat().st_size
+    # The binary offset trailer holds no characters
+    assert writer.char_count == len(PackOutputWriter.MAGIC) + 1 + len(header) + len(tree) + len(index_text)
+    assert writer.byte_count - writer.char_count == (
+        len((header + tree).encode("utf-8")) - len(header + tree) + 8 + len(PackOutputWriter.MAGIC)
+    )
+
+
+def test_structured_writers_must_implement_write_record(tmp_path):
+    from CodeSqueeze import StructuredOutputWriter
+    
+    with pytest.raises(TypeError, match="write_record"):
+        StructuredOutputWriter(str(tmp_path / "out"), body_of=lambda chunk: [])
@@ -0,0 +1,115 @@
+import math
+import os
+
+import pytest
+
+from CodeSqueeze import QueryIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    query_index = QueryIndex(str(tmp_path / "index"))
+    yield query_index
+    query_index.close()
+
+
+def paths_of(project):
+    return sorted(str(path) for path in project.rglob("*") if path.is_file())
+
+
+def touch_forward(path, seconds=10):
+    """Make sure an edit moves the mtime even on filesystems with coarse timestamps."""
+    stat_info = os.stat(path)
+    os.utime(path, ns=(stat_info.st_atime_ns, stat_info.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def test_terms_split_identifiers_and_stem():
+    terms = QueryIndex.terms("getUserName evicted_entries HTTPServer x")
+    assert {"get", "user", "name", "getusername", "evict", "entri", "evicted_entries",
+            "http", "server", "httpserver"} <= set(terms)
+    assert "x" not in terms
+
+
+def test_bm25_scores(make_project, index):
+    project = make_project({
+        "cache.py": "cache cache evict\n",
+        "server.py": "serve request\n",
+        "util.py": "cache helper\n",
+    })
+    paths = paths_of(project)
+    assert index.update(str(project), paths) == 3
+    
+    scores = index.rank(str(project), paths, "cache")
+    assert set(scores) == {str(project / "cache.py"), str(project / "util.py")}
+    
+    # Path words count toward a document too: "cache.py" adds one more "cache"
+    lengths = {"cache.py": 3 + 2, "server.py": 2 + 2, "util.py": 2 + 2}
+    average = sum(lengths.values()) / 3
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+    
+    def bm25(tf, length):
+        normalization = QueryIndex.K1 * (1 - QueryIndex.B + QueryIndex.B * length / average)
+        return idf * tf * (QueryIndex.K1 + 1) / (tf + normalization)
+    
+    assert scores[str(project / "cache.py")] == pytest.approx(bm25(3, lengths["cache.py"]))
+    assert scores[str(project / "util.py")] == pytest.approx(bm25(1, lengths["util.py"]))
+
+
+def test_update_only_rereads_changed_files(make_project, index):
+    project = make_project({
+        "alpha.py": "def parse_tokens(): pass\n",
+        "beta.py": "def render_page(): pass\n",
+    })
+    paths = paths_of(project)
+    root = str(project)
+    assert index.update(root, paths) == 2
+    assert index.update(root, paths) == 0
+    assert set(index.rank(root, paths, "render")) == {str(project / "beta.py")}
+    
+    beta = project / "beta.py"
+    beta.write_text("def compile_shader(): pass\n")
+    touch_forward(beta)
+    assert index.update(root, paths) == 1
+    assert index.rank(root, paths, "render") == {}
+    assert set(index.rank(root, paths, "shader")) == {str(beta)}
+    
+    # A new index on the same database sees the stored postings
+    reopened = QueryIndex(index.cache_dir)
+    try:
+        assert reopened.update(root, paths) == 0
+        assert set(reopened.rank(root, paths, "shader")) == {str(beta)}
+    finally:
+        reopened.close()
+
+
+def test_deleted_files_are_dropped(make_project, index):
+    project = make_project({
+        "keep.py": "shared_word = 1\n",
+        "gone.py": "shared_word = 2\nunique_word = 3\n",
+    })
+    root = str(project)
+    paths = paths_of(project)
+    index.update(root, paths)
+    
+    gone = str(project / "gone.py")
+    os.remove(gone)
+    remaining = paths_of(project)
+    assert index.update(root, remaining) == 0
+    
+    # Even when asked about the stale path, nothing of it is left to rank
+    assert index.rank(root, paths, "unique") == {}
+    assert set(index.rank(root, paths, "shared")) == {str(project / "keep.py")}
+    assert index._db.execute("SELECT COUNT(*) FROM postings WHERE path = ?", (gone,)).fetchone() == (0,)
+
+
+def test_other_projects_are_left_alone(make_project, index):
+    # "app2" sorts right after "app/": the range scan must not reach into it
+    first = make_project({"a.py": "alpha = 1\n", "old.py": "alpha = 3\n"}, root="app")
+    second = make_project({"b.py": "alpha = 2\n"}, root="app2")
+    index.update(str(first), paths_of(first))
+    index.update(str(second), paths_of(second))
+    
+    os.remove(first / "old.py")
+    index.update(str(first), paths_of(first))
+    assert set(index.rank(str(first), paths_of(first), "alpha")) == {str(first / "a.py")}
+    assert set(index.rank(str(second), paths_of(second), "alpha")) == {str(second / "b.py")}
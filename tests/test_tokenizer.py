@@ -0,0 +1,68 @@
+import base64
+
+import pytest
+
+from CodeSqueeze import BPETokenizer
+
+BYTES = {bytes([i]): i for i in range(256)}
+
+
+def tokenizer(*merges):
+    """Every single byte plus the given merges, ranked in order."""
+    ranks = dict(BYTES)
+    ranks.update((token, 256 + rank) for rank, token in enumerate(merges))
+    return BPETokenizer(ranks)
+
+
+def test_pre_tokenizer_splits_like_cl100k():
+    pieces = BPETokenizer.PRE_TOKENIZER.findall("def foo_bar(x): return 12345 + y's\n\n    z")
+    assert pieces == ["def", " foo", "_bar", "(x", "):", " return", " ", "123", "45", " +",
+                    " y", "'s", "\n\n", "   ", " z"]
+
+
+def test_merges_follow_rank_order():
+    # "ab" outranks "bc", so "abc" becomes [ab, c] and never [a, bc]
+    assert tokenizer(b"ab", b"bc").count("abc") == 2
+    assert tokenizer(b"ab", b"bc", b"abc").count("abc") == 1
+    assert tokenizer(b"bc", b"abc").count("abc") == 1
+    assert tokenizer(b"ab", b"cd", b"abcd").count("abcd") == 1
+    assert tokenizer().count("abcd") == 4
+
+
+def test_counts_are_summed_over_pieces():
+    bpe = tokenizer(b"he", b"ll", b"hell", b"hello", b" w", b"or", b" wor", b" world")
+    assert bpe.count("hello world") == 2
+    assert bpe.count("hello world hello") == 4  # " hello" has no " h" merge: [" ", "hello"]
+    assert bpe.count_batch(["hello", " world", ""]) == [1, 1, 0]
+    assert bpe.count_pieces(["hello", " world"]) == 2
+
+
+def test_non_ascii_is_counted_in_utf8_bytes():
+    bpe = tokenizer("é".encode("utf-8"))
+    assert bpe.count("é") == 1
+    assert tokenizer().count("é") == 2
+    assert tokenizer().count("東") == 3
+
+
+def test_long_pieces_are_counted_in_windows():
+    bpe = tokenizer(b"aa")
+    piece = "a" * (BPETokenizer.MAX_PIECE_BYTES * 2 + 2)
+    assert bpe.count(piece) == len(piece) // 2
+
+
+def test_from_file(tmp_path):
+    vocab = tmp_path / "tiny.tiktoken"
+    lines = [f"{base64.b64encode(token).decode()} {rank}" for token, rank in BYTES.items()]
+    lines.append(f"{base64.b64encode(b'ab').decode()} 256")
+    vocab.write_text("\n".join(lines) + "\n\n")
+    
+    bpe = BPETokenizer.from_file(str(vocab))
+    assert bpe.count("abab") == 2
+    assert bpe.name == f"bpe:tiny.tiktoken:{vocab.stat().st_size}:257"
+    
+    vocab.write_text("YWI= 1\nnot-a-pair\n")
+    with pytest.raises(ValueError, match=":2: invalid vocabulary line"):
+        BPETokenizer.from_file(str(vocab))
+    vocab.write_text("\n")
+    with pytest.raises(ValueError, match="empty vocabulary"):
+        BPETokenizer.from_file(str(vocab))